@@ -0,0 +1,10 @@
+"""Helpers shared by the benchmark scripts."""
+import time
+
+
+def _time(fn, n: int) -> float:
+    """Returns the mean duration of ``fn()`` over ``n`` calls, in microseconds."""
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
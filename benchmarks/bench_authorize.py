@@ -0,0 +1,68 @@
+"""Cost of building the authorize redirect: OAuth2Session vs AuthorizeUrlBuilder.
+
+Run with ``python -m benchmarks.bench_authorize``.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+from requests_oauthlib import OAuth2Session
+from benchmarks._util import _time
+from dash_auth_external.routes import (
+    AuthorizeUrlBuilder,
+    make_code_challenge,
+    make_state,
+)
+
+AUTH_URL = "https://accounts.example.com/o/oauth2/v2/auth"
+CLIENT_ID = "1234567890-abcdefghijklmnopqrstuvwxyz.apps.example.com"
+REDIRECT_URI = "https://dash.example.com/redirect"
+SCOPE = "openid email profile"
+PARAMS = {"access_type": "offline", "prompt": "consent"}
+
+
+def _legacy_code_challenge(length: int = 40):
+    code_verifier = base64.urlsafe_b64encode(os.urandom(length)).decode("utf-8")
+    code_verifier = re.sub("[^a-zA-Z0-9]+", "", code_verifier)
+    code_challenge = hashlib.sha256(code_verifier.encode("utf-8")).digest()
+    code_challenge = base64.urlsafe_b64encode(code_challenge).decode("utf-8")
+    code_challenge = code_challenge.replace("=", "")
+    return code_challenge, code_verifier
+
+
+def _legacy():
+    oauth_session = OAuth2Session(CLIENT_ID, redirect_uri=REDIRECT_URI, scope=SCOPE)
+    code_challenge, _ = _legacy_code_challenge()
+    return oauth_session.authorization_url(
+        AUTH_URL,
+        code_challenge=code_challenge,
+        code_challenge_method="S256",
+        **PARAMS,
+    )[0]
+
+
+def run(n: int = 5000) -> dict:
+    os.environ.setdefault("OAUTHLIB_INSECURE_TRANSPORT", "1")
+    builder = AuthorizeUrlBuilder(
+        AUTH_URL, CLIENT_ID, REDIRECT_URI, scope=SCOPE, auth_request_params=PARAMS
+    )
+
+    def fast():
+        code_challenge, _ = make_code_challenge()
+        return builder.build(make_state(), code_challenge)
+
+    legacy_us = _time(_legacy, n)
+    fast_us = _time(fast, n)
+    return {
+        "oauth2_session_us": round(legacy_us, 2),
+        "url_builder_us": round(fast_us, 2),
+        "speedup": round(legacy_us / fast_us, 1),
+        "legacy_code_challenge_us": round(_time(_legacy_code_challenge, n), 2),
+        "code_challenge_us": round(_time(make_code_challenge, n), 2),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
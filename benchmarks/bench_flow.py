@@ -0,0 +1,135 @@
+"""Throughput and latency of the auth flow against a local stub provider.
+
+Scenarios:
+    authorize: GET on the authorize redirect route.
+    exchange: a login, the authorize redirect followed by the redirect route
+        exchanging a code with the provider.
+    warm_token: get_token() in a request holding a valid token.
+    refresh_storm: get_token() from every thread at once holding the same expired token.
+
+Run with ``python -m benchmarks.bench_flow``.
+"""
+import json
+import threading
+import time
+from dataclasses import asdict
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
+from dash_auth_external.testing import StubProvider, login
+from dash_auth_external.token import OAuth2Token
+
+THREAD_COUNTS = (1, 4, 16)
+
+
+def _percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summarize(latencies: list, elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.5) * 1e3, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1e3, 3),
+    }
+
+
+def _measure(threads: int, iterations: int, setup, call) -> dict:
+    """Runs ``call(client)`` ``iterations`` times on each of ``threads`` threads."""
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        client = setup()
+        local = []
+        barrier.wait()
+        for i in range(iterations):
+            start = time.perf_counter()
+            call(client, i)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for w in workers:
+        w.join()
+    return _summarize(latencies, time.perf_counter() - start)
+
+
+def _make_auth(provider: StubProvider) -> DashAuthExternal:
+    auth = DashAuthExternal(
+        provider.url + "/authorize", provider.token_url, "client_id", with_pkce=True
+    )
+
+    @auth.server.route("/token")
+    def show_token():
+        return auth.get_token()
+
+    return auth
+
+
+def _client_with_token(auth: DashAuthExternal, token: OAuth2Token):
+    client = auth.server.test_client()
+    with client.session_transaction() as session:
+        session[FLASK_SESSION_TOKEN_KEY] = asdict(token)
+    return client
+
+
+def run(thread_counts=THREAD_COUNTS, iterations: int = 200) -> dict:
+    results = {}
+    with StubProvider() as provider:
+        auth = _make_auth(provider)
+        valid = OAuth2Token(access_token="a", expires_in=3600, refresh_token="r")
+
+        def get(path, **kwargs):
+            def call(client, i):
+                assert client.get(path, **kwargs).status_code in (200, 302)
+
+            return call
+
+        for threads in thread_counts:
+            results[f"authorize/threads={threads}"] = _measure(
+                threads, iterations, auth.server.test_client, get(auth.auth_suffix)
+            )
+            results[f"exchange/threads={threads}"] = _measure(
+                threads,
+                iterations,
+                lambda: _client_with_token(auth, valid),
+                lambda client, i: login(client, auth.auth_suffix, auth.redirect_suffix),
+            )
+            results[f"warm_token/threads={threads}"] = _measure(
+                threads,
+                iterations,
+                lambda: _client_with_token(auth, valid),
+                get("/token"),
+            )
+
+            # every round all threads hold the same expired token
+            rounds = max(iterations // 10, 1)
+            round_barrier = threading.Barrier(threads)
+            storm_tokens = [
+                OAuth2Token(access_token="a", expires_in=-1, refresh_token=f"storm-{threads}-{i}")
+                for i in range(rounds)
+            ]
+
+            def storm(client, i):
+                with client.session_transaction() as session:
+                    session[FLASK_SESSION_TOKEN_KEY] = asdict(storm_tokens[i])
+                round_barrier.wait()
+                assert client.get("/token").status_code == 200
+
+            calls = provider.calls.get("/token", 0)
+            result = _measure(threads, rounds, auth.server.test_client, storm)
+            result["provider_calls"] = provider.calls.get("/token", 0) - calls
+            results[f"refresh_storm/threads={threads}"] = result
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,49 @@
+"""Cost of repeated get_token_data calls within one request, with and without the flask.g cache,
+and of cached client credentials tokens.
+
+Run with ``python -m benchmarks.bench_get_token``.
+"""
+import json
+from dataclasses import asdict
+from flask import g
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.config import FLASK_G_TOKEN_KEY
+from dash_auth_external.store import write_session_token
+from dash_auth_external.testing import StubProvider
+from dash_auth_external.token import OAuth2Token
+from benchmarks._util import _time
+
+
+def run(n: int = 20000) -> dict:
+    auth = DashAuthExternal("https://provider/authorize", "https://provider/token", "id")
+    token = OAuth2Token(
+        access_token="access_token",
+        token_type="Bearer",
+        expires_in=3600,
+        refresh_token="refresh_token",
+        token_data={"access_token": "access_token", "scope": "openid email"},
+    )
+    with auth.server.test_request_context():
+        write_session_token(asdict(token))
+
+        def uncached():
+            g.pop(FLASK_G_TOKEN_KEY, None)
+            auth.get_token_data()
+
+        auth.get_token_data()
+        results = {
+            "uncached_us_per_call": round(_time(uncached, n), 3),
+            "cached_us_per_call": round(_time(auth.get_token_data, n), 3),
+        }
+
+    with StubProvider() as provider:
+        service = DashAuthExternal("https://provider/authorize", provider.token_url, "id")
+        service.get_service_token(scope="read")
+        results["service_token_us_per_call"] = round(
+            _time(lambda: service.get_service_token(scope="read"), n), 3
+        )
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,73 @@
+"""Per-request overhead of the RouteGuard ``before_request`` check.
+
+Run with ``python -m benchmarks.bench_guard``.
+"""
+import json
+from dataclasses import asdict
+from flask import session
+from dash_auth_external import DashAuthExternal, RouteGuard
+from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
+from dash_auth_external.token import OAuth2Token
+from benchmarks._util import _time
+
+AUTH_URL = "https://provider/authorize"
+TOKEN_URL = "https://provider/token"
+
+
+def _app(route_guard: RouteGuard = None) -> DashAuthExternal:
+    auth = DashAuthExternal(AUTH_URL, TOKEN_URL, "id", route_guard=route_guard)
+
+    @auth.server.route("/home")
+    def home():
+        return "ok"
+
+    return auth
+
+
+def _logged_in_client(auth: DashAuthExternal):
+    client = auth.server.test_client()
+    with client.session_transaction() as s:
+        s[FLASK_SESSION_TOKEN_KEY] = asdict(
+            OAuth2Token(access_token="a", expires_in=3600, refresh_token="r")
+        )
+    return client
+
+
+def run(n: int = 20000, requests: int = 500, rounds: int = 5) -> dict:
+    guard = RouteGuard()
+    auth = _app(guard)
+    check = auth.server.before_request_funcs[None][-1]
+
+    with auth.server.test_request_context("/assets/app.css"):
+        public_us = _time(check, n)
+    with auth.server.test_request_context("/home"):
+        session[FLASK_SESSION_TOKEN_KEY] = asdict(
+            OAuth2Token(access_token="a", expires_in=3600)
+        )
+        authenticated_us = _time(check, n)
+    with auth.server.test_request_context("/home"):
+        session.get(FLASK_SESSION_TOKEN_KEY)
+        rejected_us = _time(check, n)
+
+    guarded = _logged_in_client(auth)
+    unguarded = _logged_in_client(_app())
+    # Interleaved rounds, best of each, so drift in the test client's own
+    # cost does not swamp the few microseconds the guard adds.
+    with_guard = without_guard = float("inf")
+    for _ in range(rounds):
+        with_guard = min(with_guard, _time(lambda: guarded.get("/home"), requests))
+        without_guard = min(
+            without_guard, _time(lambda: unguarded.get("/home"), requests)
+        )
+    return {
+        "public_path_us_per_call": round(public_us, 3),
+        "authenticated_us_per_call": round(authenticated_us, 3),
+        "rejected_us_per_call": round(rejected_us, 3),
+        "request_us_with_guard": round(with_guard, 1),
+        "request_us_without_guard": round(without_guard, 1),
+        "request_overhead_us": round(with_guard - without_guard, 1),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
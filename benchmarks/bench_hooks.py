@@ -0,0 +1,36 @@
+"""Overhead of the instrumentation hooks on get_token_data.
+
+Run with ``python -m benchmarks.bench_hooks``.
+"""
+import json
+from dataclasses import asdict
+from flask import g
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.config import FLASK_G_TOKEN_KEY
+from dash_auth_external.hooks import PrometheusHook
+from dash_auth_external.store import write_session_token
+from dash_auth_external.token import OAuth2Token
+from benchmarks._util import _time
+
+
+def run(n: int = 20000) -> dict:
+    auth = DashAuthExternal("https://provider/authorize", "https://provider/token", "id")
+    with auth.server.test_request_context():
+        write_session_token(asdict(OAuth2Token(access_token="a", expires_in=3600)))
+
+        def call():
+            g.pop(FLASK_G_TOKEN_KEY, None)
+            auth.get_token_data()
+
+        call()
+        without_hooks = _time(call, n)
+        auth.add_hook(PrometheusHook())
+        with_hooks = _time(call, n)
+    return {
+        "no_hooks_us_per_call": round(without_hooks, 3),
+        "prometheus_hook_us_per_call": round(with_hooks, 3),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,71 @@
+"""Startup cost of the package, measured with ``python -X importtime``.
+
+Each statement runs in a fresh interpreter. The reported time is the sum of
+the self times of every module it imported, i.e. ``dash_auth_external`` and
+everything it pulled in beyond interpreter startup, and ``heavy_modules``
+lists the large dependencies that were loaded.
+
+Run with ``python -m benchmarks.bench_import``.
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("flask", "requests", "asyncio", "sqlite3", "oauthlib", "dash")
+
+STATEMENTS = {
+    "package": "import dash_auth_external",
+    "stores": "from dash_auth_external import SQLiteTokenStore, ClientCredentials",
+    "auth": "from dash_auth_external import DashAuthExternal",
+}
+
+_REPORT = "import sys; print(sorted(set(sys.modules) & {heavy!r}))"
+
+
+def _importtime(code: str) -> tuple:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    self_us = {}
+    for line in proc.stderr.splitlines():
+        parts = line[len("import time:") :].split("|")
+        if line.startswith("import time:") and parts[0].strip().isdigit():
+            self_us[parts[2].strip()] = int(parts[0])
+    return self_us, proc.stdout
+
+
+def measure(statement: str, baseline: str = "pass") -> tuple:
+    """Imports ``statement`` in a fresh interpreter.
+
+    Args:
+        statement (str): The import statement to time.
+        baseline (str, optional): Modules this statement imports are left out of the time. Defaults to "pass", i.e. only interpreter startup.
+
+    Returns:
+        tuple: The import time in microseconds and the heavy modules loaded.
+    """
+    startup, _ = _importtime(baseline)
+    self_us, stdout = _importtime(
+        f"{statement}; " + _REPORT.format(heavy=set(HEAVY_MODULES))
+    )
+    total = sum(us for name, us in self_us.items() if name not in startup)
+    return total, json.loads(stdout.strip().replace("'", '"'))
+
+
+def run(repeat: int = 5) -> dict:
+    results = {}
+    for name, statement in STATEMENTS.items():
+        samples = [measure(statement) for _ in range(repeat)]
+        results[name] = {
+            "import_us": int(statistics.median(us for us, _ in samples)),
+            "heavy_modules": samples[0][1],
+        }
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
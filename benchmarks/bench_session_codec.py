@@ -0,0 +1,66 @@
+"""Session cookie size and encode/decode cost: ``asdict`` vs CompactTokenCodec.
+
+Run with ``python -m benchmarks.bench_session_codec``.
+"""
+
+import json
+import os
+from dataclasses import asdict
+from flask import Flask
+from benchmarks._util import _time
+from benchmarks.bench_token_store import OIDC_RESPONSE, _b64
+from dash_auth_external.codec import CompactTokenCodec
+from dash_auth_external.token import OAuth2Token
+
+RESPONSES = {
+    "google": OIDC_RESPONSE,
+    "azure": {
+        "token_type": "Bearer",
+        "scope": "openid profile email User.Read",
+        "expires_in": 4379,
+        "ext_expires_in": 4379,
+        "access_token": ".".join([_b64(60), _b64(1300), _b64(256)]),
+        "refresh_token": "0." + _b64(900),
+        "id_token": ".".join([_b64(60), _b64(1000), _b64(256)]),
+    },
+    "github": {
+        "access_token": "gho_" + _b64(27),
+        "token_type": "bearer",
+        "scope": "repo,gist",
+    },
+}
+
+CODECS = {
+    "asdict": None,
+    "compact": CompactTokenCodec(),
+    "compact_compressed": CompactTokenCodec(compress=True),
+}
+
+
+def run(n: int = 5000) -> dict:
+    app = Flask(__name__)
+    app.secret_key = os.urandom(24)
+    serializer = app.session_interface.get_signing_serializer(app)
+
+    results = {}
+    for provider, response in RESPONSES.items():
+        token_data = asdict(OAuth2Token.from_response(response))
+        for name, codec in CODECS.items():
+            encode = (lambda d: d) if codec is None else codec.encode
+            decode = (lambda d: d) if codec is None else codec.decode
+            cookie = serializer.dumps({"token": encode(token_data)})
+            results[f"{provider}/{name}"] = {
+                "cookie_bytes": len(cookie),
+                "encode_us": round(
+                    _time(lambda: serializer.dumps({"token": encode(token_data)}), n),
+                    2,
+                ),
+                "decode_us": round(
+                    _time(lambda: decode(serializer.loads(cookie)["token"]), n), 2
+                ),
+            }
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,81 @@
+"""Session payload size and per-callback decode cost: cookie vs server-side store.
+
+Run with ``python -m benchmarks.bench_token_store``.
+"""
+import base64
+import json
+import os
+import random
+import tempfile
+from dataclasses import asdict
+from flask import Flask
+from dash_auth_external.store import MemoryTokenStore, SQLiteTokenStore
+from dash_auth_external.token import OAuth2Token
+from benchmarks._util import _time
+
+_random = random.Random(0)
+
+
+def _b64(n: int) -> str:
+    raw = bytes(_random.getrandbits(8) for _ in range(n))
+    return base64.urlsafe_b64encode(raw).decode("utf-8").rstrip("=")
+
+
+# Random segments so the signed cookie cannot compress them away.
+OIDC_RESPONSE = {
+    "access_token": "ya29." + _b64(135),
+    "expires_in": 3599,
+    "refresh_token": "1//" + _b64(75),
+    "scope": "openid email profile https://www.googleapis.com/auth/calendar.readonly",
+    "token_type": "Bearer",
+    "id_token": ".".join([_b64(30), _b64(800), _b64(256)]),
+}
+
+
+def _oidc_token() -> dict:
+    return asdict(
+        OAuth2Token(
+            access_token=OIDC_RESPONSE["access_token"],
+            token_type=OIDC_RESPONSE["token_type"],
+            expires_in=OIDC_RESPONSE["expires_in"],
+            refresh_token=OIDC_RESPONSE["refresh_token"],
+            token_data=OIDC_RESPONSE,
+        )
+    )
+
+
+def run(n: int = 5000) -> dict:
+    app = Flask(__name__)
+    app.secret_key = os.urandom(24)
+    serializer = app.session_interface.get_signing_serializer(app)
+    token = _oidc_token()
+
+    cookie = serializer.dumps({"token": token})
+    sid = "s" * 43
+    store_cookie = serializer.dumps({"token": {"sid": sid}})
+
+    memory = MemoryTokenStore()
+    memory.set(sid, token)
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite = SQLiteTokenStore(os.path.join(tmp, "tokens.db"))
+        sqlite.set(sid, token)
+
+        def from_store(store):
+            def decode():
+                store.get(serializer.loads(store_cookie)["token"]["sid"])
+
+            return decode
+
+        results = {
+            "cookie_bytes": len(cookie),
+            "store_cookie_bytes": len(store_cookie),
+            "token_json_bytes": len(json.dumps(token)),
+            "cookie_decode_us": round(_time(lambda: serializer.loads(cookie), n), 2),
+            "memory_store_decode_us": round(_time(from_store(memory), n), 2),
+            "sqlite_store_decode_us": round(_time(from_store(sqlite), n), 2),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,43 @@
+"""Per-request latency of token requests: bare requests.post vs pooled Transport.
+
+Run with ``python -m benchmarks.bench_transport``.
+"""
+import json
+import requests
+from dash_auth_external.routes import token_request
+from dash_auth_external.testing import StubProvider
+from dash_auth_external.transport import Transport
+from benchmarks._util import _time
+
+BODY = {"grant_type": "refresh_token", "refresh_token": "refresh_token"}
+
+
+def run(n: int = 300) -> dict:
+    with StubProvider() as provider:
+        url = provider.token_url
+
+        def bare():
+            r = requests.post(url, data=BODY, headers={})
+            r.raise_for_status()
+            return r.json()
+
+        transport = Transport()
+        pooled = lambda: token_request(url, BODY, {}, transport=transport)
+        pooled()
+
+        bare_us = _time(bare, n)
+        connections = provider.connections
+        pooled_us = _time(pooled, n)
+        transport.close()
+        return {
+            "requests": n,
+            "bare_us_per_request": round(bare_us, 1),
+            "pooled_us_per_request": round(pooled_us, 1),
+            "speedup": round(bare_us / pooled_us, 2),
+            "bare_connections": connections - 1,
+            "pooled_connections": provider.connections - connections,
+        }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
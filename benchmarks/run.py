@@ -0,0 +1,130 @@
+"""Runs the benchmark suite and writes machine-readable results.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline results.json --tolerance 0.25
+
+With ``--baseline`` the flow scenarios are compared against an earlier
+results file, and the run exits with status 1 if any p50/p99 latency grew or
+throughput dropped by more than ``--tolerance``, or if a scenario made more
+calls to the provider. With ``--warn-on-latency`` latency and throughput
+regressions are only reported, for machines too noisy to gate on wall-clock
+time such as shared CI runners.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from benchmarks import (
+    bench_authorize,
+    bench_flow,
+    bench_get_token,
+    bench_guard,
+    bench_hooks,
+    bench_import,
+    bench_session_codec,
+    bench_token_store,
+    bench_transport,
+)
+
+MICRO_BENCHMARKS = {
+    "authorize": bench_authorize,
+    "transport": bench_transport,
+    "token_store": bench_token_store,
+    "get_token": bench_get_token,
+    "hooks": bench_hooks,
+    "session_codec": bench_session_codec,
+    "guard": bench_guard,
+    "import": bench_import,
+}
+
+
+def run_suite(thread_counts, iterations: int) -> dict:
+    return {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "flow": bench_flow.run(thread_counts=thread_counts, iterations=iterations),
+        "micro": {name: module.run() for name, module in MICRO_BENCHMARKS.items()},
+    }
+
+
+# deterministic for a given code path, so any increase is a regression
+COUNT_METRICS = ("provider_calls",)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Returns a description of every flow metric that regressed beyond ``tolerance``."""
+    regressions = []
+    for scenario, current in results["flow"].items():
+        previous = baseline.get("flow", {}).get(scenario)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{scenario} {metric}: {previous[metric]} -> {current[metric]}"
+                )
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{scenario} throughput_rps: {previous['throughput_rps']} -> {current['throughput_rps']}"
+            )
+    return regressions
+
+
+def compare_counts(results: dict, baseline: dict) -> list:
+    """Returns a description of every flow count metric that grew."""
+    regressions = []
+    for scenario, current in results["flow"].items():
+        previous = baseline.get("flow", {}).get(scenario, {})
+        for metric in COUNT_METRICS:
+            if metric in current and metric in previous:
+                if current[metric] > previous[metric]:
+                    regressions.append(
+                        f"{scenario} {metric}: {previous[metric]} -> {current[metric]}"
+                    )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare against this results file.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument(
+        "--warn-on-latency",
+        action="store_true",
+        help="Report latency and throughput regressions without failing.",
+    )
+    parser.add_argument("--threads", type=int, nargs="+", default=bench_flow.THREAD_COUNTS)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.threads, args.iterations)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = compare(results, baseline, args.tolerance)
+        regressions = compare_counts(results, baseline)
+        if not args.warn_on_latency:
+            regressions = slower + regressions
+            slower = []
+        for regression in slower:
+            print("WARNING", regression, file=sys.stderr)
+        for regression in regressions:
+            print("REGRESSION", regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,38 @@
-from .auth import DashAuthExternal
+"""Public API, imported on first attribute access.
+
+``import dash_auth_external`` does not load Flask, requests or asyncio, each
+name below imports its submodule the first time it is used.
+"""
+import importlib
+
+_EXPORTS = {
+    "DashAuthExternal": "auth",
+    "CircuitBreaker": "breaker",
+    "CallbackCache": "callback_cache",
+    "ApiClient": "client",
+    "ResponseCache": "client",
+    "RouteGuard": "guard",
+    "CompactTokenCodec": "codec",
+    "ClientCredentials": "service",
+    "MemoryTokenStore": "store",
+    "RedisTokenStore": "store",
+    "SQLiteTokenStore": "store",
+    "TokenStore": "store",
+    "TokenRequestLimiter": "ratelimit",
+    "Transport": "transport",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,169 @@
+"""Non-blocking counterparts of the token requests, built on httpx.
+
+asyncio is imported where it is used, so that sync only apps do not pay for
+it at startup.
+"""
+import os
+import threading
+from dash_auth_external.hooks import NO_HOOKS, Hooks
+from dash_auth_external.token import OAuth2Token
+
+
+def _import_httpx():
+    try:
+        import httpx
+    except ImportError as e:
+        raise ImportError(
+            "The async API requires httpx, install it with `pip install dash-auth-external[async]`."
+        ) from e
+    return httpx
+
+
+def _run_loop(loop):
+    import asyncio
+
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_forever()
+    finally:
+        loop.close()
+
+
+class AsyncTransport:
+    def __init__(
+        self,
+        max_connections: int = 10,
+        max_keepalive_connections: int = 10,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        retries: int = 2,
+    ):
+        """Pooled, keep-alive async HTTP client, the async counterpart of Transport.
+
+        An ``httpx.AsyncClient`` is bound to the event loop it was created on,
+        while Flask async views run each request on a fresh loop. So a single
+        client runs on an event loop of its own, on a daemon thread started on
+        first use, and callers on any loop await its responses. The process
+        keeps one connection pool however many loops come and go.
+
+        Args:
+            max_connections (int, optional): Maximum concurrent connections. Defaults to 10.
+            max_keepalive_connections (int, optional): Idle connections kept alive. Defaults to 10.
+            connect_timeout (float, optional): Seconds to wait for a connection. Defaults to 5.0.
+            read_timeout (float, optional): Seconds to wait for a response. Defaults to 30.0.
+            retries (int, optional): Retries on connection errors. Defaults to 2.
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self._loop = None
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """Returns the client and its loop, starting them on first use."""
+        with self._lock:
+            # the loop thread does not survive fork(), a child starts its own
+            if self._loop is None or self._pid != os.getpid():
+                import asyncio
+
+                httpx = _import_httpx()
+                self._client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_keepalive_connections,
+                    ),
+                    timeout=httpx.Timeout(
+                        self.read_timeout, connect=self.connect_timeout
+                    ),
+                    transport=httpx.AsyncHTTPTransport(retries=self.retries),
+                )
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                threading.Thread(
+                    target=_run_loop,
+                    args=(self._loop,),
+                    name="dash-auth-external-async",
+                    daemon=True,
+                ).start()
+            return self._client, self._loop
+
+    async def request(self, method: str, url: str, **kwargs):
+        import asyncio
+
+        client, loop = self._start()
+        future = asyncio.run_coroutine_threadsafe(
+            client.request(method, url, **kwargs), loop
+        )
+        return await asyncio.wrap_future(future)
+
+    async def post(self, url: str, data: dict = None, headers: dict = None, **kwargs):
+        return await self.request("POST", url, data=data, headers=headers, **kwargs)
+
+    async def get(self, url: str, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def aclose(self):
+        """Closes the client and stops its event loop, the next request starts new ones."""
+        import asyncio
+
+        with self._lock:
+            client, loop = self._client, self._loop
+            forked = self._pid != os.getpid()
+            self._client = self._loop = None
+        if loop is None or forked:
+            return
+        future = asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        try:
+            await asyncio.wrap_future(future)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_async_transport() -> AsyncTransport:
+    """Returns the process wide async transport used when none is supplied."""
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                _default_transport = AsyncTransport()
+    return _default_transport
+
+
+async def async_token_request(
+    url: str,
+    body: dict,
+    headers: dict,
+    transport: AsyncTransport = None,
+    hooks: Hooks = NO_HOOKS,
+) -> dict:
+    if transport is None:
+        transport = get_default_async_transport()
+    with hooks.span("token_request", grant_type=body.get("grant_type")):
+        r = await transport.post(url, data=body, headers=headers)
+        r.raise_for_status()
+        return r.json()
+
+
+async def async_refresh_token(
+    url: str,
+    token_data: OAuth2Token,
+    headers: dict,
+    transport: AsyncTransport = None,
+    hooks: Hooks = NO_HOOKS,
+) -> OAuth2Token:
+    body = {
+        "grant_type": "refresh_token",
+        "refresh_token": token_data.refresh_token,
+    }
+    data = await async_token_request(
+        url, body, headers, transport=transport, hooks=hooks
+    )
+    return OAuth2Token.from_response(data, refresh_token=token_data.refresh_token)
@@ -1,13 +1,45 @@
 from dataclasses import asdict
-from flask import Flask
+from flask import Flask, g, has_request_context, redirect, session
 from .routes import make_access_token_route, make_auth_route, token_request
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
+import logging
 import os
+import secrets
+import time
+from typing import Callable
+from dash_auth_external.aio import (
+    AsyncTransport,
+    async_refresh_token,
+    get_default_async_transport,
+)
+from dash_auth_external.breaker import CircuitBreaker, guarded, guarded_async
+from dash_auth_external.callback_cache import CallbackCache
+from dash_auth_external.client import ApiClient, ResponseCache
+from dash_auth_external.codec import CompactTokenCodec
+from dash_auth_external.config import FLASK_G_TOKEN_KEY, FLASK_SESSION_TOKEN_KEY
+from dash_auth_external.discovery import fetch_provider_metadata
+from dash_auth_external.guard import RouteGuard
+from dash_auth_external.hooks import NO_HOOKS, Hook, Hooks
+from dash_auth_external.profile import ProfileFetcher
+from dash_auth_external.provider import Provider
+from dash_auth_external.ratelimit import TokenRequestLimiter
 from dash_auth_external.token import OAuth2Token
-from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
-from dash_auth_external.exceptions import TokenExpiredError
+from dash_auth_external.exceptions import CircuitOpenError, TokenExpiredError
+from dash_auth_external.scheduler import RefreshScheduler
+from dash_auth_external.service import ClientCredentials
+from dash_auth_external.singleflight import FileLockBackend
+from dash_auth_external.store import (
+    Sweeper,
+    TokenStore,
+    read_session_token,
+    session_id,
+    write_session_token,
+)
+from dash_auth_external.transport import Transport, get_default_transport
+from dash_auth_external.validation import JWTValidator
 
-from flask import session
+logger = logging.getLogger(__name__)
 
 
 def generate_secret_key(length: int = 24) -> str:
@@ -19,20 +51,49 @@ def generate_secret_key(length: int = 24) -> str:
     return os.urandom(length)
 
 
-def _get_token_data_from_session() -> dict:
+def _get_token_data_from_session(
+    token_store: TokenStore = None,
+    key: str = FLASK_SESSION_TOKEN_KEY,
+    codec: CompactTokenCodec = None,
+) -> dict:
     """Gets the token data from the session.
 
+    Args:
+        token_store (TokenStore, optional): Server-side store holding the token data. Defaults to None.
+        key (str, optional): Session key of the provider's token. Defaults to FLASK_SESSION_TOKEN_KEY.
+        codec (CompactTokenCodec, optional): Decodes token data kept in the cookie. Defaults to None.
+
     Returns:
         dict: The token data from the session.
     """
-    token_data = session.get(FLASK_SESSION_TOKEN_KEY)
+    token_data = read_session_token(token_store, key=key, codec=codec)
     if token_data is None:
         raise ValueError("No token found in request session.")
     return token_data
 
 
-def _set_token_data_in_session(token: OAuth2Token):
-    session[FLASK_SESSION_TOKEN_KEY] = token
+def _set_token_data_in_session(
+    token: OAuth2Token,
+    token_store: TokenStore = None,
+    key: str = FLASK_SESSION_TOKEN_KEY,
+    g_key: str = FLASK_G_TOKEN_KEY,
+    codec: CompactTokenCodec = None,
+    ttl: float = None,
+):
+    write_session_token(asdict(token), token_store, key=key, codec=codec, ttl=ttl)
+    _set_request_token(token, g_key)
+
+
+def _get_request_token(g_key: str = FLASK_G_TOKEN_KEY) -> OAuth2Token:
+    """Gets the token already validated during this request, if any."""
+    if not has_request_context():
+        return None
+    return g.get(g_key)
+
+
+def _set_request_token(token: OAuth2Token, g_key: str = FLASK_G_TOKEN_KEY):
+    if has_request_context():
+        setattr(g, g_key, token)
 
 
 class DashAuthExternal:
@@ -53,6 +114,26 @@ class DashAuthExternal:
         token_request_headers: dict = None,
         scope: str = None,
         _server_name: str = __name__,
+        transport: Transport = None,
+        refresh_lock_dir: str = None,
+        token_store: TokenStore = None,
+        refresh_ahead: float = None,
+        async_transport: AsyncTransport = None,
+        token_validator: JWTValidator = None,
+        external_userinfo_url: str = None,
+        external_revocation_url: str = None,
+        session_codec: CompactTokenCodec = None,
+        state_store: TokenStore = None,
+        state_ttl: float = 600.0,
+        refresh_cache: TokenStore = None,
+        refresh_cache_ttl: float = 300.0,
+        logout_suffix: str = None,
+        logout_redirect: str = None,
+        circuit_breaker: CircuitBreaker = None,
+        stale_token_grace: float = None,
+        rate_limiter: TokenRequestLimiter = None,
+        route_guard: RouteGuard = None,
+        token_ttl: float = None,
     ):
         """The interface for obtaining access tokens from 3rd party OAuth2 Providers.
 
@@ -71,6 +152,26 @@ class DashAuthExternal:
             token_request_headers (dict, optional): Additional headers to send to the access token endpoint. Defaults to None.
             scope (str, optional): Header required by most Oauth2 Providers. Defaults to None.
             _server_name (str, optional): The name of the Flask Server. Defaults to __name__, ignored if _flask_server is not None.
+            transport (Transport, optional): Pooled HTTP client used for all token requests. Defaults to a process wide shared Transport.
+            refresh_lock_dir (str, optional): Directory for file locks that deduplicate refreshes across worker processes. Defaults to None, deduplicating across threads only.
+            token_store (TokenStore, optional): Keep token data server-side, the session cookie then only holds an opaque session id. Defaults to None, storing token data in the cookie.
+            refresh_ahead (float, optional): Refresh tokens on a background thread this many seconds before they expire. Requires token_store. Defaults to None.
+            async_transport (AsyncTransport, optional): Non-blocking HTTP client used by the async API. Defaults to a process wide shared AsyncTransport.
+            token_validator (JWTValidator, optional): Validates JWTs locally on login and refresh, exposing their claims as OAuth2Token.claims. Defaults to None.
+            external_userinfo_url (str, optional): The userinfo endpoint for the OAuth2 Provider. Defaults to None.
+            external_revocation_url (str, optional): The token revocation endpoint for the OAuth2 Provider. Defaults to None.
+            session_codec (CompactTokenCodec, optional): Compact encoding for token data kept in the session cookie, the old format is still read. Defaults to None.
+            state_store (TokenStore, optional): Keep pending authorizations server-side keyed by ``state``, which is then checked on the callback, instead of the state and PKCE verifier in the cookie. The cookie keeps a value binding the state to the browser. Defaults to None.
+            state_ttl (float, optional): Seconds a pending authorization stays valid in state_store. Defaults to 600.0.
+            refresh_cache (TokenStore, optional): Shares refreshed tokens between workers, keyed by a hash of the refresh token they replace, so requests still carrying the old token do not refresh again. Defaults to None.
+            refresh_cache_ttl (float, optional): Seconds a refreshed token is shared, capped at its expiry. Defaults to 300.0.
+            logout_suffix (str, optional): A POST route that revokes the user's tokens and clears them from the session, e.g. "/logout". Defaults to None, not registering it.
+            logout_redirect (str, optional): Where the logout route redirects to. Defaults to auth_suffix.
+            circuit_breaker (CircuitBreaker, optional): Fails token requests fast while the provider is unavailable, instead of tying up workers. Defaults to None.
+            stale_token_grace (float, optional): While the circuit is open, serve tokens that expired at most this many seconds ago instead of raising CircuitOpenError. Defaults to None.
+            rate_limiter (TokenRequestLimiter, optional): Spaces out token requests, retries them after 429 responses and sends identical concurrent requests once. Defaults to None.
+            route_guard (RouteGuard, optional): Redirects or rejects requests from users who are not logged in. Defaults to None, leaving every route open.
+            token_ttl (float, optional): Seconds token data is kept in token_store after it was last written, so abandoned sessions do not keep refresh tokens forever. Defaults to the server's permanent_session_lifetime.
 
 
         Returns:
@@ -82,6 +183,16 @@ class DashAuthExternal:
         if token_request_headers is None:
             token_request_headers = {}
 
+        if transport is None:
+            transport = get_default_transport()
+
+        self.hooks = Hooks()
+
+        if refresh_ahead is not None and token_store is None:
+            raise ValueError(
+                "refresh_ahead requires a token_store, tokens in cookies can only be refreshed during a request."
+            )
+
         if _flask_server is None:
             app = Flask(
                 _server_name, instance_relative_config=False, static_folder="./assets"
@@ -94,85 +205,904 @@ class DashAuthExternal:
         else:
             app.secret_key = _secret_key
 
-        redirect_uri = urljoin(app_url, redirect_suffix)
+        self.server = app
+        self.app_url = app_url
+        self.refresh_lock_dir = refresh_lock_dir
+        self.home_suffix = home_suffix
+        self.redirect_suffix = redirect_suffix
+        self.auth_suffix = auth_suffix
+        self.client_id = client_id
+        self.external_token_url = external_token_url
+        self.token_request_headers = token_request_headers
+        self.scope = scope
+        self.transport = transport
+        self.token_store = token_store
+        if token_ttl is None:
+            token_ttl = app.permanent_session_lifetime.total_seconds()
+        self.token_ttl = token_ttl
+        self.session_codec = session_codec
+        self.state_store = state_store
+        self.state_ttl = state_ttl
+        self._state_sweeper = None
+        self.refresh_cache = refresh_cache
+        self.refresh_cache_ttl = refresh_cache_ttl
+        self.stale_token_grace = stale_token_grace
+        if state_store is not None:
+            self._state_sweeper = Sweeper(state_store)
+        self._lock_sweeper = None
+        if refresh_lock_dir is not None:
+            self._lock_sweeper = Sweeper(FileLockBackend(refresh_lock_dir))
+        self.token_validator = token_validator
+        self.external_auth_url = external_auth_url
+        self.external_userinfo_url = external_userinfo_url
+        self.external_revocation_url = external_revocation_url
+        self.provider_metadata = None
+        self.async_transport = async_transport or get_default_async_transport()
+        self.refresh_ahead = refresh_ahead
+        self._providers = {}
+        self.route_guard = route_guard
+        self._scheduler = None
+        if refresh_ahead is not None:
+            self._scheduler = RefreshScheduler(
+                self._refresh_stored_token, skew=refresh_ahead
+            )
+        self._background_pid = None
+        self._background = [
+            worker
+            for worker in (self._scheduler, self._state_sweeper, self._lock_sweeper)
+            if worker is not None
+        ]
+        if self._background:
+            app.before_request(self._start_background)
+
+        self._register_provider(
+            Provider(
+                None,
+                external_auth_url,
+                external_token_url,
+                client_id,
+                client_secret=client_secret,
+                scope=scope,
+                token_request_headers=token_request_headers,
+                token_validator=token_validator,
+                external_userinfo_url=external_userinfo_url,
+                external_revocation_url=external_revocation_url,
+                refresh_lock_dir=refresh_lock_dir,
+                circuit_breaker=circuit_breaker,
+                rate_limiter=rate_limiter,
+            ),
+            with_pkce=with_pkce,
+            auth_suffix=auth_suffix,
+            redirect_suffix=redirect_suffix,
+            home_suffix=home_suffix,
+            auth_request_headers=auth_request_headers,
+        )
+
+        if logout_suffix is not None:
+            self._make_logout_route(logout_suffix, logout_redirect or auth_suffix)
+
+        if route_guard is not None:
+            if logout_suffix is not None:
+                route_guard.allow(logout_suffix)
+            route_guard.register(app, self._providers[None].session_key, auth_suffix)
+
+    @classmethod
+    def from_issuer(
+        cls,
+        issuer_url: str,
+        client_id: str,
+        cache_dir: str = None,
+        discovery_ttl: float = 3600.0,
+        validate_tokens: bool = False,
+        **kwargs,
+    ) -> "DashAuthExternal":
+        """Creates an instance configured from the provider's OpenID Connect discovery document.
+
+        Args:
+            issuer_url (str): The issuer, e.g. "https://accounts.google.com".
+            client_id (str): Client ID obtained from OAuth2 provider.
+            cache_dir (str, optional): Directory caching the discovery document across worker processes. Defaults to None.
+            discovery_ttl (float, optional): Seconds the discovery document is cached. Defaults to 3600.0.
+            validate_tokens (bool, optional): Validate id tokens against the discovered jwks_uri. Defaults to False.
+            **kwargs: Passed on to DashAuthExternal.
+
+        Returns:
+            DashAuthExternal: Main package class
+        """
+        metadata = fetch_provider_metadata(
+            issuer_url,
+            cache_dir=cache_dir,
+            ttl=discovery_ttl,
+            transport=kwargs.get("transport"),
+        )
+        kwargs.setdefault("external_userinfo_url", metadata.get("userinfo_endpoint"))
+        kwargs.setdefault(
+            "external_revocation_url", metadata.get("revocation_endpoint")
+        )
+        if validate_tokens and kwargs.get("token_validator") is None:
+            algorithms = [
+                alg
+                for alg in metadata.get("id_token_signing_alg_values_supported", [])
+                if alg != "none" and not alg.startswith("HS")
+            ]
+            kwargs["token_validator"] = JWTValidator(
+                metadata["jwks_uri"],
+                audience=client_id,
+                issuer=metadata["issuer"],
+                algorithms=algorithms or ["RS256"],
+                transport=kwargs.get("transport"),
+            )
+        auth = cls(
+            metadata["authorization_endpoint"],
+            metadata["token_endpoint"],
+            client_id,
+            **kwargs,
+        )
+        auth.provider_metadata = auth._providers[None].provider_metadata = metadata
+        return auth
+
+    def add_provider(
+        self,
+        name: str,
+        external_auth_url: str,
+        external_token_url: str,
+        client_id: str,
+        client_secret: str = None,
+        with_pkce: bool = True,
+        auth_suffix: str = None,
+        redirect_suffix: str = None,
+        home_suffix: str = None,
+        auth_request_headers: dict = None,
+        token_request_headers: dict = None,
+        scope: str = None,
+        token_validator: JWTValidator = None,
+        external_userinfo_url: str = None,
+        external_revocation_url: str = None,
+        circuit_breaker: CircuitBreaker = None,
+        rate_limiter: TokenRequestLimiter = None,
+    ) -> Provider:
+        """Links an additional OAuth2 provider, e.g. Slack next to GitHub, to the same server.
+
+        The provider gets its own login and redirect routes and keeps its
+        token under its own session key. Fetch it with
+        ``get_token(provider=name)``.
+
+        Args:
+            name (str): Name of the provider, passed as ``provider`` to get_token.
+            external_auth_url (str): The authorization endpoint for the OAuth2 Provider.
+            external_token_url (str): The access token endpoint for the OAuth2 Provider.
+            client_id (str): Client ID obtained from OAuth2 provider.
+            client_secret (str, optional): Client secret obtained from OAuth2 provider. Defaults to None.
+            with_pkce (bool, optional): Use Proof of Key Exchange. Defaults to True.
+            auth_suffix (str, optional): The route that starts the login with this provider. Defaults to "/login/<name>".
+            redirect_suffix (str, optional): The route this provider will redirect back to. Defaults to "/redirect/<name>".
+            home_suffix (str, optional): The route redirected to after login. Defaults to the home_suffix of this instance.
+            auth_request_headers (dict, optional): Additional parameters to send to the authorization endpoint. Defaults to None.
+            token_request_headers (dict, optional): Additional headers to send to the access token endpoint. Defaults to None.
+            scope (str, optional): Scope requested from the OAuth2 Provider. Defaults to None.
+            token_validator (JWTValidator, optional): Validates JWTs locally on login and refresh. Defaults to None.
+            external_userinfo_url (str, optional): The userinfo endpoint for the OAuth2 Provider. Defaults to None.
+            external_revocation_url (str, optional): The token revocation endpoint for the OAuth2 Provider. Defaults to None.
+            circuit_breaker (CircuitBreaker, optional): Fails token requests to this provider fast while it is unavailable. Defaults to None.
+            rate_limiter (TokenRequestLimiter, optional): Rate limits, queues and coalesces token requests to this provider. Defaults to None.
+
+        Returns:
+            Provider: The registered provider.
+        """
+        if name is None or name in self._providers:
+            raise ValueError(f"Provider {name!r} is already registered.")
+        if ":" in name or name in ("state", "refresh", "callback", "profile"):
+            raise ValueError(f"Invalid provider name {name!r}.")
+        return self._register_provider(
+            Provider(
+                name,
+                external_auth_url,
+                external_token_url,
+                client_id,
+                client_secret=client_secret,
+                scope=scope,
+                token_request_headers=token_request_headers,
+                token_validator=token_validator,
+                external_userinfo_url=external_userinfo_url,
+                external_revocation_url=external_revocation_url,
+                refresh_lock_dir=self.refresh_lock_dir,
+                circuit_breaker=circuit_breaker,
+                rate_limiter=rate_limiter,
+            ),
+            with_pkce=with_pkce,
+            auth_suffix=auth_suffix or f"/login/{name}",
+            redirect_suffix=redirect_suffix or f"/redirect/{name}",
+            home_suffix=home_suffix or self.home_suffix,
+            auth_request_headers=auth_request_headers or {},
+        )
+
+    def _register_provider(
+        self,
+        provider: Provider,
+        with_pkce: bool,
+        auth_suffix: str,
+        redirect_suffix: str,
+        home_suffix: str,
+        auth_request_headers: dict,
+    ) -> Provider:
+        redirect_uri = urljoin(self.app_url, redirect_suffix)
+        suffix = "" if provider.name is None else f"_{provider.name}"
+        if self.route_guard is not None:
+            self.route_guard.allow(auth_suffix, redirect_suffix)
 
-        app = make_auth_route(
-            app=app,
-            external_auth_url=external_auth_url,
-            client_id=client_id,
+        make_auth_route(
+            app=self.server,
+            external_auth_url=provider.external_auth_url,
+            client_id=provider.client_id,
             auth_suffix=auth_suffix,
             redirect_uri=redirect_uri,
             with_pkce=with_pkce,
-            scope=scope,
+            scope=provider.scope,
             auth_request_params=auth_request_headers,
+            endpoint="get_auth_code" + suffix,
+            code_verifier_key=provider.code_verifier_key,
+            state_store=self.state_store,
+            state_ttl=self.state_ttl,
+            state_key=provider.state_key,
         )
-        app = make_access_token_route(
-            app,
-            external_token_url=external_token_url,
-            client_id=client_id,
-            client_secret=client_secret,
+        make_access_token_route(
+            self.server,
+            external_token_url=provider.external_token_url,
+            client_id=provider.client_id,
+            client_secret=provider.client_secret,
             redirect_uri=redirect_uri,
             redirect_suffix=redirect_suffix,
             _home_suffix=home_suffix,
-            token_request_headers=token_request_headers,
+            token_request_headers=provider.token_request_headers,
             with_pkce=with_pkce,
+            transport=self.transport,
+            token_store=self.token_store,
+            on_token_stored=lambda token, sid: self._on_token_stored(
+                token, sid, provider.name
+            ),
+            token_validator=provider.token_validator,
+            hooks=self.hooks,
+            endpoint="get_token_route" + suffix,
+            session_key=provider.session_key,
+            code_verifier_key=provider.code_verifier_key,
+            session_codec=self.session_codec,
+            state_store=self.state_store,
+            state_key=provider.state_key,
+            sid_prefix=provider.sid_prefix,
+            token_ttl=self.token_ttl,
+            circuit_breaker=provider.circuit_breaker,
+            rate_limiter=provider.rate_limiter,
+            login_id_key=provider.login_id_key,
         )
+        provider.client_credentials = ClientCredentials(
+            provider.external_token_url,
+            provider.client_id,
+            provider.client_secret,
+            token_request_headers=provider.token_request_headers,
+            transport=self.transport,
+            hooks=self.hooks,
+            circuit_breaker=provider.circuit_breaker,
+            rate_limiter=provider.rate_limiter,
+        )
+        self._providers[provider.name] = provider
+        return provider
 
-        self.server = app
-        self.home_suffix = home_suffix
-        self.redirect_suffix = redirect_suffix
-        self.auth_suffix = auth_suffix
-        self.client_id = client_id
-        self.external_token_url = external_token_url
-        self.token_request_headers = token_request_headers
-        self.scope = scope
+    def _start_background(self):
+        """Starts the refresh and sweeper threads in the process serving requests.
+
+        Threads do not survive fork(), so they are not started in __init__,
+        which pre-fork servers such as ``gunicorn --preload`` run in the
+        master process.
+        """
+        pid = os.getpid()
+        if self._background_pid == pid:
+            return
+        for worker in self._background:
+            worker.start()
+        self._background_pid = pid
+
+    def _provider(self, name: str = None) -> Provider:
+        try:
+            return self._providers[name]
+        except KeyError:
+            raise ValueError(f"Unknown provider {name!r}.") from None
+
+    def _make_logout_route(self, logout_suffix: str, logout_redirect: str):
+        # POST only, so that a cross-site link or image cannot log users out
+        @self.server.route(
+            logout_suffix, methods=["POST"], endpoint="dash_auth_external_logout"
+        )
+        def logout():
+            for name in self._providers:
+                try:
+                    self.revoke(provider=name)
+                except Exception:
+                    logger.warning(
+                        "Revoking the %r token on logout failed.", name, exc_info=True
+                    )
+            return redirect(logout_redirect)
+
+    def _on_token_stored(self, token: OAuth2Token, sid: str, provider: str = None):
+        if self._scheduler is not None:
+            self._scheduler.schedule((provider, sid), token.expires_at)
+        p = self._providers[provider]
+        if p.profile is not None:
+            session[p.profile_key] = p.profile.prefetch(token)
+
+    def fetch_profile_on_login(
+        self,
+        endpoints: dict = None,
+        provider: str = None,
+        store: TokenStore = None,
+        ttl: float = 3600.0,
+        max_workers: int = 4,
+    ) -> ProfileFetcher:
+        """Fetches the user's profile in the background as soon as they log in.
+
+        The userinfo endpoint and any ``endpoints`` are requested
+        concurrently, off the request thread, while the browser follows the
+        redirect to home_suffix. ``get_profile`` then usually finds the
+        profile already there.
+
+        Args:
+            endpoints (dict, optional): Names and urls of extra endpoints to fetch, e.g. ``{"me": "https://api.github.com/user"}``. Defaults to None.
+            provider (str, optional): Name of a provider added with add_provider. Defaults to None.
+            store (TokenStore, optional): Where profiles are kept, e.g. a RedisTokenStore shared by all workers. Defaults to an in-process LRU store.
+            ttl (float, optional): Seconds a profile is kept. Defaults to 3600.0.
+            max_workers (int, optional): Threads fetching endpoints. Defaults to 4.
+
+        Returns:
+            ProfileFetcher: The fetcher.
+        """
+        p = self._provider(provider)
+        all_endpoints = {}
+        if p.external_userinfo_url is not None:
+            all_endpoints["userinfo"] = p.external_userinfo_url
+        all_endpoints.update(endpoints or {})
+        if not all_endpoints:
+            raise ValueError(
+                "No profile endpoints, set external_userinfo_url or pass endpoints."
+            )
+        p.profile = ProfileFetcher(
+            all_endpoints,
+            store=store,
+            ttl=ttl,
+            transport=self.transport,
+            hooks=self.hooks,
+            max_workers=max_workers,
+        )
+        return p.profile
+
+    def get_profile(self, provider: str = None) -> dict:
+        """Returns the current user's profile, see fetch_profile_on_login.
+
+        Args:
+            provider (str, optional): Name of a provider added with add_provider. Defaults to None.
+
+        Returns:
+            dict: The JSON response of each profile endpoint, keyed by its name, e.g. ``"userinfo"``.
+        """
+        p = self._provider(provider)
+        if p.profile is None:
+            raise ValueError("Call fetch_profile_on_login first.")
+        profile_id = session.get(p.profile_key)
+        if profile_id is None:
+            profile_id = session[p.profile_key] = p.profile.new_id()
+        return p.profile.get(profile_id, lambda: self.get_token_data(provider))
+
+    def add_hook(self, hook: Hook) -> Hook:
+        """Registers a metrics or tracing hook, see dash_auth_external.hooks.
+
+        Returns:
+            Hook: The registered hook.
+        """
+        self.hooks.add(hook)
+        return hook
+
+    def _validated(
+        self, provider: Provider, new_token: OAuth2Token, token: OAuth2Token
+    ) -> OAuth2Token:
+        if provider.token_validator is not None:
+            provider.token_validator.validate_token(new_token, previous=token)
+        return new_token
+
+    def _refresh_leader(self, provider: Provider, token: OAuth2Token) -> OAuth2Token:
+        self.hooks.count("refresh")
+        with self.hooks.span("refresh"):
+            new_token = guarded(
+                provider.circuit_breaker,
+                lambda: refresh_token(
+                    provider.external_token_url,
+                    token,
+                    provider.token_request_headers,
+                    transport=self.transport,
+                    hooks=self.hooks,
+                    limiter=provider.rate_limiter,
+                ),
+            )
+            new_token = self._validated(provider, new_token, token)
+        self._share_refreshed(provider, token, new_token)
+        return new_token
+
+    def _shared_refresh(self, provider: Provider, token: OAuth2Token) -> OAuth2Token:
+        """Returns the token another worker already obtained with ``token``'s refresh token, if any."""
+        if self.refresh_cache is None:
+            return None
+        data = self.refresh_cache.get(provider.refresh_cache_key(token.refresh_token))
+        if data is None:
+            return None
+        self.hooks.count("refresh_cache_hit")
+        return OAuth2Token(**data)
+
+    def _share_refreshed(
+        self, provider: Provider, token: OAuth2Token, new_token: OAuth2Token
+    ):
+        if self.refresh_cache is None:
+            return
+        ttl = self.refresh_cache_ttl
+        if new_token.expires_at is not None:
+            ttl = min(ttl, new_token.expires_at - time.time())
+        if ttl >= 1:
+            self.refresh_cache.set(
+                provider.refresh_cache_key(token.refresh_token),
+                asdict(new_token),
+                ttl=ttl,
+            )
+
+    def _refresh(self, provider: Provider, token: OAuth2Token) -> OAuth2Token:
+        shared = self._shared_refresh(provider, token)
+        if shared is not None:
+            return shared
+        return provider.refresh_flight.do(
+            token.refresh_token, lambda: self._refresh_leader(provider, token)
+        )
+
+    async def _refresh_async(
+        self, provider: Provider, token: OAuth2Token
+    ) -> OAuth2Token:
+        self.hooks.count("refresh")
+        with self.hooks.span("refresh"):
+            new_token = await guarded_async(
+                provider.circuit_breaker,
+                lambda: async_refresh_token(
+                    provider.external_token_url,
+                    token,
+                    provider.token_request_headers,
+                    transport=self.async_transport,
+                    hooks=self.hooks,
+                ),
+            )
+            new_token = self._validated(provider, new_token, token)
+        self._share_refreshed(provider, token, new_token)
+        return new_token
+
+    def _refresh_stored_token(self, key: tuple) -> float:
+        """Refreshes the token of the ``(provider, sid)`` key if it is within the refresh window.
+
+        Returns:
+            float: The expiry of the token now stored under ``sid``.
+        """
+        name, sid = key
+        token_data = self.token_store.get(sid)
+        if token_data is None:
+            return None
+        token = OAuth2Token(**token_data)
+        if not token.refresh_token or not token.is_expired(self.refresh_ahead):
+            return token.expires_at
+        new_token = self._refresh(self._provider(name), token)
+        self.token_store.set(sid, asdict(new_token), ttl=self.token_ttl)
+        return new_token.expires_at
 
-    def get_token_data(self) -> OAuth2Token:
+    def get_token_data(self, provider: str = None) -> OAuth2Token:
         """Attempts to get a valid access token.
 
+        Args:
+            provider (str, optional): Name of a provider added with add_provider. Defaults to None, the provider this instance was created with.
+
         Returns:
             OAuth2Token: The token data.
         """
-        token_data = _get_token_data_from_session()
+        with self.hooks.span("get_token_data"):
+            return self._get_token_data(self._provider(provider))
 
-        token = OAuth2Token(**token_data)
+    def _expired_error(self) -> TokenExpiredError:
+        self.hooks.count("token_expired_error")
+        return TokenExpiredError(
+            "Token is expired and no refresh token available to refresh token."
+        )
+
+    def _session_token(self, provider: Provider) -> OAuth2Token:
+        token = OAuth2Token(
+            **_get_token_data_from_session(
+                self.token_store, provider.session_key, self.session_codec
+            )
+        )
+        if self._scheduler is not None:
+            self._scheduler.schedule(
+                (provider.name, session_id(provider.session_key)), token.expires_at
+            )
+        return token
+
+    def _store_token(self, provider: Provider, token: OAuth2Token):
+        _set_token_data_in_session(
+            token,
+            self.token_store,
+            provider.session_key,
+            provider.g_key,
+            self.session_codec,
+            self.token_ttl,
+        )
+
+    def _get_token_data(self, provider: Provider) -> OAuth2Token:
+        token = _get_request_token(provider.g_key)
+        if token is not None and not token.is_expired():
+            self.hooks.count("token_cache_hit")
+            return token
+
+        token = self._session_token(provider)
 
         if not token.is_expired():
+            _set_request_token(token, provider.g_key)
             return token
 
+        try:
+            return self.refresh_now(token, provider=provider.name)
+        except CircuitOpenError as e:
+            return self._stale_token(token, e)
+
+    def _stale_token(
+        self, token: OAuth2Token, error: CircuitOpenError
+    ) -> OAuth2Token:
+        """Returns ``token`` if it expired within stale_token_grace, else raises ``error``."""
+        if self.stale_token_grace is None or token.is_expired(-self.stale_token_grace):
+            raise error
+        self.hooks.count("stale_token_served")
+        return token
+
+    def refresh_now(self, token: OAuth2Token, provider: str = None) -> OAuth2Token:
+        """Refreshes ``token`` regardless of its expiry and stores the result in the session.
+
+        Args:
+            token (OAuth2Token): The token to replace, e.g. one rejected by the provider's API.
+            provider (str, optional): Name of the provider that issued ``token``. Defaults to None.
+
+        Returns:
+            OAuth2Token: The refreshed token.
+        """
         if not token.refresh_token:
-            raise TokenExpiredError(
-                "Token is expired and no refresh token available to refresh token."
-            )
+            raise self._expired_error()
 
-        new_token = refresh_token(
-            self.external_token_url, token, self.token_request_headers
-        )
-        _set_token_data_in_session(new_token)
+        p = self._provider(provider)
+        new_token = self._refresh(p, token)
+        self._store_token(p, new_token)
         return new_token
 
-    def get_token(self) -> str:
+    def api_client(
+        self,
+        base_url: str = None,
+        cache: ResponseCache = None,
+        transport: Transport = None,
+        provider: str = None,
+    ) -> ApiClient:
+        """Returns a client for the provider's API that injects the user's access token.
+
+        Args:
+            base_url (str, optional): Relative request urls are joined onto it. Defaults to None.
+            cache (ResponseCache, optional): Caches GET responses per user. Defaults to None.
+            transport (Transport, optional): Pooled HTTP client. Defaults to a process wide Transport that only retries idempotent requests.
+            provider (str, optional): Name of the provider whose token is used. Defaults to None.
+
+        Returns:
+            ApiClient: The client.
+        """
+        return ApiClient(
+            self, base_url=base_url, transport=transport, cache=cache, provider=provider
+        )
+
+    def fetch_all(
+        self, specs, base_url: str = None, provider: str = None, **kwargs
+    ) -> list:
+        """Sends a batch of requests concurrently under one validated token, see ApiClient.fetch_all.
+
+        Args:
+            specs (Iterable): Urls to GET, or dicts with ``url``, an optional ``method`` and any requests keyword arguments.
+            base_url (str, optional): Relative request urls are joined onto it. Defaults to None.
+            provider (str, optional): Name of the provider whose token is used. Defaults to None.
+
+        Returns:
+            list: The responses, in the order of ``specs``.
+        """
+        client = self.api_client(base_url=base_url, provider=provider)
+        return client.fetch_all(specs, **kwargs)
+
+    def paginate(self, url: str, base_url: str = None, provider: str = None, **kwargs):
+        """Follows paginated ``next`` links, yielding pages as they arrive, see ApiClient.paginate."""
+        client = self.api_client(base_url=base_url, provider=provider)
+        return client.paginate(url, **kwargs)
+
+    def get_token(self, provider: str = None) -> str:
         """Attempts to get a valid access token.
 
+        Args:
+            provider (str, optional): Name of a provider added with add_provider. Defaults to None, the provider this instance was created with.
+
+        Returns:
+            str: The access token.
+        """
+        return self.get_token_data(provider).access_token
+
+    def user_key(self, token: OAuth2Token = None, provider: str = None) -> str:
+        """Returns a key for the current user that stays the same across token refreshes.
+
+        This is the token's identity (``sub``, ``user_id``, ...) when the
+        provider sends one. Otherwise it is a random id kept in the session,
+        replaced on every login.
+
+        Args:
+            token (OAuth2Token, optional): The user's token. Defaults to the current token of ``provider``.
+            provider (str, optional): Name of a provider added with add_provider. Defaults to None, the provider this instance was created with.
+
+        Returns:
+            str: The key.
+        """
+        if token is None:
+            token = self.get_token_data(provider)
+        identity = token.identity()
+        if identity is not None:
+            return identity
+        key = self._provider(provider).login_id_key
+        if key not in session:
+            session[key] = secrets.token_urlsafe(16)
+        return "login:" + session[key]
+
+    def cache_per_user(
+        self,
+        ttl: float = 300.0,
+        store: TokenStore = None,
+        provider: str = None,
+        maxsize: int = 1024,
+    ) -> Callable[[Callable], Callable]:
+        """Decorator caching a callback's outputs per user, e.g. for callbacks that call provider APIs.
+
+        Results are keyed by the user, see user_key, by the scopes granted to
+        the token and by the callback's arguments. They are reused across
+        token refreshes, and stop being served when a refresh changes the
+        identity or the scopes. Apply it below ``app.callback``.
+
+        Args:
+            ttl (float, optional): Seconds a result is reused. Defaults to 300.0.
+            store (TokenStore, optional): Where results are kept, e.g. a RedisTokenStore shared by all workers. Defaults to an in-process LRU store.
+            provider (str, optional): Name of the provider whose token identifies the user. Defaults to None, the provider this instance was created with.
+            maxsize (int, optional): Entries kept by the default in-process store. Defaults to 1024.
+
+        Returns:
+            Callable: The decorator.
+        """
+        cache = CallbackCache(store, ttl=ttl, maxsize=maxsize, hooks=self.hooks)
+        return cache.memoize(
+            lambda: self.get_token_data(provider),
+            get_user_key=lambda token: self.user_key(token, provider),
+        )
+
+    def revoke(self, provider: str = None):
+        """Logs the current user out of ``provider``.
+
+        Clears the token from the session, the token store and the refresh
+        schedule, then revokes it at the provider's revocation endpoint
+        (RFC 7009) if one is configured. Must be called in a request context.
+
+        Args:
+            provider (str, optional): Name of a provider added with add_provider. Defaults to None.
+        """
+        p = self._provider(provider)
+        data = session.pop(p.session_key, None)
+        g.pop(p.g_key, None)
+        profile_id = session.pop(p.profile_key, None)
+        session.pop(p.login_id_key, None)
+        if p.profile is not None and profile_id is not None:
+            p.profile.forget(profile_id)
+        if data is None:
+            return
+        token_data = data
+        if self.token_store is not None:
+            sid = data.get("sid")
+            token_data = self.token_store.pop(sid) if sid else None
+            if self._scheduler is not None and sid:
+                self._scheduler.cancel((p.name, sid))
+        elif self.session_codec is not None:
+            token_data = self.session_codec.decode(data)
+        if token_data is not None:
+            self._revoke_at_provider(p, OAuth2Token(**token_data))
+
+    def _revoke_at_provider(self, provider: Provider, token: OAuth2Token):
+        if provider.external_revocation_url is None:
+            return
+        self.hooks.count("revoke")
+        with self.hooks.span("revoke"):
+            if token.refresh_token:
+                revoke_token(
+                    provider.external_revocation_url,
+                    token.refresh_token,
+                    "refresh_token",
+                    provider.client_id,
+                    provider.client_secret,
+                    provider.token_request_headers,
+                    transport=self.transport,
+                )
+            revoke_token(
+                provider.external_revocation_url,
+                token.access_token,
+                "access_token",
+                provider.client_id,
+                provider.client_secret,
+                provider.token_request_headers,
+                transport=self.transport,
+            )
+
+    def revoke_all(
+        self,
+        provider: str = None,
+        where: Callable[[OAuth2Token], bool] = None,
+        batch_size: int = 100,
+        max_workers: int = 8,
+    ) -> dict:
+        """Revokes and deletes the tokens of every user in the token store, e.g. to offboard a tenant.
+
+        The store is walked in batches and each batch is revoked on a
+        bounded thread pool sharing the pooled transport. Tokens whose
+        revocation fails are kept in the store so the call can be repeated.
+
+        Args:
+            provider (str, optional): Name of a provider added with add_provider. Defaults to None.
+            where (Callable[[OAuth2Token], bool], optional): Only revoke tokens it returns True for, e.g. ``lambda t: t.claims["tid"] == tenant``. Defaults to None, revoking all.
+            batch_size (int, optional): Store entries read per batch. Defaults to 100.
+            max_workers (int, optional): Concurrent revocation requests. Defaults to 8.
+
+        Returns:
+            dict: The number of tokens ``revoked`` and ``failed``.
+        """
+        if self.token_store is None:
+            raise ValueError("revoke_all requires a token_store.")
+        p = self._provider(provider)
+        counts = {"revoked": 0, "failed": 0}
+
+        def revoke(entry):
+            sid, token = entry
+            try:
+                self._revoke_at_provider(p, token)
+            except Exception:
+                logger.warning("Revoking the token of %s failed.", sid, exc_info=True)
+                return False
+            self.token_store.delete(sid)
+            if self._scheduler is not None:
+                self._scheduler.cancel((p.name, sid))
+            return True
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for batch in self.token_store.scan(batch_size):
+                entries = [
+                    (sid, OAuth2Token(**data))
+                    for sid, data in batch
+                    if p.owns_sid(sid) and "access_token" in data
+                ]
+                if where is not None:
+                    entries = [(sid, t) for sid, t in entries if where(t)]
+                for ok in pool.map(revoke, entries):
+                    counts["revoked" if ok else "failed"] += 1
+        return counts
+
+    def get_service_token_data(
+        self, scope: str = None, audience: str = None, provider: str = None
+    ) -> OAuth2Token:
+        """Gets a token for the application itself with the client credentials grant.
+
+        Tokens are cached per ``(scope, audience)`` for the whole process,
+        shared by all threads and replaced shortly before they expire. Does
+        not need a request context or a logged in user.
+
+        Args:
+            scope (str, optional): Scope requested from the OAuth2 Provider. Defaults to None.
+            audience (str, optional): The API the token is for, for providers that require it. Defaults to None.
+            provider (str, optional): Name of a provider added with add_provider. Defaults to None.
+
+        Returns:
+            OAuth2Token: The token data.
+        """
+        client = self._provider(provider).client_credentials
+        return client.get_token_data(scope, audience)
+
+    def get_service_token(
+        self, scope: str = None, audience: str = None, provider: str = None
+    ) -> str:
+        """Gets an access token for the application itself, see get_service_token_data.
+
+        Returns:
+            str: The access token.
+        """
+        return self.get_service_token_data(scope, audience, provider).access_token
+
+    async def get_token_data_async(self, provider: str = None) -> OAuth2Token:
+        """Attempts to get a valid access token without blocking the event loop on a refresh.
+
+        Args:
+            provider (str, optional): Name of a provider added with add_provider. Defaults to None.
+
+        Returns:
+            OAuth2Token: The token data.
+        """
+        with self.hooks.span("get_token_data"):
+            return await self._get_token_data_async(self._provider(provider))
+
+    async def _get_token_data_async(self, provider: Provider) -> OAuth2Token:
+        token = _get_request_token(provider.g_key)
+        if token is not None and not token.is_expired():
+            self.hooks.count("token_cache_hit")
+            return token
+
+        token = self._session_token(provider)
+
+        if not token.is_expired():
+            _set_request_token(token, provider.g_key)
+            return token
+
+        if not token.refresh_token:
+            raise self._expired_error()
+
+        new_token = self._shared_refresh(provider, token)
+        if new_token is None:
+            try:
+                new_token = await provider.refresh_flight.do_async(
+                    token.refresh_token, lambda: self._refresh_async(provider, token)
+                )
+            except CircuitOpenError as e:
+                return self._stale_token(token, e)
+        self._store_token(provider, new_token)
+        return new_token
+
+    async def get_token_async(self, provider: str = None) -> str:
+        """Attempts to get a valid access token without blocking the event loop on a refresh.
+
+        Args:
+            provider (str, optional): Name of a provider added with add_provider. Defaults to None.
+
         Returns:
             str: The access token.
         """
-        return self.get_token_data().access_token
+        return (await self.get_token_data_async(provider)).access_token
 
 
-def refresh_token(url: str, token_data: OAuth2Token, headers: dict) -> OAuth2Token:
+def refresh_token(
+    url: str,
+    token_data: OAuth2Token,
+    headers: dict,
+    transport: Transport = None,
+    hooks: Hooks = NO_HOOKS,
+    limiter: TokenRequestLimiter = None,
+) -> OAuth2Token:
     body = {
         "grant_type": "refresh_token",
         "refresh_token": token_data.refresh_token,
     }
-    data = token_request(url, body, headers)
-
-    new_token = OAuth2Token(
-        access_token=data["access_token"],
-        token_type=data.get("token_type"),
-        expires_in=data.get("expires_in"),
-        refresh_token=data.get("refresh_token"),
-        token_data=data,
+    data = token_request(
+        url, body, headers, transport=transport, hooks=hooks, limiter=limiter
     )
+    return OAuth2Token.from_response(data, refresh_token=token_data.refresh_token)
+
 
-    return new_token
+def revoke_token(
+    url: str,
+    token: str,
+    token_type_hint: str,
+    client_id: str,
+    client_secret: str = None,
+    headers: dict = None,
+    transport: Transport = None,
+):
+    """Revokes ``token`` at an RFC 7009 revocation endpoint."""
+    if transport is None:
+        transport = get_default_transport()
+    body = {"token": token, "token_type_hint": token_type_hint, "client_id": client_id}
+    if client_secret:
+        body["client_secret"] = client_secret
+    r = transport.post(url, data=body, headers=headers or {})
+    r.raise_for_status()
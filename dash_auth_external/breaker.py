@@ -0,0 +1,174 @@
+"""Circuit breaker for calls to the OAuth2 provider."""
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable
+from dash_auth_external.exceptions import CircuitOpenError, RateLimitError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def _is_neutral(error: BaseException) -> bool:
+    """True for outcomes that say nothing about the provider's health.
+
+    These are cancellations and errors raised on the client side before the
+    provider was reached, such as a full rate limiter queue.
+    """
+    return not isinstance(error, Exception) or isinstance(
+        error, (RateLimitError, CircuitOpenError)
+    )
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """True for errors that mean the provider is unavailable.
+
+    Responses with a status below 500, e.g. ``invalid_grant``, show the
+    provider is up and do not count as failures. Neither do errors raised
+    on the client side before the provider was reached, such as a full
+    rate limiter queue.
+    """
+    if isinstance(error, (RateLimitError, CircuitOpenError)):
+        return False
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is None or status >= 500
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        is_failure: Callable[[BaseException], bool] = is_provider_failure,
+    ):
+        """Fails calls to an unavailable provider fast instead of letting them pile up.
+
+        After ``failure_threshold`` consecutive failures the circuit opens
+        and calls raise CircuitOpenError without reaching the provider. Once
+        ``reset_timeout`` seconds have passed it is half open: up to
+        ``half_open_max_calls`` probe calls go through, a success closes
+        the circuit and a failure opens it again. Cancelled calls and errors
+        raised before the provider was reached leave the state unchanged.
+
+        Args:
+            failure_threshold (int, optional): Consecutive failures that open the circuit. Defaults to 5.
+            reset_timeout (float, optional): Seconds the circuit stays open before probing. Defaults to 30.0.
+            half_open_max_calls (int, optional): Concurrent probe calls allowed while half open. Defaults to 1.
+            is_failure (Callable, optional): Decides whether an exception counts as a failure. Defaults to is_provider_failure.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.is_failure = is_failure
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """``"closed"``, ``"open"`` or ``"half_open"``."""
+        with self._lock:
+            if self._state == OPEN and self._reset_due():
+                return HALF_OPEN
+            return self._state
+
+    def _reset_due(self) -> bool:
+        return time.monotonic() - self._opened_at >= self.reset_timeout
+
+    def allow(self):
+        """Reserves a call, raising CircuitOpenError if the circuit does not allow it."""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN:
+                if not self._reset_due():
+                    raise CircuitOpenError("The provider is unavailable.")
+                self._state = HALF_OPEN
+                self._probes = 0
+            if self._probes >= self.half_open_max_calls:
+                raise CircuitOpenError("The provider is being probed.")
+            self._probes += 1
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info("Provider recovered, closing circuit")
+            self._state = CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def release(self):
+        """Frees a call reserved by :meth:`allow` without recording an outcome."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(
+                        "Opening circuit after %d provider failures", self._failures
+                    )
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probes = 0
+
+    def _record(self, error: BaseException = None):
+        if error is not None and _is_neutral(error):
+            self.release()
+        elif error is not None and self.is_failure(error):
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Calls ``fn`` if the circuit allows it and records the outcome.
+
+        Raises:
+            CircuitOpenError: The circuit is open.
+        """
+        self.allow()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._record(e)
+            raise
+        self._record()
+        return result
+
+    async def call_async(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Awaits ``fn()`` if the circuit allows it and records the outcome.
+
+        Raises:
+            CircuitOpenError: The circuit is open.
+        """
+        self.allow()
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._record(e)
+            raise
+        self._record()
+        return result
+
+
+def guarded(breaker: CircuitBreaker, fn: Callable[[], Any]) -> Any:
+    """Calls ``fn`` through ``breaker``, or directly when there is none."""
+    if breaker is None:
+        return fn()
+    return breaker.call(fn)
+
+
+async def guarded_async(breaker: CircuitBreaker, fn: Callable[[], Awaitable[Any]]):
+    """Awaits ``fn()`` through ``breaker``, or directly when there is none."""
+    if breaker is None:
+        return await fn()
+    return await breaker.call_async(fn)
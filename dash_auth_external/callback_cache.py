@@ -0,0 +1,129 @@
+"""Per-user memoization of Dash callback outputs.
+
+Entries are keyed by who the user is and what they were granted, not by the
+access token, so they survive token refreshes. A refresh that changes the
+token's identity or scopes changes the key, and the entries cached under the
+old one are never served again. Tokens without an identity need a user key
+from elsewhere, e.g. DashAuthExternal.user_key.
+"""
+import functools
+import hashlib
+import json
+from typing import Any, Callable
+from dash_auth_external.hooks import NO_HOOKS, Hooks
+from dash_auth_external.singleflight import SingleFlight
+from dash_auth_external.store import MemoryTokenStore, TokenStore
+from dash_auth_external.token import OAuth2Token
+
+
+def token_fingerprint(token: OAuth2Token, user: str = None) -> str:
+    """Identifies the user and the scopes granted to ``token``.
+
+    Args:
+        token (OAuth2Token): The token.
+        user (str, optional): Key of the token's user. Defaults to None, ``token.identity()``.
+
+    Returns:
+        str: A digest of the user and the sorted scopes.
+
+    Raises:
+        ValueError: No user was given and the token has no identity.
+    """
+    if user is None:
+        user = token.identity()
+    if user is None:
+        raise ValueError(
+            "The token has no identity claim, a user key must be supplied."
+        )
+    scope = (token.token_data or {}).get("scope") or ()
+    if isinstance(scope, str):
+        scope = scope.split()
+    raw = f"{user}\n{' '.join(sorted(scope))}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class CallbackCache:
+    def __init__(
+        self,
+        store: TokenStore = None,
+        ttl: float = 300.0,
+        maxsize: int = 1024,
+        hooks: Hooks = NO_HOOKS,
+    ):
+        """Memoizes function results per user and arguments.
+
+        Concurrent calls with the same user and arguments run the function
+        once in each process. Exceptions, e.g. ``PreventUpdate``, are not
+        cached.
+
+        Args:
+            store (TokenStore, optional): Where results are kept, e.g. a SQLiteTokenStore on disk or a RedisTokenStore shared by all workers. Those store JSON, so cached functions must return JSON types. Defaults to an in-process MemoryTokenStore.
+            ttl (float, optional): Seconds a result is reused. Defaults to 300.0.
+            maxsize (int, optional): Entries kept by the default in-process store before the least recently used is evicted. Defaults to 1024.
+            hooks (Hooks, optional): Metrics and tracing hooks. Defaults to NO_HOOKS.
+        """
+        self.store = store if store is not None else MemoryTokenStore(maxsize)
+        self.ttl = ttl
+        self.hooks = hooks
+        self._flight = SingleFlight()
+
+    def key(
+        self,
+        namespace: str,
+        token: OAuth2Token,
+        args: tuple,
+        kwargs: dict,
+        user: str = None,
+    ):
+        """Returns the store key of a call made by ``token``'s user, or by ``user``."""
+        raw = json.dumps(
+            [args, kwargs], sort_keys=True, default=repr, separators=(",", ":")
+        )
+        digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+        return f"callback:{namespace}:{token_fingerprint(token, user)}:{digest}"
+
+    def call(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Returns the result cached under ``key``, calling ``fn`` on a miss."""
+        entry = self.store.get(key)
+        if entry is not None:
+            self.hooks.count("callback_cache_hit")
+            return entry["value"]
+        return self._flight.do(key, lambda: self._fill(key, fn))
+
+    def _fill(self, key: str, fn: Callable[[], Any]) -> Any:
+        entry = self.store.get(key)
+        if entry is not None:
+            return entry["value"]
+        self.hooks.count("callback_cache_miss")
+        value = fn()
+        self.store.set(key, {"value": value}, ttl=self.ttl)
+        return value
+
+    def memoize(
+        self,
+        get_token_data: Callable[[], OAuth2Token],
+        namespace: str = None,
+        get_user_key: Callable[[OAuth2Token], str] = None,
+    ) -> Callable[[Callable], Callable]:
+        """Returns a decorator caching the results of a function per user.
+
+        Args:
+            get_token_data (Callable): Returns the current user's token.
+            namespace (str, optional): Distinguishes the function's entries in the store. Defaults to its module and qualified name.
+            get_user_key (Callable, optional): Returns a stable key of the token's user. Defaults to None, the token's identity.
+        """
+
+        def decorator(fn: Callable) -> Callable:
+            name = namespace or f"{fn.__module__}.{fn.__qualname__}"
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                token = get_token_data()
+                user = get_user_key(token) if get_user_key is not None else None
+                key = self.key(name, token, args, kwargs, user)
+                return self.call(key, lambda: fn(*args, **kwargs))
+
+            wrapper.cache = self
+            return wrapper
+
+        return decorator
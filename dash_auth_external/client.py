@@ -0,0 +1,344 @@
+"""An HTTP client for provider APIs that injects the current user's access token."""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Iterable, Iterator, List
+from urllib.parse import urljoin, urlparse
+from dash_auth_external.token import OAuth2Token
+from dash_auth_external.transport import Transport, get_default_api_transport
+
+if TYPE_CHECKING:
+    import requests
+
+
+def _cache_control(response: "requests.Response") -> dict:
+    directives = {}
+    for part in response.headers.get("Cache-Control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+def _ttl(directives: dict, default: float) -> float:
+    if "max-age" in directives:
+        try:
+            return min(default, float(directives["max-age"]))
+        except ValueError:
+            pass
+    return default
+
+
+def _next_link(page, response: "requests.Response", next_key: str) -> str:
+    value = page
+    for part in next_key.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    if value:
+        return value
+    return response.links.get("next", {}).get("url")
+
+
+def _origin(url: str) -> tuple:
+    parts = urlparse(url)
+    port = parts.port or {"http": 80, "https": 443}.get(parts.scheme)
+    return parts.scheme.lower(), parts.hostname, port
+
+
+class _CacheEntry:
+    def __init__(self, response: "requests.Response", expires_at: float):
+        self.response = response
+        self.expires_at = expires_at
+        self.etag = response.headers.get("ETag")
+
+
+class ResponseCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        """Per-user cache for GET responses honouring Cache-Control and ETag.
+
+        Entries are keyed by user, so ``private`` responses are safe to keep.
+        ``no-store`` responses are not cached and ``max-age`` caps the
+        lifetime at ``ttl``. Expired entries with an ETag are revalidated
+        with If-None-Match and reused on a 304.
+
+        Args:
+            maxsize (int, optional): Entries kept before the least recently used is evicted. Defaults to 1024.
+            ttl (float, optional): Maximum seconds a response is served without revalidation. Defaults to 60.0.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> _CacheEntry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def store(self, key: tuple, response: "requests.Response"):
+        directives = _cache_control(response)
+        if "no-store" in directives:
+            return
+        ttl = 0 if "no-cache" in directives else _ttl(directives, self.ttl)
+        entry = _CacheEntry(response, time.time() + ttl)
+        if ttl <= 0 and entry.etag is None:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def revalidated(
+        self, key: tuple, entry: _CacheEntry, response: "requests.Response"
+    ):
+        """Extends ``entry`` after the provider answered 304 Not Modified."""
+        entry.expires_at = time.time() + _ttl(_cache_control(response), self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+
+    def clear(self, user: str = None):
+        """Drops all entries, or only those of ``user``."""
+        with self._lock:
+            if user is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == user]:
+                del self._entries[key]
+
+
+class ApiClient:
+    def __init__(
+        self,
+        auth,
+        base_url: str = None,
+        transport: Transport = None,
+        cache: ResponseCache = None,
+        provider: str = None,
+    ):
+        """Calls provider APIs with the current user's bearer token.
+
+        A 401 response triggers one token refresh and a retry. Must be used
+        in the context of a dash callback, like DashAuthExternal.get_token.
+
+        Args:
+            auth (DashAuthExternal): Supplies and refreshes the user's token.
+            base_url (str, optional): Relative request urls are joined onto it. Defaults to None.
+            transport (Transport, optional): Pooled HTTP client. Defaults to a process wide Transport that only retries idempotent requests, separate from the one used for token requests.
+            cache (ResponseCache, optional): Caches GET responses per user. Defaults to None.
+            provider (str, optional): Name of the provider whose token is used, see DashAuthExternal.add_provider. Defaults to None.
+        """
+        self.auth = auth
+        self.base_url = base_url
+        self.transport = transport or get_default_api_transport()
+        self.cache = cache
+        self.provider = provider
+
+    def _url(self, url: str) -> str:
+        return urljoin(self.base_url, url) if self.base_url else url
+
+    def _send(self, method: str, url: str, token: OAuth2Token, **kwargs):
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers["Authorization"] = f"Bearer {token.access_token}"
+        return self.transport.request(method, url, headers=headers, **kwargs)
+
+    def _user(self, token: OAuth2Token) -> str:
+        """Keys cache entries by user, read in the request context before any worker thread runs."""
+        if self.cache is None:
+            return None
+        return self.auth.user_key(token, provider=self.provider)
+
+    def _cached_send(
+        self, method: str, url: str, token: OAuth2Token, user: str, **kwargs
+    ):
+        key = entry = None
+        if self.cache is not None and method == "GET":
+            params = kwargs.get("params")
+            params = tuple(sorted(params.items())) if isinstance(params, dict) else params
+            key = (user, url, params)
+            entry = self.cache.get(key)
+            if entry is not None:
+                if entry.expires_at > time.time():
+                    return entry.response
+                if entry.etag is not None:
+                    headers = dict(kwargs.get("headers") or {})
+                    headers["If-None-Match"] = entry.etag
+                    kwargs["headers"] = headers
+
+        response = self._send(method, url, token, **kwargs)
+
+        if key is not None:
+            if response.status_code == 304 and entry is not None:
+                self.cache.revalidated(key, entry, response)
+                return entry.response
+            if response.status_code == 200:
+                self.cache.store(key, response)
+        return response
+
+    def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        """Sends a request with the Authorization header set.
+
+        Args:
+            method (str): HTTP method.
+            url (str): Absolute url, or relative to base_url.
+            **kwargs: Passed on to requests.
+
+        Returns:
+            requests.Response: The response, possibly served from the cache.
+        """
+        method = method.upper()
+        url = self._url(url)
+        token = self.auth.get_token_data(self.provider)
+        user = self._user(token)
+        response = self._cached_send(method, url, token, user, **kwargs)
+        if response.status_code == 401 and token.refresh_token:
+            token = self.auth.refresh_now(token, provider=self.provider)
+            response = self._cached_send(method, url, token, user, **kwargs)
+        return response
+
+    def fetch_all(
+        self, specs: Iterable, max_workers: int = 8, per_host: int = 4
+    ) -> List["requests.Response"]:
+        """Sends a batch of requests concurrently under one validated token.
+
+        Requests run on a bounded thread pool with at most ``per_host``
+        in flight to any one host. If any come back 401, the token is
+        refreshed once and those requests are retried.
+
+        Args:
+            specs (Iterable): Urls to GET, or dicts with ``url``, an optional ``method`` and any requests keyword arguments.
+            max_workers (int, optional): Size of the thread pool. Defaults to 8.
+            per_host (int, optional): Concurrent requests allowed per host. Defaults to 4.
+
+        Returns:
+            List[requests.Response]: The responses, in the order of ``specs``.
+        """
+        specs = [
+            {"url": spec} if isinstance(spec, str) else dict(spec) for spec in specs
+        ]
+        if not specs:
+            return []
+        token = self.auth.get_token_data(self.provider)
+        user = self._user(token)
+        responses = self._fetch_batch(specs, token, user, max_workers, per_host)
+
+        retry = [i for i, r in enumerate(responses) if r.status_code == 401]
+        if retry and token.refresh_token:
+            token = self.auth.refresh_now(token, provider=self.provider)
+            retried = self._fetch_batch(
+                [specs[i] for i in retry], token, user, max_workers, per_host
+            )
+            for i, response in zip(retry, retried):
+                responses[i] = response
+        return responses
+
+    def _fetch_batch(
+        self,
+        specs: list,
+        token: OAuth2Token,
+        user: str,
+        max_workers: int,
+        per_host: int,
+    ) -> list:
+        limits = {}
+        limits_lock = threading.Lock()
+
+        def fetch(spec):
+            spec = dict(spec)
+            method = spec.pop("method", "GET").upper()
+            url = self._url(spec.pop("url"))
+            host = urlparse(url).netloc
+            with limits_lock:
+                limit = limits.setdefault(host, threading.BoundedSemaphore(per_host))
+            with limit:
+                return self._cached_send(method, url, token, user, **spec)
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(specs))) as pool:
+            return list(pool.map(fetch, specs))
+
+    def paginate(
+        self,
+        url: str,
+        next_key: str = "next",
+        items_key: str = None,
+        max_pages: int = None,
+        **kwargs,
+    ) -> Iterator:
+        """Follows paginated ``next`` links, yielding each page as soon as it arrives.
+
+        The next page is fetched in the background while the current one is
+        being consumed. The next link is read from the JSON body at
+        ``next_key`` (dotted for nested keys, e.g. "paging.next") or from a
+        ``Link: rel="next"`` header. Next links are only followed on the
+        scheme, host and port of the first page, so a page cannot send the
+        user's token elsewhere.
+
+        Args:
+            url (str): The first page, absolute or relative to base_url.
+            next_key (str, optional): Path of the next page url in the body. Defaults to "next".
+            items_key (str, optional): Yield the items under this key instead of whole pages. Defaults to None.
+            max_pages (int, optional): Stop after this many pages. Defaults to None.
+            **kwargs: Passed on to requests for the first page.
+
+        Yields:
+            The parsed JSON of each page, or each of its items.
+
+        Raises:
+            ValueError: A next link points to another origin than the first page, raised after the page holding it.
+        """
+        token = self.auth.get_token_data(self.provider)
+        user = self._user(token)
+        url = self._url(url)
+        origin = _origin(url)
+        pages = 0
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = pool.submit(
+                self._cached_send, "GET", url, token, user, **kwargs
+            )
+            while pending is not None:
+                response = pending.result()
+                if response.status_code == 401 and token.refresh_token:
+                    token = self.auth.refresh_now(token, provider=self.provider)
+                    response = self._cached_send("GET", url, token, user, **kwargs)
+                response.raise_for_status()
+                page = response.json()
+                pages += 1
+
+                next_url = _next_link(page, response, next_key)
+                pending = refused = None
+                if next_url and (max_pages is None or pages < max_pages):
+                    next_url = self._url(next_url)
+                    if _origin(next_url) != origin:
+                        refused = next_url
+                    else:
+                        url, kwargs = next_url, {}
+                        pending = pool.submit(
+                            self._cached_send, "GET", url, token, user
+                        )
+
+                if items_key is None:
+                    yield page
+                else:
+                    yield from page.get(items_key) or []
+                if refused is not None:
+                    raise ValueError(
+                        f"Not following the next link to {refused}, "
+                        "it is on another origin than the first page."
+                    )
+
+    def get(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("DELETE", url, **kwargs)
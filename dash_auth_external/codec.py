@@ -0,0 +1,128 @@
+"""Compact encoding of token data for the session cookie.
+
+``asdict(token)`` repeats ``access_token``, ``refresh_token``, ``token_type``
+and ``expires_in`` inside ``token_data`` and carries every key of the token
+response. ``CompactTokenCodec`` writes each field once, as a positional JSON
+list, and keeps only allowlisted response keys. Session values that are not
+lists are the old ``asdict`` format and are decoded unchanged.
+"""
+import base64
+import json
+import zlib
+from typing import Iterable
+from dash_auth_external.token import IDENTITY_KEYS
+
+FIELDS = ("access_token", "token_type", "expires_in", "refresh_token")
+DEFAULT_KEEP_KEYS = ("scope", *IDENTITY_KEYS)
+
+_PLAIN = "c1"
+_COMPRESSED = "z1"
+
+
+class CompactTokenCodec:
+    def __init__(
+        self,
+        keep_keys: Iterable[str] = DEFAULT_KEEP_KEYS,
+        compress: bool = False,
+    ):
+        """Encodes token data for the session cookie without duplicated fields.
+
+        ``expires_at`` is truncated to whole seconds, so tokens are treated
+        as expired up to a second early. The ``id_token`` is dropped by
+        default, its verified claims are kept in ``claims`` when a
+        JWTValidator is configured. Flask's default session already deflates
+        the signed cookie, ``compress`` helps with session interfaces that
+        do not.
+
+        Args:
+            keep_keys (Iterable[str], optional): Keys of the token response kept in ``token_data``, None keeps all. Defaults to DEFAULT_KEEP_KEYS.
+            compress (bool, optional): Deflate the payload when that makes it smaller. Defaults to False.
+        """
+        self.keep_keys = None if keep_keys is None else frozenset(keep_keys)
+        self.compress = compress
+
+    def encode(self, token_data: dict) -> list:
+        """Encodes ``asdict(token)`` into the compact format.
+
+        Args:
+            token_data (dict): The token data to encode.
+
+        Returns:
+            list: A JSON serializable payload.
+        """
+        extra = {
+            k: v
+            for k, v in (token_data.get("token_data") or {}).items()
+            if k not in FIELDS and (self.keep_keys is None or k in self.keep_keys)
+        }
+        expires_at = token_data.get("expires_at")
+        payload = [
+            _PLAIN,
+            token_data.get("access_token"),
+            token_data.get("token_type"),
+            token_data.get("expires_in"),
+            token_data.get("refresh_token"),
+            None if expires_at is None else int(expires_at),
+            extra or None,
+            token_data.get("claims"),
+        ]
+        while payload[-1] is None:
+            payload.pop()
+        if not self.compress:
+            return payload
+
+        raw = json.dumps(payload[1:], separators=(",", ":")).encode("utf-8")
+        packed = base64.urlsafe_b64encode(zlib.compress(raw, 9)).decode("ascii")
+        return [_COMPRESSED, packed] if len(packed) < len(raw) else payload
+
+    def decode(self, value) -> dict:
+        """Decodes a session value written by ``encode`` or in the old ``asdict`` format.
+
+        Args:
+            value: The session value.
+
+        Returns:
+            dict: Keyword arguments for OAuth2Token.
+        """
+        if not isinstance(value, list):
+            return value
+        if value[0] == _COMPRESSED:
+            value = [
+                _PLAIN,
+                *json.loads(zlib.decompress(base64.urlsafe_b64decode(value[1]))),
+            ]
+        elif value[0] != _PLAIN:
+            raise ValueError(f"Unknown token encoding {value[0]!r}.")
+
+        value = value + [None] * (8 - len(value))
+        fields = dict(zip(FIELDS, value[1:5]))
+        token_data = dict(value[6] or {})
+        token_data.update((k, v) for k, v in fields.items() if v is not None)
+        return {
+            **fields,
+            "expires_at": value[5],
+            "token_data": token_data,
+            "claims": value[7],
+        }
+
+
+def peek_expiry(value) -> tuple:
+    """Reads ``expires_at`` and ``refresh_token`` from a session value without decoding it.
+
+    Both the compact and the old ``asdict`` format are read. Compressed
+    payloads and session ids of store backed sessions carry neither.
+
+    Args:
+        value: The session value.
+
+    Returns:
+        tuple: ``(expires_at, refresh_token)``, None where unknown.
+    """
+    if isinstance(value, list):
+        if value[0] != _PLAIN:
+            return None, None
+        return (
+            value[5] if len(value) > 5 else None,
+            value[4] if len(value) > 4 else None,
+        )
+    return value.get("expires_at"), value.get("refresh_token")
@@ -1 +1,2 @@
 FLASK_SESSION_TOKEN_KEY = "TokenDataDashAuthExternal"
+FLASK_G_TOKEN_KEY = "dash_auth_external_token"
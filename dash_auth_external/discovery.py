@@ -0,0 +1,87 @@
+"""OpenID Connect discovery with in-memory and on-disk caching."""
+import logging
+import threading
+import time
+from dash_auth_external.singleflight import FileLockBackend
+from dash_auth_external.transport import Transport, get_default_transport
+
+logger = logging.getLogger(__name__)
+
+WELL_KNOWN_PATH = "/.well-known/openid-configuration"
+
+_memory_cache = {}
+_memory_cache_lock = threading.Lock()
+
+
+def _fetch(issuer_url: str, transport: Transport) -> dict:
+    r = transport.get(issuer_url.rstrip("/") + WELL_KNOWN_PATH)
+    r.raise_for_status()
+    metadata = r.json()
+    if metadata.get("issuer", "").rstrip("/") != issuer_url.rstrip("/"):
+        raise ValueError(
+            f"Discovery document issuer {metadata.get('issuer')!r} does not match {issuer_url!r}."
+        )
+    return metadata
+
+
+def fetch_provider_metadata(
+    issuer_url: str,
+    cache_dir: str = None,
+    ttl: float = 3600.0,
+    transport: Transport = None,
+) -> dict:
+    """Fetches the provider's OpenID Connect discovery document, cached for ``ttl`` seconds.
+
+    The document is cached in memory and, with ``cache_dir``, on disk under a
+    file lock, so workers starting together make a single request. If the
+    provider cannot be reached, the last cached copy is returned regardless
+    of its age.
+
+    Args:
+        issuer_url (str): The issuer, e.g. "https://accounts.google.com".
+        cache_dir (str, optional): Directory for the on-disk cache shared by worker processes. Defaults to None.
+        ttl (float, optional): Seconds a cached document is used without refetching. Defaults to 3600.0.
+        transport (Transport, optional): HTTP client for the request. Defaults to the shared Transport.
+
+    Returns:
+        dict: The discovery document.
+    """
+    if transport is None:
+        transport = get_default_transport()
+
+    with _memory_cache_lock:
+        cached = _memory_cache.get(issuer_url)
+    if cached is not None and time.time() - cached[1] < ttl:
+        return cached[0]
+
+    if cache_dir is None:
+        try:
+            metadata = _fetch(issuer_url, transport)
+        except Exception:
+            if cached is None:
+                raise
+            logger.warning("OIDC discovery failed, using cached document.", exc_info=True)
+            return cached[0]
+        with _memory_cache_lock:
+            _memory_cache[issuer_url] = (metadata, time.time())
+        return metadata
+
+    with FileLockBackend(cache_dir, result_ttl=ttl).locked(issuer_url) as locked:
+        metadata = locked.read()
+        if metadata is None:
+            try:
+                metadata = _fetch(issuer_url, transport)
+            except Exception:
+                metadata = locked.read(stale_ok=True)
+                if metadata is None and cached is not None:
+                    metadata = cached[0]
+                if metadata is None:
+                    raise
+                logger.warning(
+                    "OIDC discovery failed, using cached document.", exc_info=True
+                )
+            else:
+                locked.write(metadata)
+    with _memory_cache_lock:
+        _memory_cache[issuer_url] = (metadata, time.time())
+    return metadata
@@ -2,3 +2,27 @@ class TokenExpiredError(Exception):
     """Exception raised when an expired token is encountered."""
 
     pass
+
+
+class TokenValidationError(Exception):
+    """Exception raised when a JWT fails local validation."""
+
+    pass
+
+
+class InvalidStateError(Exception):
+    """Exception raised when a callback carries an unknown, expired or reused state."""
+
+    pass
+
+
+class CircuitOpenError(Exception):
+    """Exception raised when a provider call is refused because its circuit breaker is open."""
+
+    pass
+
+
+class RateLimitError(Exception):
+    """Exception raised when a token request cannot be sent within the client side rate limit."""
+
+    pass
@@ -0,0 +1,83 @@
+"""Keeps unauthenticated requests away from the Dash app."""
+import time
+from typing import TYPE_CHECKING, Iterable
+from dash_auth_external.codec import peek_expiry
+
+if TYPE_CHECKING:
+    from flask.app import Flask
+
+DEFAULT_PUBLIC_PREFIXES = (
+    "/assets/",
+    "/static/",
+    "/_dash-component-suites/",
+    "/_favicon.ico",
+    "/_reload-hash",
+)
+
+
+def is_authenticated(value) -> bool:
+    """Whether a session value holds a token that is unexpired or can be refreshed."""
+    if value is None:
+        return False
+    expires_at, refresh_token = peek_expiry(value)
+    return bool(refresh_token) or expires_at is None or expires_at > time.time()
+
+
+class RouteGuard:
+    def __init__(
+        self,
+        public_paths: Iterable[str] = (),
+        public_prefixes: Iterable[str] = DEFAULT_PUBLIC_PREFIXES,
+        public_dash_endpoints: Iterable[str] = (),
+    ):
+        """Rejects requests from users who are not logged in, before they reach a view or callback.
+
+        Only the session cookie is read: the guard checks that it holds a
+        token and that the token is unexpired or has a refresh token. It
+        never builds an OAuth2Token, reads the token store or refreshes.
+        Page requests are redirected to the login route, Dash's
+        ``_dash-*`` requests and requests other than GET get a 401.
+
+        The login, redirect and logout routes of DashAuthExternal are
+        always public.
+
+        Args:
+            public_paths (Iterable[str], optional): Paths served without login. Defaults to ().
+            public_prefixes (Iterable[str], optional): Path prefixes served without login, e.g. static assets. Defaults to DEFAULT_PUBLIC_PREFIXES.
+            public_dash_endpoints (Iterable[str], optional): Dash endpoints served without login under any pathname prefix, e.g. ``"_dash-layout"``. Defaults to ().
+        """
+        self.public_paths = set(public_paths)
+        self.public_prefixes = tuple(public_prefixes)
+        self.public_dash_endpoints = frozenset(public_dash_endpoints)
+
+    def allow(self, *paths: str):
+        """Serves ``paths`` without login."""
+        self.public_paths.update(paths)
+
+    def is_public(self, path: str) -> bool:
+        return (
+            path in self.public_paths
+            or path.startswith(self.public_prefixes)
+            or path.rpartition("/")[2] in self.public_dash_endpoints
+        )
+
+    def register(self, app: "Flask", session_key: str, login_url: str):
+        """Installs the guard as a ``before_request`` handler of ``app``.
+
+        Args:
+            app (Flask): The server.
+            session_key (str): Session key of the token.
+            login_url (str): Where page requests are redirected to.
+        """
+        from flask import abort, redirect, request, session
+
+        @app.before_request
+        def require_login():
+            path = request.path
+            if self.is_public(path) or is_authenticated(session.get(session_key)):
+                return None
+            if request.method == "GET" and "/_dash-" not in path:
+                return redirect(login_url)
+            abort(401)
+
+        return require_login
@@ -0,0 +1,244 @@
+"""Metrics and tracing hooks for the token flow.
+
+Instrumented code calls ``Hooks`` unconditionally. With no hook registered
+``span`` returns a shared no-op context manager and ``count``/``observe``
+loop over an empty list, anything costly to compute is guarded by
+``if hooks:``.
+"""
+import bisect
+import logging
+import threading
+import time
+from typing import Any
+
+
+class Hook:
+    """Base class for hooks, override the methods of interest."""
+
+    def count(self, name: str, value: float, attrs: dict):
+        pass
+
+    def observe(self, name: str, value: float, attrs: dict):
+        pass
+
+    def start_span(self, name: str, attrs: dict) -> Any:
+        return None
+
+    def end_span(
+        self, handle: Any, name: str, duration: float, error: Exception, attrs: dict
+    ):
+        pass
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, hooks: list, name: str, attrs: dict):
+        self.hooks = hooks
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.handles = [hook.start_span(self.name, self.attrs) for hook in self.hooks]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        # in reverse, so hooks that set a current context restore it in order
+        for hook, handle in reversed(list(zip(self.hooks, self.handles))):
+            hook.end_span(handle, self.name, duration, exc, self.attrs)
+        return False
+
+
+class Hooks:
+    """The hooks registered on a DashAuthExternal instance."""
+
+    def __init__(self):
+        self._hooks = []
+
+    def add(self, hook: Hook):
+        self._hooks = [*self._hooks, hook]
+
+    def remove(self, hook: Hook):
+        self._hooks = [h for h in self._hooks if h is not hook]
+
+    def __bool__(self):
+        return bool(self._hooks)
+
+    def count(self, name: str, value: float = 1, **attrs):
+        for hook in self._hooks:
+            hook.count(name, value, attrs)
+
+    def observe(self, name: str, value: float, **attrs):
+        for hook in self._hooks:
+            hook.observe(name, value, attrs)
+
+    def span(self, name: str, **attrs):
+        """Times the enclosed block, reporting its duration and any exception to each hook."""
+        if not self._hooks:
+            return _NULL_SPAN
+        return _Span(self._hooks, name, attrs)
+
+
+NO_HOOKS = Hooks()
+
+
+class LoggingHook(Hook):
+    def __init__(self, logger: logging.Logger = None, level: int = logging.DEBUG):
+        """Logs every event, observation and span.
+
+        Args:
+            logger (logging.Logger, optional): Defaults to the dash_auth_external.hooks logger.
+            level (int, optional): Log level. Defaults to logging.DEBUG.
+        """
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+
+    def count(self, name, value, attrs):
+        self.logger.log(self.level, "%s +%s %s", name, value, attrs)
+
+    def observe(self, name, value, attrs):
+        self.logger.log(self.level, "%s=%s %s", name, value, attrs)
+
+    def end_span(self, handle, name, duration, error, attrs):
+        if error is None:
+            self.logger.log(self.level, "%s took %.2fms %s", name, duration * 1e3, attrs)
+        else:
+            self.logger.log(
+                self.level, "%s failed after %.2fms: %r", name, duration * 1e3, error
+            )
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+class PrometheusHook(Hook):
+    def __init__(self, namespace: str = "dash_auth_external", buckets=DEFAULT_BUCKETS):
+        """Aggregates counters and histograms, exposed in the Prometheus text format.
+
+        Span durations become ``<namespace>_<span>_seconds`` histograms and a
+        ``<namespace>_<span>_failures_total`` counter, counts become
+        ``<namespace>_<name>_total`` counters and observations become
+        ``<namespace>_<name>`` histograms.
+
+        Args:
+            namespace (str, optional): Prefix for metric names. Defaults to "dash_auth_external".
+            buckets (tuple, optional): Upper bounds of the duration histograms in seconds. Defaults to DEFAULT_BUCKETS.
+        """
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def _inc(self, name: str, value: float):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def _record(self, name: str, value: float, buckets: tuple):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [buckets, [0] * len(buckets), 0, 0.0]
+            index = bisect.bisect_left(histogram[0], value)
+            if index < len(buckets):
+                histogram[1][index] += 1
+            histogram[2] += 1
+            histogram[3] += value
+
+    def count(self, name, value, attrs):
+        self._inc(f"{self.namespace}_{name}_total", value)
+
+    def observe(self, name, value, attrs):
+        buckets = SIZE_BUCKETS if name.endswith("_bytes") else self.buckets
+        self._record(f"{self.namespace}_{name}", value, buckets)
+
+    def end_span(self, handle, name, duration, error, attrs):
+        self._record(f"{self.namespace}_{name}_seconds", duration, self.buckets)
+        if error is not None:
+            self._inc(f"{self.namespace}_{name}_failures_total", 1)
+
+    def expose(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {value}")
+            for name, (buckets, counts, total, sum_) in sorted(
+                self._histograms.items()
+            ):
+                lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(buckets, counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{le="+Inf"}} {total}')
+                lines.append(f"{name}_sum {sum_}")
+                lines.append(f"{name}_count {total}")
+        return "\n".join(lines) + "\n"
+
+    def register_route(self, app, path: str = "/metrics"):
+        """Serves ``expose()`` from ``path`` on the Flask app."""
+
+        def metrics():
+            return self.expose(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+        app.add_url_rule(path, endpoint="dash_auth_external_metrics", view_func=metrics)
+        return app
+
+
+class OpenTelemetryHook(Hook):
+    def __init__(self, tracer=None):
+        """Reports spans to OpenTelemetry.
+
+        Args:
+            tracer (optional): An OpenTelemetry tracer. Defaults to one obtained from the global tracer provider.
+        """
+        if tracer is None:
+            try:
+                from opentelemetry import trace
+            except ImportError as e:
+                raise ImportError(
+                    "OpenTelemetryHook requires opentelemetry-api, install it with `pip install opentelemetry-api`."
+                ) from e
+            tracer = trace.get_tracer("dash_auth_external")
+        self.tracer = tracer
+
+    def start_span(self, name, attrs):
+        # made current, so spans started inside it, e.g. the token request
+        # inside a refresh, become its children
+        current = self.tracer.start_as_current_span(
+            f"dash_auth_external.{name}",
+            attributes=attrs,
+            record_exception=False,
+            set_status_on_exception=False,
+            end_on_exit=False,
+        )
+        return current, current.__enter__()
+
+    def end_span(self, handle, name, duration, error, attrs):
+        current, span = handle
+        try:
+            if error is not None:
+                span.record_exception(error)
+                try:
+                    from opentelemetry.trace import Status, StatusCode
+
+                    span.set_status(Status(StatusCode.ERROR, str(error)))
+                except ImportError:
+                    pass
+            span.end()
+        finally:
+            current.__exit__(None, None, None)
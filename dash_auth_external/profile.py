@@ -0,0 +1,161 @@
+"""Fetching the user's profile in the background right after login."""
+import logging
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+from dash_auth_external.hooks import NO_HOOKS, Hooks
+from dash_auth_external.store import MemoryTokenStore, TokenStore
+from dash_auth_external.token import OAuth2Token
+from dash_auth_external.transport import Transport, get_default_transport
+
+logger = logging.getLogger(__name__)
+
+
+def _profile_key(profile_id: str) -> str:
+    return f"profile:{profile_id}"
+
+
+class _Pending:
+    def __init__(self, remaining: int):
+        self.remaining = remaining
+        self.profile = {}
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+
+class ProfileFetcher:
+    def __init__(
+        self,
+        endpoints: Dict[str, str],
+        store: TokenStore = None,
+        ttl: float = 3600.0,
+        transport: Transport = None,
+        hooks: Hooks = NO_HOOKS,
+        max_workers: int = 4,
+        wait_timeout: float = 10.0,
+    ):
+        """Fetches profile endpoints with the user's token and keeps the merged result.
+
+        ``prefetch`` starts the requests on a thread pool and returns at
+        once, so they run while the browser follows the login redirect.
+        Every endpoint is requested concurrently and the profile maps each
+        endpoint name to its JSON response. Endpoints that fail are left
+        out.
+
+        Args:
+            endpoints (Dict[str, str]): Names and urls of the endpoints, e.g. ``{"userinfo": url}``.
+            store (TokenStore, optional): Where profiles are kept, e.g. a RedisTokenStore shared by all workers. Defaults to an in-process MemoryTokenStore.
+            ttl (float, optional): Seconds a profile is kept. Defaults to 3600.0.
+            transport (Transport, optional): Pooled HTTP client. Defaults to the process wide shared Transport.
+            hooks (Hooks, optional): Metrics and tracing hooks. Defaults to NO_HOOKS.
+            max_workers (int, optional): Threads fetching endpoints. Defaults to 4.
+            wait_timeout (float, optional): Seconds ``get`` waits for a prefetch still in flight. Defaults to 10.0.
+        """
+        self.endpoints = dict(endpoints)
+        self.store = store if store is not None else MemoryTokenStore()
+        self.ttl = ttl
+        self.transport = transport
+        self.hooks = hooks
+        self.wait_timeout = wait_timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dash-auth-profile"
+        )
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _get_json(self, url: str, token: OAuth2Token) -> dict:
+        transport = self.transport or get_default_transport()
+        headers = {"Authorization": f"Bearer {token.access_token}"}
+        with self.hooks.span("profile_request"):
+            r = transport.get(url, headers=headers)
+            r.raise_for_status()
+            return r.json()
+
+    @staticmethod
+    def new_id() -> str:
+        """Returns a fresh opaque profile id."""
+        return secrets.token_urlsafe(16)
+
+    def prefetch(self, token: OAuth2Token) -> str:
+        """Starts fetching the profile of ``token``'s user in the background.
+
+        Returns:
+            str: The id to pass to ``get``.
+        """
+        profile_id = self.new_id()
+        pending = _Pending(len(self.endpoints))
+        with self._lock:
+            self._pending[profile_id] = pending
+        self.hooks.count("profile_prefetch")
+        for name, url in self.endpoints.items():
+            future = self._executor.submit(self._get_json, url, token)
+            future.add_done_callback(
+                lambda f, name=name: self._collect(profile_id, pending, name, f)
+            )
+        return profile_id
+
+    def _collect(self, profile_id: str, pending: _Pending, name: str, future):
+        error = future.exception()
+        with pending.lock:
+            if error is None:
+                pending.profile[name] = future.result()
+            else:
+                logger.warning("Fetching the %s profile failed: %s", name, error)
+            pending.remaining -= 1
+            if pending.remaining:
+                return
+        try:
+            if pending.profile:
+                key = _profile_key(profile_id)
+                self.store.set(key, pending.profile, ttl=self.ttl)
+        finally:
+            with self._lock:
+                self._pending.pop(profile_id, None)
+            pending.done.set()
+
+    def fetch(self, token: OAuth2Token) -> dict:
+        """Fetches the profile of ``token``'s user now, all endpoints concurrently."""
+        futures = {
+            name: self._executor.submit(self._get_json, url, token)
+            for name, url in self.endpoints.items()
+        }
+        profile = {}
+        for name, future in futures.items():
+            try:
+                profile[name] = future.result()
+            except Exception as e:
+                logger.warning("Fetching the %s profile failed: %s", name, e)
+        return profile
+
+    def get(self, profile_id: str, get_token_data: Callable[[], OAuth2Token]) -> dict:
+        """Returns the profile stored under ``profile_id``.
+
+        Waits for a prefetch still in flight in this process. When there is
+        none, e.g. it ran in another worker with an in-process store or it
+        failed, the profile is fetched now and stored.
+
+        Args:
+            profile_id (str): The id returned by ``prefetch``.
+            get_token_data (Callable): Returns the user's current token, only called on a miss.
+
+        Returns:
+            dict: The profile.
+        """
+        key = _profile_key(profile_id)
+        with self._lock:
+            pending = self._pending.get(profile_id)
+        if pending is not None:
+            pending.done.wait(self.wait_timeout)
+        profile = self.store.get(key)
+        if profile is not None:
+            self.hooks.count("profile_cache_hit")
+            return profile
+        profile = self.fetch(get_token_data())
+        if profile:
+            self.store.set(key, profile, ttl=self.ttl)
+        return profile
+
+    def forget(self, profile_id: str):
+        """Deletes the profile stored under ``profile_id``."""
+        self.store.delete(_profile_key(profile_id))
@@ -0,0 +1,91 @@
+import hashlib
+import json
+from dataclasses import asdict
+from dash_auth_external.breaker import CircuitBreaker
+from dash_auth_external.config import FLASK_G_TOKEN_KEY, FLASK_SESSION_TOKEN_KEY
+from dash_auth_external.ratelimit import TokenRequestLimiter
+from dash_auth_external.singleflight import FileLockBackend, SingleFlight
+from dash_auth_external.token import OAuth2Token
+from dash_auth_external.validation import JWTValidator
+
+
+class Provider:
+    def __init__(
+        self,
+        name: str,
+        external_auth_url: str,
+        external_token_url: str,
+        client_id: str,
+        client_secret: str = None,
+        scope: str = None,
+        token_request_headers: dict = None,
+        token_validator: JWTValidator = None,
+        external_userinfo_url: str = None,
+        external_revocation_url: str = None,
+        refresh_lock_dir: str = None,
+        circuit_breaker: CircuitBreaker = None,
+        rate_limiter: TokenRequestLimiter = None,
+    ):
+        """Configuration and per-provider state of one OAuth2 provider linked by DashAuthExternal.
+
+        Each provider keeps its token under its own session key, so looking
+        up one provider's token never decodes another's.
+
+        Args:
+            name (str): Name passed as ``provider`` to get_token, None for the provider given to DashAuthExternal itself.
+            external_auth_url (str): The authorization endpoint for the OAuth2 Provider.
+            external_token_url (str): The access token endpoint for the OAuth2 Provider.
+            client_id (str): Client ID obtained from OAuth2 provider.
+            client_secret (str, optional): Client secret obtained from OAuth2 provider. Defaults to None.
+            scope (str, optional): Scope requested from the OAuth2 Provider. Defaults to None.
+            token_request_headers (dict, optional): Additional headers to send to the access token endpoint. Defaults to None.
+            token_validator (JWTValidator, optional): Validates JWTs locally on login and refresh. Defaults to None.
+            external_userinfo_url (str, optional): The userinfo endpoint for the OAuth2 Provider. Defaults to None.
+            external_revocation_url (str, optional): The token revocation endpoint for the OAuth2 Provider. Defaults to None.
+            refresh_lock_dir (str, optional): Directory for file locks that deduplicate refreshes across worker processes. Defaults to None.
+            circuit_breaker (CircuitBreaker, optional): Fails token requests fast while the provider is unavailable. Defaults to None.
+            rate_limiter (TokenRequestLimiter, optional): Rate limits, queues and coalesces token requests. Defaults to None.
+        """
+        self.name = name
+        self.external_auth_url = external_auth_url
+        self.external_token_url = external_token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.scope = scope
+        self.token_request_headers = token_request_headers or {}
+        self.token_validator = token_validator
+        self.external_userinfo_url = external_userinfo_url
+        self.external_revocation_url = external_revocation_url
+        self.circuit_breaker = circuit_breaker
+        self.rate_limiter = rate_limiter
+        self.provider_metadata = None
+        self.client_credentials = None
+        self.profile = None
+
+        suffix = "" if name is None else f":{name}"
+        self.session_key = FLASK_SESSION_TOKEN_KEY + suffix
+        self.g_key = FLASK_G_TOKEN_KEY + suffix
+        self.code_verifier_key = "cv" + suffix
+        self.state_key = "state" + suffix
+        self.profile_key = "profile" + suffix
+        self.login_id_key = "login_id" + suffix
+        self.sid_prefix = "" if name is None else f"{name}:"
+
+        self.refresh_flight = SingleFlight(
+            process_lock=FileLockBackend(refresh_lock_dir)
+            if refresh_lock_dir
+            else None,
+            dumps=lambda token: json.dumps(asdict(token)),
+            loads=lambda data: OAuth2Token(**json.loads(data)),
+        )
+
+    def owns_sid(self, sid: str) -> bool:
+        """Whether the store entry ``sid`` holds a session token of this provider."""
+        if self.name is None:
+            return ":" not in sid
+        return sid.startswith(self.sid_prefix)
+
+    def refresh_cache_key(self, refresh_token: str) -> str:
+        """Key under which the token obtained with ``refresh_token`` is shared between workers."""
+        digest = hashlib.sha256(f"{self.name}:{refresh_token}".encode("utf-8"))
+        return f"refresh:{digest.hexdigest()}"
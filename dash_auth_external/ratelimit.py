@@ -0,0 +1,192 @@
+"""Client side rate limiting of token endpoint requests.
+
+When every user logs in or refreshes at the same moment, the provider's
+token endpoint starts answering 429 Too Many Requests. TokenRequestLimiter
+sits in front of token_request: it spaces requests out with a token bucket,
+keeps a bounded number of callers waiting for their turn, retries 429s after
+the ``Retry-After`` the provider asked for and sends identical concurrent
+requests only once.
+"""
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable
+from dash_auth_external.exceptions import RateLimitError
+from dash_auth_external.hooks import NO_HOOKS, Hooks
+from dash_auth_external.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: str) -> float:
+    """Returns the seconds to wait from a ``Retry-After`` header, None if absent or invalid.
+
+    Args:
+        value (str): Delay in seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    import email.utils
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        burst: int = None,
+        max_queue: int = 100,
+        timeout: float = 30.0,
+    ):
+        """Admits ``rate`` calls per second on average and up to ``burst`` at once.
+
+        Callers beyond the budget wait for their turn, at most ``max_queue``
+        of them and for at most ``timeout`` seconds, otherwise RateLimitError
+        is raised.
+
+        Args:
+            rate (float): Calls admitted per second.
+            burst (int, optional): Calls admitted back to back after an idle period. Defaults to rate, at least 1.
+            max_queue (int, optional): Callers allowed to wait at once. Defaults to 100.
+            timeout (float, optional): Seconds a caller waits before giving up. Defaults to 30.0.
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float):
+        refilled = self._tokens + (now - self._updated) * self.rate
+        self._tokens = min(self.burst, refilled)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """Admits nothing for ``seconds``, e.g. after the provider sent Retry-After."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self):
+        """Waits until a call is admitted.
+
+        Raises:
+            RateLimitError: The queue is full or the wait timed out.
+        """
+        with self._cond:
+            if self._waiting >= self.max_queue:
+                raise RateLimitError("Too many token requests waiting.")
+            self._waiting += 1
+            try:
+                deadline = time.monotonic() + self.timeout
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._paused_until - now
+                    if wait <= 0:
+                        if self._tokens >= 1:
+                            self._tokens -= 1
+                            return
+                        wait = (1 - self._tokens) / self.rate
+                    if now + wait > deadline:
+                        raise RateLimitError(
+                            "Timed out waiting to send a token request."
+                        )
+                    self._cond.wait(wait)
+            finally:
+                self._waiting -= 1
+
+
+class TokenRequestLimiter:
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = None,
+        max_queue: int = 100,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        """Rate limits, queues, retries and coalesces requests to a token endpoint.
+
+        Identical requests in flight at the same time, e.g. a login callback
+        submitted twice, are sent once and share the response. A 429
+        response pauses all requests for its ``Retry-After``, or an
+        exponential backoff when it has none, plus random jitter so that
+        waiting workers do not retry in lockstep.
+
+        Args:
+            rate (float, optional): Requests per second sent to the provider. Defaults to 10.0.
+            burst (int, optional): Requests sent back to back after an idle period. Defaults to rate.
+            max_queue (int, optional): Requests allowed to wait for their turn, beyond which RateLimitError is raised. Defaults to 100.
+            timeout (float, optional): Seconds a request waits for its turn. Defaults to 30.0.
+            max_retries (int, optional): Retries after a 429 response. Defaults to 3.
+            backoff (float, optional): Base of the exponential backoff and of the jitter, in seconds. Defaults to 0.5.
+            max_backoff (float, optional): Longest pause after a 429, whatever Retry-After says. Defaults to 30.0.
+        """
+        self.bucket = TokenBucket(rate, burst, max_queue=max_queue, timeout=timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._flight = SingleFlight()
+
+    @staticmethod
+    def key(url: str, body: dict) -> str:
+        raw = json.dumps([url, body], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def delay(self, response, attempt: int) -> float:
+        """Seconds to pause after the 429 ``response`` to retry ``attempt``."""
+        delay = parse_retry_after(response.headers.get("Retry-After"))
+        if delay is None:
+            delay = self.backoff * 2**attempt
+        return min(delay, self.max_backoff) + random.uniform(0, self.backoff)
+
+    def request(
+        self,
+        url: str,
+        body: dict,
+        send: Callable[[], Any],
+        hooks: Hooks = NO_HOOKS,
+    ):
+        """Sends the request made by ``send`` when the rate limit allows it.
+
+        Args:
+            url (str): The token endpoint.
+            body (dict): The form body, identifies identical requests together with ``url``.
+            send (Callable): Sends the request and returns the response.
+            hooks (Hooks, optional): Metrics and tracing hooks. Defaults to NO_HOOKS.
+
+        Returns:
+            requests.Response: The response of the last attempt.
+        """
+        return self._flight.do(self.key(url, body), lambda: self._send(send, hooks))
+
+    def _send(self, send: Callable[[], Any], hooks: Hooks):
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            response = send()
+            if response.status_code != 429 or attempt >= self.max_retries:
+                return response
+            hooks.count("token_request_throttled")
+            delay = self.delay(response, attempt)
+            logger.warning("Token endpoint rate limited, retrying in %.1fs", delay)
+            self.bucket.pause(delay)
+            attempt += 1
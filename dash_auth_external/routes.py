@@ -1,30 +1,105 @@
 from dataclasses import asdict
-from flask import session, redirect, request
-import os
 import base64
-import re
+import secrets
 import urllib.parse
-from flask.app import Flask
-import requests
 import hashlib
-from requests_oauthlib import OAuth2Session
+import json
+from typing import TYPE_CHECKING, Callable
+from dash_auth_external.breaker import CircuitBreaker, guarded
+from dash_auth_external.codec import CompactTokenCodec
 from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
+from dash_auth_external.exceptions import (
+    CircuitOpenError,
+    InvalidStateError,
+    RateLimitError,
+    TokenValidationError,
+)
+from dash_auth_external.hooks import NO_HOOKS, Hooks
+from dash_auth_external.ratelimit import TokenRequestLimiter
+from dash_auth_external.store import TokenStore, write_session_token
 from dash_auth_external.token import OAuth2Token
+from dash_auth_external.transport import Transport, get_default_transport
+from dash_auth_external.validation import JWTValidator
 
-os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
+if TYPE_CHECKING:
+    from flask.app import Flask
 
 
 def make_code_challenge(length: int = 40):
-    code_verifier = base64.urlsafe_b64encode(os.urandom(length)).decode("utf-8")
-    code_verifier = re.sub("[^a-zA-Z0-9]+", "", code_verifier)
-    code_challenge = hashlib.sha256(code_verifier.encode("utf-8")).digest()
-    code_challenge = base64.urlsafe_b64encode(code_challenge).decode("utf-8")
-    code_challenge = code_challenge.replace("=", "")
-    return code_challenge, code_verifier
+    """Generates a PKCE code verifier and its S256 challenge (RFC 7636).
+
+    The verifier is ``length`` random bytes, base64url encoded without
+    padding, so it only contains unreserved characters.
+
+    Returns:
+        tuple: The code challenge and the code verifier.
+    """
+    code_verifier = secrets.token_urlsafe(length)
+    code_challenge = hashlib.sha256(code_verifier.encode("ascii")).digest()
+    code_challenge = base64.urlsafe_b64encode(code_challenge).decode("ascii")
+    return code_challenge.rstrip("="), code_verifier
+
+
+def make_state() -> str:
+    """Generates an opaque value for the ``state`` parameter."""
+    return secrets.token_urlsafe(22)
+
+
+def _state_key(state: str) -> str:
+    return f"state:{state}"
+
+
+class AuthorizeUrlBuilder:
+    def __init__(
+        self,
+        external_auth_url: str,
+        client_id: str,
+        redirect_uri: str = None,
+        scope=None,
+        auth_request_params: dict = None,
+    ):
+        """Builds authorization request urls from components encoded once up front.
+
+        Parameters are emitted in the same order and encoding as
+        ``requests_oauthlib.OAuth2Session.authorization_url``: any query of
+        ``external_auth_url``, then response_type, client_id, redirect_uri,
+        scope, state, code_challenge, code_challenge_method and the
+        non-empty ``auth_request_params``.
+
+        Args:
+            external_auth_url (str): The authorization endpoint for the OAuth2 Provider.
+            client_id (str): Client ID obtained from OAuth2 provider.
+            redirect_uri (str, optional): The url the provider redirects back to. Defaults to None.
+            scope (str or list, optional): Scope requested from the OAuth2 Provider. Defaults to None.
+            auth_request_params (dict, optional): Additional query parameters. Defaults to None.
+        """
+        parts = urllib.parse.urlparse(external_auth_url)
+        params = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        params += [("response_type", "code"), ("client_id", client_id)]
+        if redirect_uri:
+            params.append(("redirect_uri", redirect_uri))
+        if isinstance(scope, (list, tuple, set)):
+            scope = " ".join(str(s) for s in scope)
+        if scope:
+            params.append(("scope", scope))
+        extra = [(str(k), v) for k, v in (auth_request_params or {}).items() if v]
+
+        base = urllib.parse.urlunparse(parts._replace(query="", fragment=""))
+        self._prefix = f"{base}?{urllib.parse.urlencode(params)}"
+        self._suffix = f"&{urllib.parse.urlencode(extra)}" if extra else ""
+        if parts.fragment:
+            self._suffix += f"#{parts.fragment}"
+
+    def build(self, state: str, code_challenge: str = None) -> str:
+        """Returns the authorization url for ``state`` and an optional S256 ``code_challenge``."""
+        url = f"{self._prefix}&state={urllib.parse.quote_plus(state)}"
+        if code_challenge is not None:
+            url += f"&code_challenge={code_challenge}&code_challenge_method=S256"
+        return url + self._suffix
 
 
 def make_auth_route(
-    app: Flask,
+    app: "Flask",
     external_auth_url: str,
     client_id: str,
     auth_suffix: str,
@@ -32,33 +107,52 @@ def make_auth_route(
     with_pkce: bool,
     scope: str,
     auth_request_params: dict,
+    endpoint: str = None,
+    code_verifier_key: str = "cv",
+    state_store: TokenStore = None,
+    state_ttl: float = 600.0,
+    state_key: str = "state",
 ):
-    @app.route(auth_suffix)
+    from flask import redirect, session
+
+    url_builder = AuthorizeUrlBuilder(
+        external_auth_url,
+        client_id,
+        redirect_uri=redirect_uri,
+        scope=scope,
+        auth_request_params=auth_request_params,
+    )
+
+    @app.route(auth_suffix, endpoint=endpoint)
     def get_auth_code():
         """
         Redirect the user/resource owner to the OAuth provider
         using an URL with a few key OAuth parameters.
         """
-        oauth_session = OAuth2Session(
-            client_id,
-            redirect_uri=redirect_uri,
-            scope=scope,
-        )
-
+        state = make_state()
+        code_challenge = code_verifier = None
         if with_pkce:
             code_challenge, code_verifier = make_code_challenge()
-            session["cv"] = code_verifier
-            authorization_url, state = oauth_session.authorization_url(
-                external_auth_url,
-                code_challenge=code_challenge,
-                code_challenge_method="S256",
-                **auth_request_params,
+
+        if state_store is not None:
+            # the state only goes back to the browser that started the login,
+            # otherwise a callback link could log a victim into another account
+            binding = make_state()
+            state_store.set(
+                _state_key(state),
+                {
+                    "cv": code_verifier,
+                    "redirect_uri": redirect_uri,
+                    "binding": binding,
+                },
+                ttl=state_ttl,
             )
+            session[state_key] = binding
         else:
-            authorization_url, state = oauth_session.authorization_url(
-                external_auth_url,
-                **auth_request_params,
-            )
+            session[state_key] = state
+            if with_pkce:
+                session[code_verifier_key] = code_verifier
+        authorization_url = url_builder.build(state, code_challenge)
 
         resp = redirect(authorization_url)
         return resp
@@ -67,7 +161,14 @@ def make_auth_route(
 
 
 def build_token_body(
-    url: str, redirect_uri: str, client_id: str, with_pkce: bool, client_secret: str
+    url: str,
+    redirect_uri: str,
+    client_id: str,
+    with_pkce: bool,
+    client_secret: str,
+    code_verifier_key: str = "cv",
+    state_store: TokenStore = None,
+    state_key: str = "state",
 ):
     query = urllib.parse.urlparse(url).query
     redirect_params = urllib.parse.parse_qs(query)
@@ -81,8 +182,27 @@ def build_token_body(
         state=state,
     )
 
+    from flask import session
+
+    expected = session.pop(state_key, None)
+    if state_store is not None:
+        pending = state_store.pop(_state_key(state))
+        if (
+            pending is None
+            or pending.get("redirect_uri") != redirect_uri
+            or expected is None
+            or not secrets.compare_digest(expected, pending.get("binding", ""))
+        ):
+            raise InvalidStateError(
+                "Unknown, expired or reused state, or a login started by another browser."
+            )
+        code_verifier = pending["cv"]
+    else:
+        code_verifier = session.pop(code_verifier_key, None)
+        if expected is None or not secrets.compare_digest(expected, state):
+            raise InvalidStateError("Unknown or reused state.")
     if with_pkce:
-        body["code_verifier"] = session["cv"]
+        body["code_verifier"] = code_verifier
 
     if client_secret:
         body["client_secret"] = client_secret
@@ -91,7 +211,7 @@ def build_token_body(
 
 
 def make_access_token_route(
-    app: Flask,
+    app: "Flask",
     external_token_url: str,
     redirect_suffix: str,
     _home_suffix: str,
@@ -100,41 +220,108 @@ def make_access_token_route(
     client_secret: str,
     with_pkce: bool,
     token_request_headers: dict,
+    transport: Transport = None,
+    token_store: TokenStore = None,
+    on_token_stored: Callable[[OAuth2Token, str], None] = None,
+    token_validator: JWTValidator = None,
+    hooks: Hooks = NO_HOOKS,
+    endpoint: str = None,
+    session_key: str = FLASK_SESSION_TOKEN_KEY,
+    code_verifier_key: str = "cv",
+    session_codec: CompactTokenCodec = None,
+    state_store: TokenStore = None,
+    state_key: str = "state",
+    sid_prefix: str = "",
+    token_ttl: float = None,
+    circuit_breaker: CircuitBreaker = None,
+    rate_limiter: TokenRequestLimiter = None,
+    login_id_key: str = "login_id",
 ):
-    @app.route(redirect_suffix, methods=["GET", "POST"])
+    from flask import abort, redirect, request, session
+
+    @app.route(redirect_suffix, methods=["GET", "POST"], endpoint=endpoint)
     def get_token_route():
         url = request.url
-        body = build_token_body(
-            url=url,
-            redirect_uri=redirect_uri,
-            with_pkce=with_pkce,
-            client_id=client_id,
-            client_secret=client_secret,
-        )
+        try:
+            body = build_token_body(
+                url=url,
+                redirect_uri=redirect_uri,
+                with_pkce=with_pkce,
+                client_id=client_id,
+                client_secret=client_secret,
+                code_verifier_key=code_verifier_key,
+                state_store=state_store,
+                state_key=state_key,
+            )
+        except InvalidStateError as e:
+            abort(400, str(e))
 
-        response_data = token_request(
-            url=external_token_url,
-            body=body,
-            headers=token_request_headers,
-        )
-        token = OAuth2Token(
-            access_token=response_data.get("access_token"),
-            token_type=response_data.get("token_type"),
-            expires_in=response_data.get("expires_in"),
-            refresh_token=response_data.get("refresh_token"),
-            token_data=response_data,
-        )
+        with hooks.span("code_exchange"):
+            try:
+                response_data = guarded(
+                    circuit_breaker,
+                    lambda: token_request(
+                        url=external_token_url,
+                        body=body,
+                        headers=token_request_headers,
+                        transport=transport,
+                        hooks=hooks,
+                        limiter=rate_limiter,
+                    ),
+                )
+            except (CircuitOpenError, RateLimitError) as e:
+                abort(503, str(e))
+            token = OAuth2Token.from_response(response_data)
+            if token_validator is not None:
+                try:
+                    token_validator.validate_token(token)
+                except TokenValidationError as e:
+                    abort(401, str(e))
 
         response = redirect(_home_suffix)
 
-        session[FLASK_SESSION_TOKEN_KEY] = asdict(token)
+        token_data = asdict(token)
+        if hooks:
+            hooks.count("login")
+            hooks.observe("session_payload_bytes", len(json.dumps(token_data)))
+        sid = write_session_token(
+            token_data,
+            token_store,
+            new_session=True,
+            key=session_key,
+            codec=session_codec,
+            sid_prefix=sid_prefix,
+            ttl=token_ttl,
+        )
+        # a new login is a new user as far as per-user caches can tell
+        session.pop(login_id_key, None)
+        if on_token_stored is not None:
+            on_token_stored(token, sid)
 
         return response
 
     return app
 
 
-def token_request(url: str, body: dict, headers: dict) -> dict:
-    r = requests.post(url, data=body, headers=headers)
-    r.raise_for_status()
-    return r.json()
+def token_request(
+    url: str,
+    body: dict,
+    headers: dict,
+    transport: Transport = None,
+    hooks: Hooks = NO_HOOKS,
+    limiter: TokenRequestLimiter = None,
+) -> dict:
+    if transport is None:
+        transport = get_default_transport()
+    with hooks.span("token_request", grant_type=body.get("grant_type")):
+        if limiter is None:
+            r = transport.post(url, data=body, headers=headers)
+        else:
+            r = limiter.request(
+                url,
+                body,
+                lambda: transport.post(url, data=body, headers=headers),
+                hooks=hooks,
+            )
+        r.raise_for_status()
+        return r.json()
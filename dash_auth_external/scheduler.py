@@ -0,0 +1,130 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshScheduler:
+    def __init__(
+        self,
+        refresh: Callable[[str], float],
+        skew: float = 60.0,
+        max_idle: float = 3600.0,
+    ):
+        """Refreshes tokens on a background thread shortly before they expire.
+
+        Entries sit in a priority queue ordered by due time. Tokens whose
+        session has not been seen for ``max_idle`` seconds are dropped instead
+        of being refreshed forever.
+
+        Args:
+            refresh (Callable[[str], float]): Refreshes the token for a key, returns its new expires_at or None.
+            skew (float, optional): Seconds before expires_at to refresh. Defaults to 60.0.
+            max_idle (float, optional): Seconds without a schedule call before a key is dropped. Defaults to 3600.0.
+        """
+        self.refresh = refresh
+        self.skew = skew
+        self.max_idle = max_idle
+        self._heap = []
+        self._entries = {}
+        self._last_seen = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def schedule(self, key: str, expires_at: float):
+        """Schedules a refresh of ``key`` at ``expires_at - skew``, replacing any earlier entry."""
+        if expires_at is None:
+            return
+        with self._cond:
+            self._last_seen[key] = time.time()
+            if self._entries.get(key) != expires_at:
+                self._push(key, expires_at)
+
+    def _push(self, key: str, expires_at: float):
+        self._entries[key] = expires_at
+        heapq.heappush(
+            self._heap, (expires_at - self.skew, next(self._counter), key, expires_at)
+        )
+        self._cond.notify()
+
+    def cancel(self, key: str):
+        with self._cond:
+            self._entries.pop(key, None)
+            self._last_seen.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def start(self) -> "RefreshScheduler":
+        """Starts the refresh thread, unless it is running.
+
+        Also starts a new thread in a forked child, where the parent's does
+        not exist.
+        """
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return self
+            self._running = True
+            self._thread = threading.Thread(
+                target=self._run, name="dash-auth-external-refresh", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _next_due(self):
+        """Pops the next due key, waiting as needed. Returns None once stopped."""
+        with self._cond:
+            while self._running:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, _, key, expires_at = self._heap[0]
+                delay = due - time.time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                if self._entries.get(key) != expires_at:
+                    continue
+                if time.time() - self._last_seen.get(key, 0) > self.max_idle:
+                    del self._entries[key]
+                    self._last_seen.pop(key, None)
+                    continue
+                del self._entries[key]
+                return key
+            return None
+
+    def _run(self):
+        while True:
+            key = self._next_due()
+            if key is None:
+                return
+            try:
+                expires_at = self.refresh(key)
+            except Exception:
+                logger.exception("Background token refresh failed.")
+                expires_at = None
+            with self._cond:
+                if key in self._entries:
+                    # scheduled again by a request while refreshing
+                    continue
+                # a token living shorter than the skew is left to the inline
+                # refresh, and is tracked again when a request schedules it
+                if expires_at is None or expires_at - self.skew <= time.time():
+                    self._last_seen.pop(key, None)
+                elif key in self._last_seen:
+                    self._push(key, expires_at)
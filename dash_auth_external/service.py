@@ -0,0 +1,113 @@
+"""Client credentials (machine to machine) tokens, cached for the whole process."""
+import time
+from dash_auth_external.breaker import CircuitBreaker, guarded
+from dash_auth_external.hooks import NO_HOOKS, Hooks
+from dash_auth_external.ratelimit import TokenRequestLimiter
+from dash_auth_external.routes import token_request
+from dash_auth_external.singleflight import SingleFlight
+from dash_auth_external.token import OAuth2Token
+from dash_auth_external.transport import Transport
+
+
+class ClientCredentials:
+    def __init__(
+        self,
+        token_url: str,
+        client_id: str,
+        client_secret: str = None,
+        token_request_headers: dict = None,
+        transport: Transport = None,
+        hooks: Hooks = NO_HOOKS,
+        skew: float = 60.0,
+        circuit_breaker: CircuitBreaker = None,
+        rate_limiter: TokenRequestLimiter = None,
+    ):
+        """Obtains tokens for the application itself with the client credentials grant.
+
+        One token is cached per ``(scope, audience)`` and shared by all
+        threads. A cached token is served with a dict lookup until ``skew``
+        seconds before it expires, at most half its lifetime, then exactly
+        one thread fetches its replacement while the others wait for it.
+
+        Args:
+            token_url (str): The access token endpoint for the OAuth2 Provider.
+            client_id (str): Client ID obtained from OAuth2 provider.
+            client_secret (str, optional): Client secret obtained from OAuth2 provider. Defaults to None.
+            token_request_headers (dict, optional): Additional headers to send to the access token endpoint. Defaults to None.
+            transport (Transport, optional): Pooled HTTP client. Defaults to the process wide shared Transport.
+            hooks (Hooks, optional): Metrics and tracing hooks. Defaults to NO_HOOKS.
+            skew (float, optional): Seconds before expiry a token is replaced. Defaults to 60.0.
+            circuit_breaker (CircuitBreaker, optional): Fails token requests fast while the provider is unavailable. Defaults to None.
+            rate_limiter (TokenRequestLimiter, optional): Rate limits and retries throttled token requests. Defaults to None.
+        """
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_request_headers = token_request_headers or {}
+        self.transport = transport
+        self.hooks = hooks
+        self.skew = skew
+        self.circuit_breaker = circuit_breaker
+        self.rate_limiter = rate_limiter
+        self._tokens = {}
+        self._flight = SingleFlight()
+
+    def get_token_data(self, scope: str = None, audience: str = None) -> OAuth2Token:
+        """Returns a valid service token for ``scope`` and ``audience``.
+
+        Args:
+            scope (str, optional): Scope requested from the OAuth2 Provider. Defaults to None.
+            audience (str, optional): The API the token is for, for providers that require it. Defaults to None.
+
+        Returns:
+            OAuth2Token: The token data.
+        """
+        key = (scope, audience)
+        entry = self._tokens.get(key)
+        if entry is not None and time.time() < entry[1]:
+            return entry[0]
+        return self._flight.do(key, lambda: self._fetch(key))
+
+    def get_token(self, scope: str = None, audience: str = None) -> str:
+        """Returns a valid service access token for ``scope`` and ``audience``."""
+        return self.get_token_data(scope, audience).access_token
+
+    def _fetch(self, key: tuple) -> OAuth2Token:
+        entry = self._tokens.get(key)
+        if entry is not None and time.time() < entry[1]:
+            return entry[0]
+
+        scope, audience = key
+        body = {"grant_type": "client_credentials", "client_id": self.client_id}
+        if self.client_secret:
+            body["client_secret"] = self.client_secret
+        if scope:
+            body["scope"] = scope
+        if audience:
+            body["audience"] = audience
+
+        self.hooks.count("client_credentials")
+        with self.hooks.span("client_credentials"):
+            data = guarded(
+                self.circuit_breaker,
+                lambda: token_request(
+                    self.token_url,
+                    body,
+                    self.token_request_headers,
+                    transport=self.transport,
+                    hooks=self.hooks,
+                    limiter=self.rate_limiter,
+                ),
+            )
+        token = OAuth2Token.from_response(data)
+        if token.expires_at is None:
+            replace_at = float("inf")
+        else:
+            lifetime = token.expires_at - time.time()
+            replace_at = token.expires_at - min(self.skew, lifetime / 2)
+        self._tokens[key] = (token, replace_at)
+        return token
+
+    def clear(self):
+        """Drops all cached tokens."""
+        self._tokens.clear()
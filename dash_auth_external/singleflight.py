@@ -0,0 +1,284 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self._waiters = []
+        self._lock = threading.Lock()
+
+    def wait_async(self, loop):
+        """Returns a future of ``loop`` resolved with the outcome of the call."""
+        future = loop.create_future()
+        with self._lock:
+            if not self.event.is_set():
+                self._waiters.append((loop, future))
+                return future
+        self._resolve(future)
+        return future
+
+    def finish(self):
+        with self._lock:
+            self.event.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            # the waiter's loop may have been closed in the meantime
+            with contextlib.suppress(RuntimeError):
+                loop.call_soon_threadsafe(self._resolve, future)
+
+    def _resolve(self, future):
+        if future.cancelled():
+            return
+        if self.error is not None:
+            future.set_exception(self.error)
+        else:
+            future.set_result(self.result)
+
+
+class FileLockBackend:
+    def __init__(self, lock_dir: str, result_ttl: float = 30.0):
+        """Cross-process lock and result hand-off based on ``fcntl.flock``.
+
+        The process that wins the lock writes the serialized result into the
+        lock file, processes that were waiting read it instead of repeating the
+        call.
+
+        Args:
+            lock_dir (str): Directory shared by all processes on the host.
+            result_ttl (float, optional): Seconds a written result may be reused. Defaults to 30.0.
+        """
+        os.makedirs(lock_dir, exist_ok=True)
+        self.lock_dir = lock_dir
+        self.result_ttl = result_ttl
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.lock_dir, digest + ".lock")
+
+    @contextlib.contextmanager
+    def locked(self, key: str):
+        import fcntl
+
+        fd = os.open(self._path(key), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield _LockedFile(fd, self.result_ttl)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    @contextlib.asynccontextmanager
+    async def locked_async(self, key: str):
+        """``locked`` for coroutines, waiting for the lock on a worker thread."""
+        import asyncio
+
+        lock = self.locked(key)
+        entering = asyncio.get_running_loop().run_in_executor(None, lock.__enter__)
+        try:
+            locked = await asyncio.shield(entering)
+        except asyncio.CancelledError:
+
+            def release(future):
+                if not future.cancelled() and future.exception() is None:
+                    lock.__exit__(None, None, None)
+
+            # the worker thread still takes the lock, release it once it has
+            entering.add_done_callback(release)
+            raise
+        try:
+            yield locked
+        finally:
+            lock.__exit__(None, None, None)
+
+    def sweep(self):
+        """Erases results older than ``result_ttl`` from the lock files.
+
+        Results may hold tokens, which should not stay on disk after they can
+        no longer be reused. Lock files held by a call in flight are skipped.
+        """
+        import fcntl
+
+        for name in os.listdir(self.lock_dir):
+            if not name.endswith(".lock"):
+                continue
+            try:
+                fd = os.open(os.path.join(self.lock_dir, name), os.O_RDWR)
+            except OSError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            try:
+                locked = _LockedFile(fd, self.result_ttl)
+                if locked.read() is None:
+                    locked.clear()
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def prune(self, max_age: float = None):
+        """Removes lock files older than ``max_age`` seconds."""
+        if max_age is None:
+            max_age = self.result_ttl * 10
+        cutoff = time.time() - max_age
+        for name in os.listdir(self.lock_dir):
+            path = os.path.join(self.lock_dir, name)
+            if name.endswith(".lock") and os.path.getmtime(path) < cutoff:
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+
+
+class _LockedFile:
+    def __init__(self, fd: int, result_ttl: float):
+        self.fd = fd
+        self.result_ttl = result_ttl
+
+    def read(self, stale_ok: bool = False):
+        """Returns the value written by the last lock holder, None if absent or older than the TTL.
+
+        Args:
+            stale_ok (bool, optional): Return the value regardless of its age. Defaults to False.
+        """
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        raw = b""
+        while True:
+            chunk = os.read(self.fd, 65536)
+            if not chunk:
+                break
+            raw += chunk
+        if not raw:
+            return None
+        record = json.loads(raw)
+        if not stale_ok and time.time() - record["written_at"] > self.result_ttl:
+            return None
+        return record["value"]
+
+    def clear(self):
+        os.ftruncate(self.fd, 0)
+
+    def write(self, value):
+        record = json.dumps({"written_at": time.time(), "value": value})
+        os.ftruncate(self.fd, 0)
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        os.write(self.fd, record.encode("utf-8"))
+
+
+class SingleFlight:
+    def __init__(
+        self,
+        process_lock: FileLockBackend = None,
+        dumps: Callable[[Any], str] = json.dumps,
+        loads: Callable[[str], Any] = json.loads,
+    ):
+        """Runs at most one call per key at a time, concurrent callers share its result.
+
+        Args:
+            process_lock (FileLockBackend, optional): Extends deduplication across processes. Defaults to None.
+            dumps (Callable, optional): Serializes a result for the process lock. Defaults to json.dumps.
+            loads (Callable, optional): Deserializes a result from the process lock. Defaults to json.loads.
+        """
+        self.process_lock = process_lock
+        self.dumps = dumps
+        self.loads = loads
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Calls ``fn`` unless a call for ``key`` is already in flight, then waits for it.
+
+        Args:
+            key (str): Identifies identical calls, e.g. the refresh token.
+            fn (Callable): The call to make.
+
+        Returns:
+            Any: The result of the single call made for ``key``.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, fn)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.finish()
+        return call.result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Awaits ``fn()`` unless a call for ``key`` is already in flight, then waits for it.
+
+        Shares calls with ``do``: a coroutine joins a call made by a thread and
+        the other way round. Waiting does not block the event loop.
+
+        Args:
+            key (str): Identifies identical calls, e.g. the refresh token.
+            fn (Callable): Returns the awaitable to await.
+
+        Returns:
+            Any: The result of the single call made for ``key``.
+        """
+        import asyncio
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            return await call.wait_async(asyncio.get_running_loop())
+
+        try:
+            call.result = await self._run_async(key, fn)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.finish()
+        return call.result
+
+    def _run(self, key: str, fn: Callable[[], Any]) -> Any:
+        if self.process_lock is None:
+            return fn()
+        with self.process_lock.locked(key) as locked:
+            shared = locked.read()
+            if shared is not None:
+                return self.loads(shared)
+            result = fn()
+            locked.write(self.dumps(result))
+            return result
+
+    async def _run_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self.process_lock is None:
+            return await fn()
+        async with self.process_lock.locked_async(key) as locked:
+            shared = locked.read()
+            if shared is not None:
+                return self.loads(shared)
+            result = await fn()
+            locked.write(self.dumps(result))
+            return result
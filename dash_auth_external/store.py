@@ -0,0 +1,382 @@
+import json
+import logging
+import math
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Iterator, List, Tuple
+from dash_auth_external.codec import CompactTokenCodec
+from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
+
+if TYPE_CHECKING:
+    import sqlite3
+
+logger = logging.getLogger(__name__)
+
+
+class TokenStore:
+    """Server-side storage for token data, keyed by an opaque session id."""
+
+    def get(self, key: str) -> dict:
+        raise NotImplementedError
+
+    def set(self, key: str, value: dict, ttl: float = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def pop(self, key: str) -> dict:
+        """Removes and returns the value of ``key``, None if missing or expired."""
+        value = self.get(key)
+        if value is not None:
+            self.delete(key)
+        return value
+
+    def sweep(self):
+        """Removes expired entries, for backends that do not expire them on their own."""
+        pass
+
+    def scan(self, batch_size: int = 100) -> Iterator[List[Tuple[str, dict]]]:
+        """Walks all live entries in batches of ``(key, value)`` pairs.
+
+        Entries deleted during the walk are skipped, entries added may or
+        may not be seen.
+        """
+        raise NotImplementedError
+
+
+class MemoryTokenStore(TokenStore):
+    def __init__(self, maxsize: int = 10000):
+        """In-process LRU store. Only suitable for a single worker process.
+
+        Args:
+            maxsize (int, optional): Entries kept before the least recently used is evicted. Defaults to 10000.
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and time.time() > expires_at:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict, ttl: float = None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop(self, key: str) -> dict:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.time() > expires_at:
+            return None
+        return value
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                key
+                for key, (_, expires_at) in self._data.items()
+                if expires_at is not None and now > expires_at
+            ]
+            for key in expired:
+                del self._data[key]
+
+    def scan(self, batch_size: int = 100) -> Iterator[List[Tuple[str, dict]]]:
+        with self._lock:
+            keys = list(self._data)
+        for i in range(0, len(keys), batch_size):
+            batch = [(key, self.get(key)) for key in keys[i : i + batch_size]]
+            batch = [(key, value) for key, value in batch if value is not None]
+            if batch:
+                yield batch
+
+
+class SQLiteTokenStore(TokenStore):
+    def __init__(self, path: str, table: str = "dash_auth_external_tokens"):
+        """SQLite store in WAL mode, shared by all worker processes on a host.
+
+        Args:
+            path (str): Path to the database file.
+            table (str, optional): Table name. Defaults to "dash_auth_external_tokens".
+        """
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        self._connection().execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+
+    def _connection(self) -> "sqlite3.Connection":
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3
+
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> dict:
+        row = (
+            self._connection()
+            .execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and time.time() > expires_at:
+            self.delete(key)
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value: dict, ttl: float = None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        self._connection().execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) "
+            "VALUES (?, ?, ?)",
+            (key, json.dumps(value), expires_at),
+        )
+
+    def delete(self, key: str):
+        self._connection().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def pop(self, key: str) -> dict:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        finally:
+            conn.execute("COMMIT")
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and time.time() > expires_at:
+            return None
+        return json.loads(value)
+
+    def sweep(self):
+        self._connection().execute(
+            f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),)
+        )
+
+    def scan(self, batch_size: int = 100) -> Iterator[List[Tuple[str, dict]]]:
+        last = ""
+        while True:
+            rows = (
+                self._connection()
+                .execute(
+                    f"SELECT key, value FROM {self.table} WHERE key > ? "
+                    "AND (expires_at IS NULL OR expires_at >= ?) "
+                    "ORDER BY key LIMIT ?",
+                    (last, time.time(), batch_size),
+                )
+                .fetchall()
+            )
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [(key, json.loads(value)) for key, value in rows]
+
+
+class RedisTokenStore(TokenStore):
+    def __init__(
+        self, client=None, url: str = None, prefix: str = "dash_auth_external:"
+    ):
+        """Store backed by any client speaking the Redis protocol.
+
+        Args:
+            client (optional): An object with redis-py style ``get``, ``set`` and ``delete`` methods. Defaults to None.
+            url (str, optional): Used to create a ``redis.Redis`` client when no client is given. Defaults to None.
+            prefix (str, optional): Prefix for all keys. Defaults to "dash_auth_external:".
+        """
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError(
+                    "RedisTokenStore requires the redis package, install it with `pip install redis`."
+                ) from e
+            client = redis.Redis.from_url(url or "redis://localhost:6379/0")
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> dict:
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: dict, ttl: float = None):
+        if ttl is not None and ttl <= 0:
+            # Redis rejects expiry times that are not positive
+            self.delete(key)
+            return
+        # in milliseconds, rounded up so short ttls do not become 0
+        px = math.ceil(ttl * 1000) if ttl is not None else None
+        self.client.set(self.prefix + key, json.dumps(value), px=px)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def pop(self, key: str) -> dict:
+        getdel = getattr(self.client, "getdel", None)
+        if getdel is None:
+            return super().pop(key)
+        value = getdel(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def scan(self, batch_size: int = 100) -> Iterator[List[Tuple[str, dict]]]:
+        keys = []
+        for key in self.client.scan_iter(match=self.prefix + "*", count=batch_size):
+            keys.append(key)
+            if len(keys) == batch_size:
+                yield self._batch(keys)
+                keys = []
+        if keys:
+            yield self._batch(keys)
+
+    def _batch(self, keys: list) -> List[Tuple[str, dict]]:
+        batch = []
+        for key, value in zip(keys, self.client.mget(keys)):
+            if value is not None:
+                key = key.decode("utf-8") if isinstance(key, bytes) else key
+                batch.append((key[len(self.prefix) :], json.loads(value)))
+        return batch
+
+
+class Sweeper:
+    def __init__(self, store: TokenStore, interval: float = 60.0):
+        """Calls ``store.sweep()`` every ``interval`` seconds on a daemon thread.
+
+        Args:
+            store (TokenStore): The store to sweep.
+            interval (float, optional): Seconds between sweeps. Defaults to 60.0.
+        """
+        self.store = store
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> "Sweeper":
+        """Starts the sweeping thread, unless it is running, e.g. again in a forked child."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="dash-auth-external-sweeper", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.store.sweep()
+            except Exception:
+                logger.exception("Sweeping %r failed", self.store)
+
+
+def read_session_token(
+    store: TokenStore = None,
+    key: str = FLASK_SESSION_TOKEN_KEY,
+    codec: CompactTokenCodec = None,
+) -> dict:
+    """Reads token data from the session cookie, or from ``store`` via the session id it holds.
+
+    Args:
+        store (TokenStore, optional): Server-side store. Defaults to None, reading from the cookie.
+        key (str, optional): Session key of the provider's token. Defaults to FLASK_SESSION_TOKEN_KEY.
+        codec (CompactTokenCodec, optional): Decodes token data kept in the cookie. Defaults to None.
+
+    Returns:
+        dict: The token data, None if the session holds no token.
+    """
+    from flask import session
+
+    data = session.get(key)
+    if data is None:
+        return None
+    if store is None:
+        return data if codec is None else codec.decode(data)
+    sid = data.get("sid")
+    if sid is None:
+        return None
+    return store.get(sid)
+
+
+def session_id(key: str = FLASK_SESSION_TOKEN_KEY) -> str:
+    """Returns the opaque session id of a store backed session, None for cookie storage."""
+    from flask import session
+
+    data = session.get(key)
+    return data.get("sid") if isinstance(data, dict) else None
+
+
+def write_session_token(
+    token_data: dict,
+    store: TokenStore = None,
+    new_session: bool = False,
+    key: str = FLASK_SESSION_TOKEN_KEY,
+    codec: CompactTokenCodec = None,
+    sid_prefix: str = "",
+    ttl: float = None,
+):
+    """Writes token data to the session cookie, or to ``store`` leaving only a session id in the cookie.
+
+    Args:
+        token_data (dict): The token data to write.
+        store (TokenStore, optional): Server-side store. Defaults to None, storing in the cookie.
+        new_session (bool, optional): Issue a fresh session id, used on login. Defaults to False.
+        key (str, optional): Session key of the provider's token. Defaults to FLASK_SESSION_TOKEN_KEY.
+        codec (CompactTokenCodec, optional): Encodes token data kept in the cookie. Defaults to None.
+        sid_prefix (str, optional): Prefix of newly issued session ids, identifies the provider in the store. Defaults to "".
+        ttl (float, optional): Seconds the token data is kept in ``store``. Defaults to None, keeping it until deleted.
+
+    Returns:
+        str: The session id the token was stored under, None for cookie storage.
+    """
+    from flask import session
+
+    if store is None:
+        session[key] = token_data if codec is None else codec.encode(token_data)
+        return None
+    data = session.get(key) or {}
+    sid = None if new_session else data.get("sid")
+    if sid is None:
+        sid = sid_prefix + secrets.token_urlsafe(32)
+        session[key] = {"sid": sid}
+    store.set(sid, token_data, ttl=ttl)
+    return sid
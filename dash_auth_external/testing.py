@@ -0,0 +1,236 @@
+"""A local stub OAuth2 provider for tests and benchmarks."""
+
+import json
+import math
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self, method: str):
+        provider = self.server.provider
+        parsed = urllib.parse.urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        form = dict(urllib.parse.parse_qsl(raw.decode("utf-8")))
+        handler = provider.routes.get((method, parsed.path))
+        with provider.lock:
+            provider.calls[parsed.path] = provider.calls.get(parsed.path, 0) + 1
+        if provider.delay:
+            time.sleep(provider.delay)
+        retry_after = provider.throttle()
+        if retry_after is not None:
+            status, headers = 429, {"Retry-After": str(retry_after)}
+            body = {"error": "rate_limited"}
+        elif provider.flaky():
+            status, headers, body = 503, {}, {"error": "temporarily_unavailable"}
+        elif handler is None:
+            status, headers, body = 404, {}, {"error": "not_found"}
+        else:
+            status, headers, body = handler(self, form)
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        headers = {"Content-Type": "application/json", **headers}
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def get_request(self):
+        request = super().get_request()
+        with self.provider.lock:
+            self.provider.connections += 1
+        return request
+
+
+class StubProvider:
+    def __init__(
+        self,
+        delay: float = 0.0,
+        expires_in: int = 3600,
+        failure_rate: float = 0.0,
+        seed: int = None,
+        rate_limit: float = None,
+        rate_burst: int = 1,
+    ):
+        """A threaded HTTP server that behaves like a minimal OAuth2 provider.
+
+        Every call is counted per path in ``calls`` and every accepted TCP
+        connection in ``connections``. Revoked tokens are listed in
+        ``revoked``. Extra endpoints can be added through ``routes``, keyed
+        by ``(method, path)``. ``failure_rate`` can be changed while the
+        server runs to simulate an outage. Requests over ``rate_limit`` are
+        answered with 429 and a ``Retry-After``, and counted in
+        ``throttled``.
+
+        Args:
+            delay (float, optional): Seconds to sleep before answering each request. Defaults to 0.0.
+            expires_in (int, optional): Lifetime of issued access tokens. Defaults to 3600.
+            failure_rate (float, optional): Share of requests answered with 503 Service Unavailable. Defaults to 0.0.
+            seed (int, optional): Seeds the choice of failing requests. Defaults to None.
+            rate_limit (float, optional): Requests per second accepted, None for no limit. Defaults to None.
+            rate_burst (int, optional): Requests accepted back to back under rate_limit. Defaults to 1.
+        """
+        self.delay = delay
+        self.expires_in = expires_in
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
+        self.throttled = 0
+        self._allowance = float(rate_burst)
+        self._allowance_at = time.monotonic()
+        self.calls = {}
+        self.connections = 0
+        self.issued = 0
+        self.lock = threading.Lock()
+        self.jwks = {"keys": []}
+        self.revoked = []
+        self.routes = {
+            ("POST", "/token"): self.token_endpoint,
+            ("POST", "/revoke"): self.revocation_endpoint,
+            ("GET", "/userinfo"): self.userinfo_endpoint,
+            ("GET", "/jwks"): lambda handler, form: (200, {}, self.jwks),
+            ("GET", "/.well-known/openid-configuration"): lambda handler, form: (
+                200,
+                {},
+                self.metadata,
+            ),
+        }
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def token_url(self) -> str:
+        return self.url + "/token"
+
+    @property
+    def jwks_url(self) -> str:
+        return self.url + "/jwks"
+
+    @property
+    def metadata(self) -> dict:
+        """The OpenID Connect discovery document for this provider."""
+        return {
+            "issuer": self.url,
+            "authorization_endpoint": self.url + "/authorize",
+            "token_endpoint": self.token_url,
+            "jwks_uri": self.jwks_url,
+            "userinfo_endpoint": self.url + "/userinfo",
+            "revocation_endpoint": self.url + "/revoke",
+            "id_token_signing_alg_values_supported": ["RS256"],
+        }
+
+    def flaky(self) -> bool:
+        """Whether the current request should fail, see ``failure_rate``."""
+        if not self.failure_rate:
+            return False
+        with self.lock:
+            return self._random.random() < self.failure_rate
+
+    def throttle(self) -> int:
+        """Seconds the current request is told to wait, None if it is within ``rate_limit``."""
+        if self.rate_limit is None:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            self._allowance = min(
+                self.rate_burst,
+                self._allowance + (now - self._allowance_at) * self.rate_limit,
+            )
+            self._allowance_at = now
+            if self._allowance >= 1:
+                self._allowance -= 1
+                return None
+            self.throttled += 1
+            return math.ceil((1 - self._allowance) / self.rate_limit)
+
+    def token_endpoint(self, handler, form: dict):
+        with self.lock:
+            self.issued += 1
+            n = self.issued
+        body = {
+            "access_token": f"access_token_{n}",
+            "token_type": "Bearer",
+            "expires_in": self.expires_in,
+            "refresh_token": f"refresh_token_{n}",
+        }
+        return 200, {}, body
+
+    def userinfo_endpoint(self, handler, form: dict):
+        authorization = handler.headers.get("Authorization", "")
+        if not authorization.startswith("Bearer "):
+            return 401, {}, {"error": "invalid_token"}
+        return 200, {}, {"sub": "user", "access_token": authorization[7:]}
+
+    def revocation_endpoint(self, handler, form: dict):
+        with self.lock:
+            self.revoked.append(form.get("token"))
+        return 200, {}, b""
+
+    def start(self) -> "StubProvider":
+        self._server = _StubServer(("127.0.0.1", 0), _StubHandler)
+        self._server.provider = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "StubProvider":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def login(client, auth_suffix: str, redirect_suffix: str, code: str = "c"):
+    """Logs in on a Flask test client, as the browser would.
+
+    Follows the authorize route, then calls the redirect route with ``code``
+    and the state the app issued.
+
+    Args:
+        client (FlaskClient): The test client.
+        auth_suffix (str): The provider's authorize route.
+        redirect_suffix (str): The provider's redirect route.
+        code (str, optional): The authorization code. Defaults to "c".
+
+    Returns:
+        TestResponse: The response of the redirect route.
+    """
+    location = client.get(auth_suffix).location
+    state = urllib.parse.parse_qs(urllib.parse.urlparse(location).query)["state"][0]
+    return client.get(redirect_suffix, query_string={"code": code, "state": state})
@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 import time
 
+IDENTITY_KEYS = ("sub", "user_id", "id", "account_id")
+
 
 @dataclass
 class OAuth2Token:
@@ -10,10 +12,43 @@ class OAuth2Token:
     refresh_token: str = None
     expires_at: float = None
     token_data: dict = None
+    claims: dict = None
 
     def __post_init__(self):
         if self.expires_at is None and self.expires_in is not None:
             self.expires_at = time.time() + float(self.expires_in)
 
-    def is_expired(self):
-        return time.time() > self.expires_at if self.expires_at else False
+    @classmethod
+    def from_response(cls, data: dict, refresh_token: str = None) -> "OAuth2Token":
+        """Builds a token from a token endpoint response.
+
+        Args:
+            data (dict): The JSON response of the token endpoint.
+            refresh_token (str, optional): Kept when the response carries no new refresh token. Defaults to None.
+        """
+        return cls(
+            access_token=data.get("access_token"),
+            token_type=data.get("token_type"),
+            expires_in=data.get("expires_in"),
+            refresh_token=data.get("refresh_token", refresh_token),
+            token_data=data,
+        )
+
+    def is_expired(self, leeway: float = 0):
+        return time.time() + leeway > self.expires_at if self.expires_at else False
+
+    def identity(self) -> str:
+        """A stable identifier for the user the token belongs to.
+
+        Taken from the validated claims or the token response (``sub``,
+        ``user_id``, ...). None when the provider sends neither, e.g. GitHub:
+        the credentials themselves change on every refresh and cannot stand
+        in for the user.
+        """
+        for source in (self.claims, self.token_data):
+            if not source:
+                continue
+            for key in IDENTITY_KEYS:
+                if source.get(key) is not None:
+                    return str(source[key])
+        return None
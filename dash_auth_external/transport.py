@@ -0,0 +1,128 @@
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+
+# Status retries resend the request, which is only safe when resending cannot
+# repeat a side effect. A token request is a POST that redeems a single-use
+# authorization code or rotates a refresh token, so it is only retried on
+# connection errors, before the provider has seen it.
+RETRY_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# Methods that RFC 9110 defines as idempotent, retried by the API transport.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class Transport:
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        retries: int = 2,
+        backoff_factor: float = 0.3,
+        status_forcelist: tuple = (502, 503, 504),
+        retry_methods: frozenset = RETRY_METHODS,
+    ):
+        """Pooled, keep-alive HTTP client shared by token and refresh requests.
+
+        Args:
+            pool_connections (int, optional): Number of host pools to cache. Defaults to 10.
+            pool_maxsize (int, optional): Maximum connections kept alive per host. Defaults to 10.
+            connect_timeout (float, optional): Seconds to wait for a connection. Defaults to 5.0.
+            read_timeout (float, optional): Seconds to wait for a response. Defaults to 30.0.
+            retries (int, optional): Retries on connection errors, and on status_forcelist responses to retry_methods requests. Defaults to 2.
+            backoff_factor (float, optional): Exponential backoff factor between retries. Defaults to 0.3.
+            status_forcelist (tuple, optional): Response codes that trigger a retry. Defaults to (502, 503, 504).
+            retry_methods (frozenset, optional): Methods retried on status_forcelist responses. Defaults to RETRY_METHODS, which excludes POST.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+        self.retry_methods = frozenset(retry_methods)
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> "requests.Session":
+        """The underlying session, created on first use.
+
+        requests is imported here rather than at module level, so importing
+        the package stays cheap until the first HTTP request.
+        """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    from urllib3.util.retry import Retry
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_connections,
+                        pool_maxsize=self.pool_maxsize,
+                        max_retries=Retry(
+                            total=self.retries,
+                            connect=self.retries,
+                            read=0,
+                            status=self.retries,
+                            backoff_factor=self.backoff_factor,
+                            status_forcelist=self.status_forcelist,
+                            allowed_methods=self.retry_methods,
+                            respect_retry_after_header=False,
+                            raise_on_status=False,
+                        ),
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def post(self, url: str, data: dict = None, headers: dict = None, **kwargs):
+        return self.request("POST", url, data=data, headers=headers, **kwargs)
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+_default_transport = None
+_default_api_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport() -> Transport:
+    """Returns the process wide transport used when none is supplied."""
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                _default_transport = Transport()
+    return _default_transport
+
+
+def get_default_api_transport() -> Transport:
+    """Returns the process wide transport of ApiClient, separate from token requests.
+
+    Its status retries cover every idempotent method, but never POST or
+    PATCH, whose retry could repeat a write.
+    """
+    global _default_api_transport
+    if _default_api_transport is None:
+        with _default_transport_lock:
+            if _default_api_transport is None:
+                _default_api_transport = Transport(retry_methods=IDEMPOTENT_METHODS)
+    return _default_api_transport
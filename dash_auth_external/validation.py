@@ -0,0 +1,168 @@
+"""Local validation of JWT access and id tokens against a cached JWKS."""
+import threading
+import time
+from typing import Sequence
+from dash_auth_external.exceptions import TokenValidationError
+from dash_auth_external.token import OAuth2Token
+from dash_auth_external.transport import Transport, get_default_transport
+
+
+def _import_jwt():
+    try:
+        import jwt
+    except ImportError as e:
+        raise ImportError(
+            "Token validation requires PyJWT, install it with `pip install dash-auth-external[jwt]`."
+        ) from e
+    return jwt
+
+
+class JWKSCache:
+    def __init__(
+        self,
+        jwks_url: str,
+        ttl: float = 3600.0,
+        min_refetch_interval: float = 30.0,
+        transport: Transport = None,
+    ):
+        """Fetches a provider's JSON Web Key Set once and caches the parsed keys.
+
+        The set is refetched when it is older than ``ttl``, or when a token
+        names a key id that is not cached, which is how providers roll keys.
+        Kid-miss refetches are rate limited by ``min_refetch_interval``.
+
+        Args:
+            jwks_url (str): The provider's jwks_uri.
+            ttl (float, optional): Seconds the key set is cached. Defaults to 3600.0.
+            min_refetch_interval (float, optional): Minimum seconds between kid-miss refetches. Defaults to 30.0.
+            transport (Transport, optional): HTTP client for fetching the key set. Defaults to the shared Transport.
+        """
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self.min_refetch_interval = min_refetch_interval
+        self.transport = transport
+        self._keys = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def _fetch(self):
+        jwt = _import_jwt()
+        transport = self.transport or get_default_transport()
+        r = transport.get(self.jwks_url)
+        r.raise_for_status()
+        keys = {}
+        for jwk in r.json().get("keys", []):
+            if jwk.get("use", "sig") != "sig":
+                continue
+            try:
+                keys[jwk.get("kid")] = jwt.PyJWK(jwk)
+            except jwt.PyJWKError:
+                continue
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+    def get_key(self, kid: str):
+        """Returns the parsed key for ``kid``.
+
+        Raises:
+            TokenValidationError: If the key set does not contain ``kid``.
+        """
+        now = time.monotonic()
+        key = self._keys.get(kid)
+        if key is not None and now - self._fetched_at < self.ttl:
+            return key
+        with self._lock:
+            key = self._keys.get(kid)
+            stale = self._fetched_at is None or now - self._fetched_at >= self.ttl
+            may_refetch = (
+                self._fetched_at is None
+                or now - self._fetched_at >= self.min_refetch_interval
+            )
+            if stale or (key is None and may_refetch):
+                self._fetch()
+                key = self._keys.get(kid)
+        if key is None:
+            raise TokenValidationError(f"No signing key found for kid {kid!r}.")
+        return key
+
+
+class JWTValidator:
+    def __init__(
+        self,
+        jwks_url: str,
+        audience: str = None,
+        issuer: str = None,
+        algorithms: Sequence[str] = ("RS256",),
+        leeway: float = 0,
+        token_field: str = "id_token",
+        jwks_ttl: float = 3600.0,
+        transport: Transport = None,
+    ):
+        """Verifies signature, exp, aud and iss of JWTs without calling the provider.
+
+        Args:
+            jwks_url (str): The provider's jwks_uri.
+            audience (str, optional): Expected ``aud`` claim, usually the client id. Defaults to None, skipping the check.
+            issuer (str, optional): Expected ``iss`` claim. Defaults to None, skipping the check.
+            algorithms (Sequence[str], optional): Accepted signing algorithms. Defaults to ("RS256",).
+            leeway (float, optional): Seconds of clock skew tolerated for exp and nbf. Defaults to 0.
+            token_field (str, optional): Which token to validate, a key of token_data or "access_token". Defaults to "id_token".
+            jwks_ttl (float, optional): Seconds the key set is cached. Defaults to 3600.0.
+            transport (Transport, optional): HTTP client for fetching the key set. Defaults to the shared Transport.
+        """
+        self.audience = audience
+        self.issuer = issuer
+        self.algorithms = list(algorithms)
+        self.leeway = leeway
+        self.token_field = token_field
+        self.jwks = JWKSCache(jwks_url, ttl=jwks_ttl, transport=transport)
+
+    def validate(self, encoded: str) -> dict:
+        """Validates an encoded JWT.
+
+        Returns:
+            dict: The verified claims.
+
+        Raises:
+            TokenValidationError: If the token is malformed, not signed by the provider, expired or issued for someone else.
+        """
+        jwt = _import_jwt()
+        try:
+            header = jwt.get_unverified_header(encoded)
+            key = self.jwks.get_key(header.get("kid"))
+            return jwt.decode(
+                encoded,
+                key=key.key,
+                algorithms=self.algorithms,
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={
+                    "require": ["exp"],
+                    "verify_aud": self.audience is not None,
+                },
+            )
+        except jwt.PyJWTError as e:
+            raise TokenValidationError(str(e)) from e
+
+    def validate_token(self, token: OAuth2Token, previous: OAuth2Token = None) -> dict:
+        """Validates the configured field of ``token`` and stores the claims on it.
+
+        Args:
+            token (OAuth2Token): The token to validate.
+            previous (OAuth2Token, optional): The token it replaces. Refresh responses often carry no new id_token, its claims are then kept. Defaults to None.
+
+        Returns:
+            dict: The verified claims.
+        """
+        if self.token_field == "access_token":
+            encoded = token.access_token
+        else:
+            encoded = (token.token_data or {}).get(self.token_field)
+        if encoded is None and previous is not None and previous.claims is not None:
+            token.claims = previous.claims
+            return token.claims
+        if encoded is None:
+            raise TokenValidationError(f"Token response has no {self.token_field}.")
+        token.claims = self.validate(encoded)
+        return token.claims
@@ -14,7 +14,7 @@ with open(this_directory / "README.md", encoding="utf-8") as f:
 
 
 
-requires = ["dash >= 2.0.0", "requests >= 1.0.0", "requests-oauthlib >= 0.3.0"]
+requires = ["dash >= 2.0.0", "requests >= 1.0.0"]
 
 setup(
     name=NAME,
@@ -25,6 +25,10 @@ setup(
     url="https://github.com/jamesholcombe/dash-auth-external",
     keywords=["Dash", "Plotly", "Authentication", "Auth", "External"],
     install_requires=requires,
+    extras_require={
+        "async": ["httpx >= 0.23.0", "flask[async]"],
+        "jwt": ["PyJWT[crypto] >= 2.4.0"],
+    },
     packages=find_packages(),
     include_package_data=True,
     long_description=long_description,
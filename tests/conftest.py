@@ -0,0 +1,44 @@
+import pytest
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.testing import StubProvider
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+@pytest.fixture()
+def provider():
+    with StubProvider() as provider:
+        yield provider
+
+
+@pytest.fixture()
+def make_auth(provider):
+    """Returns a factory of DashAuthExternal instances logging in with ``provider``."""
+
+    def make_auth(**kwargs):
+        kwargs.setdefault("with_pkce", False)
+        return DashAuthExternal(
+            EXTERNAL_AUTH_URL, provider.token_url, CLIENT_ID, **kwargs
+        )
+
+    return make_auth
+
+
+@pytest.fixture()
+def expired_token_data():
+    return {
+        "access_token": "access_token",
+        "refresh_token": "refresh_token",
+        "token_type": "Bearer",
+        "expires_in": -1,
+    }
+
+
+@pytest.fixture()
+def expired_session(mocker, expired_token_data):
+    """Serves ``expired_token_data`` as the session token, outside of a request."""
+    mocker.patch(
+        "dash_auth_external.auth._get_token_data_from_session",
+        return_value=expired_token_data,
+    )
+    mocker.patch("dash_auth_external.auth._set_token_data_in_session")
+    return expired_token_data
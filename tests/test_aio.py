@@ -0,0 +1,99 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.aio import AsyncTransport, async_token_request
+from dash_auth_external.exceptions import TokenExpiredError
+from dash_auth_external.testing import login
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+pytest.importorskip("httpx")
+
+
+@pytest.fixture()
+def provider(provider):
+    provider.delay = 0.1
+    return provider
+
+
+def test_async_token_request(provider):
+    async def main():
+        transport = AsyncTransport()
+        data = await async_token_request(provider.token_url, {}, {}, transport)
+        await async_token_request(provider.token_url, {}, {}, transport)
+        await transport.aclose()
+        return data
+
+    assert asyncio.run(main())["access_token"] == "access_token_1"
+    assert provider.connections == 1
+
+
+def test_async_transport_pools_across_event_loops(provider):
+    # Flask async views run each request on a fresh event loop
+    transport = AsyncTransport()
+    for _ in range(5):
+        asyncio.run(async_token_request(provider.token_url, {}, {}, transport))
+    assert provider.connections == 1
+    asyncio.run(transport.aclose())
+
+
+def test_concurrent_async_refreshes_hit_provider_once(provider, expired_session):
+    auth = DashAuthExternal(EXTERNAL_AUTH_URL, provider.token_url, CLIENT_ID)
+
+    async def main():
+        return await asyncio.gather(*(auth.get_token_async() for _ in range(20)))
+
+    assert asyncio.run(main()) == ["access_token_1"] * 20
+    assert provider.calls["/token"] == 1
+
+
+@pytest.mark.parametrize("lock_dir", [False, True])
+def test_sync_and_async_refreshes_hit_provider_once(
+    provider, expired_session, tmp_path, lock_dir
+):
+    # with a lock dir, the sync and async callers are on separate instances
+    # sharing the refresh only through the file lock
+    kwargs = {"refresh_lock_dir": str(tmp_path)} if lock_dir else {}
+    sync_auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL, provider.token_url, CLIENT_ID, **kwargs
+    )
+    async_auth = (
+        DashAuthExternal(EXTERNAL_AUTH_URL, provider.token_url, CLIENT_ID, **kwargs)
+        if lock_dir
+        else sync_auth
+    )
+
+    async def main():
+        return await asyncio.gather(*(async_auth.get_token_async() for _ in range(5)))
+
+    with ThreadPoolExecutor(5) as pool:
+        futures = [pool.submit(sync_auth.get_token) for _ in range(5)]
+        tokens = asyncio.run(main())
+        tokens += [f.result() for f in futures]
+    assert tokens == ["access_token_1"] * 10
+    assert provider.calls["/token"] == 1
+
+
+def test_async_expired_without_refresh_raises(mocker):
+    auth = DashAuthExternal(EXTERNAL_AUTH_URL, "TOKEN_URL", CLIENT_ID)
+    mocker.patch(
+        "dash_auth_external.auth._get_token_data_from_session",
+        return_value={"access_token": "a", "expires_in": -1},
+    )
+    with pytest.raises(TokenExpiredError):
+        asyncio.run(auth.get_token_async())
+
+
+def test_async_view_in_request_context(provider):
+    pytest.importorskip("asgiref")
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL, provider.token_url, CLIENT_ID, with_pkce=False
+    )
+
+    @auth.server.route("/token")
+    async def show_token():
+        return await auth.get_token_async()
+
+    with auth.server.test_client() as client:
+        login(client, auth.auth_suffix, auth.redirect_suffix)
+        assert client.get("/token").data == b"access_token_1"
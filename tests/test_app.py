@@ -1,6 +1,5 @@
 import pytest
 from dash_auth_external import DashAuthExternal
-from unittest.mock import Mock
 from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
 from .test_config import (
     EXERNAL_TOKEN_URL,
@@ -15,7 +14,8 @@ from requests_oauthlib import OAuth2Session
     "with_pkce, with_client_secret",
     [(True, True), (True, False), (False, True), (False, False)],
 )
-def test_flow(with_pkce, with_client_secret, mocker):
+def test_flow(with_pkce, with_client_secret, mocker, monkeypatch):
+    monkeypatch.setenv("OAUTHLIB_INSECURE_TRANSPORT", "1")
 
     auth = DashAuthExternal(
         EXTERNAL_AUTH_URL,
@@ -26,17 +26,12 @@ def test_flow(with_pkce, with_client_secret, mocker):
     )
     redirect_uri = "http://127.0.0.1:8050" + auth.redirect_suffix
 
-    session_mock = Mock(
-        OAuth2Session(
-            CLIENT_ID,
-            redirect_uri=redirect_uri,
-            scope=auth.scope,
-        )
+    oauth_session = OAuth2Session(
+        CLIENT_ID, redirect_uri=redirect_uri, scope=auth.scope
     )
     app = auth.server
-    session_mock.authorization_url.return_value = ("https://example.com", "state")
 
-    mocker.patch("dash_auth_external.routes.OAuth2Session", return_value=session_mock)
+    mocker.patch("dash_auth_external.routes.make_state", return_value="state")
     token_request_mock = mocker.patch(
         "dash_auth_external.routes.token_request",
         return_value={
@@ -70,13 +65,17 @@ def test_flow(with_pkce, with_client_secret, mocker):
         assert response.status_code == 302
 
         if with_pkce:
-            session_mock.authorization_url.assert_called_with(
+            expected_url, _ = oauth_session.authorization_url(
                 EXTERNAL_AUTH_URL,
+                state="state",
                 code_challenge="code_challenge",
                 code_challenge_method="S256",
             )
         else:
-            session_mock.authorization_url.assert_called_with(EXTERNAL_AUTH_URL)
+            expected_url, _ = oauth_session.authorization_url(
+                EXTERNAL_AUTH_URL, state="state"
+            )
+        assert response.location == expected_url
 
         response = client.get(
             auth.redirect_suffix, query_string={"code": "code", "state": "state"}
@@ -85,6 +84,9 @@ def test_flow(with_pkce, with_client_secret, mocker):
             url=EXERNAL_TOKEN_URL,
             body=expected_token_request_body,
             headers={},
+            transport=auth.transport,
+            hooks=auth.hooks,
+            limiter=None,
         )
 
         assert response.status_code == 302
@@ -144,3 +144,40 @@ def test_get_token_data_ok(dash_app_and_auth, mocker, access_token_data_with_ref
     token_compare.expires_at = None
     token.expires_at = None
     assert token_compare == token
+
+
+def test_get_token_data_cached_per_request(
+    dash_app_and_auth, mocker, access_token_data_with_refresh
+):
+    dash_app, auth = dash_app_and_auth
+    session_mock = mocker.patch(
+        "dash_auth_external.auth._get_token_data_from_session",
+        return_value=access_token_data_with_refresh,
+    )
+
+    with auth.server.test_request_context():
+        first = auth.get_token_data()
+        assert auth.get_token_data() is first
+        assert auth.get_token() == "access_token"
+    assert session_mock.call_count == 1
+
+    with auth.server.test_request_context():
+        auth.get_token_data()
+    assert session_mock.call_count == 2
+
+
+def test_refresh_replaces_cached_token(
+    dash_app_and_auth, mocker, expired_access_token_data_with_refresh
+):
+    dash_app, auth = dash_app_and_auth
+    mocker.patch(
+        "dash_auth_external.auth._get_token_data_from_session",
+        return_value=expired_access_token_data_with_refresh,
+    )
+    refreshed = OAuth2Token(access_token="new_access_token", expires_in=3599)
+    mocker.patch("dash_auth_external.auth.refresh_token", return_value=refreshed)
+    mocker.patch("dash_auth_external.auth.write_session_token")
+
+    with auth.server.test_request_context():
+        assert auth.get_token() == "new_access_token"
+        assert auth.get_token_data() is refreshed
@@ -0,0 +1,54 @@
+import json
+import pytest
+from benchmarks import bench_flow
+from benchmarks.run import compare, compare_counts, main
+
+
+def _result(p50, p99, rps):
+    return {"p50_ms": p50, "p99_ms": p99, "throughput_rps": rps}
+
+
+def test_compare_flags_regressions():
+    baseline = {"flow": {"warm_token/threads=1": _result(1.0, 2.0, 1000)}}
+    results = {"flow": {"warm_token/threads=1": _result(1.1, 3.0, 700)}}
+    regressions = compare(results, baseline, tolerance=0.25)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("warm_token/threads=1 p99_ms")
+
+
+def test_compare_ignores_new_scenarios():
+    results = {"flow": {"warm_token/threads=1": _result(1.0, 2.0, 1000)}}
+    assert compare(results, {"flow": {}}, tolerance=0.25) == []
+
+
+def test_compare_counts_flags_more_provider_calls():
+    baseline = {"flow": {"refresh_storm/threads=4": {"provider_calls": 2}}}
+    results = {"flow": {"refresh_storm/threads=4": {"provider_calls": 8}}}
+    assert compare_counts(results, baseline) == [
+        "refresh_storm/threads=4 provider_calls: 2 -> 8"
+    ]
+    assert compare_counts(baseline, results) == []
+
+
+@pytest.mark.parametrize("warn_on_latency, status", [(False, 1), (True, 0)])
+def test_latency_regressions_only_warned(mocker, tmp_path, warn_on_latency, status):
+    baseline = {"flow": {"warm_token/threads=1": _result(1.0, 2.0, 1000)}}
+    results = {"flow": {"warm_token/threads=1": _result(5.0, 9.0, 100)}}
+    mocker.patch("benchmarks.run.run_suite", return_value=results)
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps(baseline))
+    argv = ["--output", str(tmp_path / "results.json"), "--baseline", str(path)]
+    if warn_on_latency:
+        argv.append("--warn-on-latency")
+    assert main(argv) == status
+
+
+def test_flow_benchmark_runs():
+    results = bench_flow.run(thread_counts=(2,), iterations=10)
+    assert set(results) == {
+        "authorize/threads=2",
+        "exchange/threads=2",
+        "warm_token/threads=2",
+        "refresh_storm/threads=2",
+    }
+    assert results["refresh_storm/threads=2"]["provider_calls"] >= 1
@@ -0,0 +1,215 @@
+import asyncio
+import pytest
+import requests
+from dash_auth_external import DashAuthExternal, Transport
+from dash_auth_external.breaker import CircuitBreaker
+from dash_auth_external.exceptions import CircuitOpenError, RateLimitError
+from dash_auth_external.hooks import PrometheusHook
+from dash_auth_external.testing import login
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+def _fail(error):
+    def fn():
+        raise error
+
+    return fn
+
+
+def test_opens_after_threshold_and_probes_after_timeout(mocker):
+    now = mocker.patch("dash_auth_external.breaker.time.monotonic", return_value=0.0)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            breaker.call(_fail(_http_error(503)))
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "not called")
+
+    now.return_value = 10.0
+    assert breaker.state == "half_open"
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now.return_value = 20.0
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_client_errors_do_not_count():
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(requests.HTTPError):
+        breaker.call(_fail(_http_error(400)))
+    assert breaker.state == "closed"
+    with pytest.raises(requests.ConnectionError):
+        breaker.call(_fail(requests.ConnectionError()))
+    assert breaker.state == "open"
+
+
+def test_client_side_errors_do_not_count():
+    breaker = CircuitBreaker(failure_threshold=1)
+    for error in (RateLimitError("queue full"), CircuitOpenError("open")):
+        with pytest.raises(type(error)):
+            breaker.call(_fail(error))
+    assert breaker.state == "closed"
+
+
+def _half_open(mocker):
+    now = mocker.patch("dash_auth_external.breaker.time.monotonic", return_value=0.0)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    with pytest.raises(requests.HTTPError):
+        breaker.call(_fail(_http_error(503)))
+    now.return_value = 10.0
+    return breaker
+
+
+def test_client_side_errors_keep_half_open_state(mocker):
+    breaker = _half_open(mocker)
+    for error in (RateLimitError("queue full"), CircuitOpenError("open")):
+        with pytest.raises(type(error)):
+            breaker.call(_fail(error))
+        assert breaker.state == "half_open"
+    assert breaker._failures == 1
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_cancelled_probe_frees_its_slot(mocker):
+    breaker = _half_open(mocker)
+
+    async def main():
+        probe = asyncio.ensure_future(breaker.call_async(asyncio.Event().wait))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        async def ok():
+            return "ok"
+
+        return await breaker.call_async(ok)
+
+    assert asyncio.run(main()) == "ok"
+    assert breaker.state == "closed"
+
+
+@pytest.fixture()
+def provider(provider):
+    provider.failure_rate = 1.0
+    return provider
+
+
+def _auth(provider, mocker, **kwargs):
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL,
+        provider.token_url,
+        CLIENT_ID,
+        transport=Transport(retries=0),
+        circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60),
+        **kwargs,
+    )
+    mocker.patch(
+        "dash_auth_external.auth._get_token_data_from_session",
+        return_value={
+            "access_token": "stale",
+            "refresh_token": "refresh_token",
+            "expires_in": -1,
+        },
+    )
+    mocker.patch("dash_auth_external.auth._set_token_data_in_session")
+    return auth
+
+
+def test_outage_fails_fast(provider, mocker):
+    auth = _auth(provider, mocker)
+
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            auth.get_token()
+    for _ in range(5):
+        with pytest.raises(CircuitOpenError):
+            auth.get_token()
+    assert provider.calls["/token"] == 2
+
+
+def test_stale_token_served_while_open(provider, mocker):
+    auth = _auth(provider, mocker, stale_token_grace=30)
+    hook = auth.add_hook(PrometheusHook())
+    breaker = auth._provider().circuit_breaker
+
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            auth.get_token()
+    assert auth.get_token() == "stale"
+    assert "dash_auth_external_stale_token_served_total 1" in hook.expose()
+
+    provider.failure_rate = 0.0
+    breaker.reset_timeout = 0
+    assert auth.get_token() == "access_token_1"
+    assert breaker.state == "closed"
+
+
+def test_stale_token_outside_grace_raises(provider, mocker):
+    auth = _auth(provider, mocker, stale_token_grace=30)
+    mocker.patch(
+        "dash_auth_external.auth._get_token_data_from_session",
+        return_value={"access_token": "old", "refresh_token": "r", "expires_in": -60},
+    )
+    auth._provider().circuit_breaker.record_failure()
+    auth._provider().circuit_breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        auth.get_token()
+
+
+def test_code_exchange_and_service_tokens_fail_fast(provider):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL,
+        provider.token_url,
+        CLIENT_ID,
+        client_secret="secret",
+        with_pkce=False,
+        transport=Transport(retries=0),
+        circuit_breaker=breaker,
+    )
+    with pytest.raises(requests.HTTPError):
+        auth.get_service_token()
+    with pytest.raises(CircuitOpenError):
+        auth.get_service_token()
+
+    with auth.server.test_client() as client:
+        response = login(client, auth.auth_suffix, auth.redirect_suffix)
+    assert response.status_code == 503
+    assert provider.calls["/token"] == 1
+
+
+def test_async_stale_token_served_while_open(provider, mocker):
+    pytest.importorskip("httpx")
+    import asyncio
+    from dash_auth_external.aio import AsyncTransport
+
+    auth = _auth(
+        provider,
+        mocker,
+        stale_token_grace=30,
+        async_transport=AsyncTransport(retries=0),
+    )
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(Exception):
+                await auth.get_token_async()
+        return await auth.get_token_async()
+
+    assert asyncio.run(main()) == "stale"
+    assert provider.calls["/token"] == 2
@@ -0,0 +1,141 @@
+import threading
+import pytest
+from dash_auth_external import DashAuthExternal, SQLiteTokenStore
+from dash_auth_external.callback_cache import CallbackCache, token_fingerprint
+from dash_auth_external.hooks import PrometheusHook
+from dash_auth_external.testing import login
+from dash_auth_external.token import OAuth2Token
+from .test_config import EXERNAL_TOKEN_URL, EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+def _token(access_token="a", sub="alice", scope="read"):
+    return OAuth2Token.from_response(
+        {"access_token": access_token, "sub": sub, "scope": scope}
+    )
+
+
+def _counting():
+    def callback(x):
+        callback.count += 1
+        return {"x": x, "n": callback.count}
+
+    callback.count = 0
+    return callback
+
+
+def test_keyed_by_identity_not_access_token():
+    current = {"token": _token()}
+    calls = _counting()
+    cached = CallbackCache().memoize(lambda: current["token"])(calls)
+
+    assert cached(1) == {"x": 1, "n": 1}
+    current["token"] = _token(access_token="refreshed")
+    assert cached(1) == {"x": 1, "n": 1}
+    assert cached(2) == {"x": 2, "n": 2}
+    assert calls.count == 2
+
+
+@pytest.mark.parametrize(
+    "changed", [{"sub": "bob"}, {"scope": "read write"}], ids=["identity", "scopes"]
+)
+def test_refresh_changing_identity_or_scopes_invalidates(changed):
+    current = {"token": _token()}
+    calls = _counting()
+    cached = CallbackCache().memoize(lambda: current["token"])(calls)
+
+    cached(1)
+    current["token"] = _token(access_token="refreshed", **changed)
+    assert cached(1) == {"x": 1, "n": 2}
+
+
+def test_scope_order_does_not_matter():
+    assert token_fingerprint(_token(scope="a b")) == token_fingerprint(
+        _token(scope=["b", "a"])
+    )
+
+
+def test_token_without_identity_needs_user_key():
+    token = _token(sub=None)
+    assert token.identity() is None
+    with pytest.raises(ValueError):
+        token_fingerprint(token)
+    assert token_fingerprint(token, "user") == token_fingerprint(_token(sub="user"))
+
+
+def test_keyed_by_login_without_identity(provider, make_auth):
+    # the stub provider, like GitHub, sends no subject and rotates refresh tokens
+    provider.expires_in = -1
+    auth = make_auth()
+    calls = _counting()
+    cached = auth.cache_per_user()(calls)
+    auth.server.route("/cached")(lambda: cached(1))
+
+    with auth.server.test_client() as client:
+        login(client, auth.auth_suffix, auth.redirect_suffix)
+        assert client.get("/cached").json == {"x": 1, "n": 1}
+        assert client.get("/cached").json == {"x": 1, "n": 1}
+        assert provider.calls["/token"] == 3
+
+        login(client, auth.auth_suffix, auth.redirect_suffix)
+        assert client.get("/cached").json == {"x": 1, "n": 2}
+
+
+def test_ttl_and_exceptions():
+    current = {"token": _token()}
+    calls = _counting()
+    cached = CallbackCache(ttl=-1).memoize(lambda: current["token"])(calls)
+    cached(1)
+    cached(1)
+    assert calls.count == 2
+
+    def fail():
+        raise RuntimeError("boom")
+
+    cache = CallbackCache()
+    with pytest.raises(RuntimeError):
+        cache.call("k", fail)
+    assert cache.call("k", lambda: None) is None
+    assert cache.call("k", lambda: 1) is None
+
+
+def test_concurrent_misses_run_once():
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "done"
+
+    cache = CallbackCache()
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.call("k", slow)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join()
+    assert results == ["done"] * 8
+    assert len(calls) == 1
+
+
+def test_decorator_on_auth_shares_disk_store(mocker, tmp_path):
+    auth = DashAuthExternal(EXTERNAL_AUTH_URL, EXERNAL_TOKEN_URL, CLIENT_ID)
+    hook = auth.add_hook(PrometheusHook())
+    token = _token()
+    mocker.patch.object(auth, "get_token_data", return_value=token)
+    store = SQLiteTokenStore(str(tmp_path / "callbacks.db"))
+    calls = _counting()
+
+    first = auth.cache_per_user(store=store, provider="github")(calls)
+    second = auth.cache_per_user(store=store)(calls)
+
+    assert first(1) == {"x": 1, "n": 1}
+    assert second(1) == {"x": 1, "n": 1}
+    assert calls.count == 1
+    assert second.__wrapped__ is calls
+    auth.get_token_data.assert_called_with(None)
+    assert "dash_auth_external_callback_cache_hit_total 1" in hook.expose()
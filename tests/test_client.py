@@ -0,0 +1,251 @@
+from dataclasses import asdict
+import threading
+import time
+import pytest
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.client import ResponseCache
+from dash_auth_external.store import write_session_token
+from dash_auth_external.token import OAuth2Token
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+@pytest.fixture()
+def auth(provider):
+    return DashAuthExternal(EXTERNAL_AUTH_URL, provider.token_url, CLIENT_ID)
+
+
+def _login(token="access_token_0", user="user-1"):
+    token = OAuth2Token(
+        access_token=token,
+        expires_in=3600,
+        refresh_token="refresh_token_0",
+        token_data={} if user is None else {"user_id": user},
+    )
+    write_session_token(asdict(token))
+
+
+def _me_route(provider, headers=None):
+    seen = []
+
+    def me(handler, form):
+        seen.append(handler.headers.get("Authorization"))
+        if handler.headers.get("If-None-Match") == '"v1"':
+            return 304, dict(headers or {}), b""
+        return 200, dict(headers or {}), {"id": "user-1"}
+
+    provider.routes[("GET", "/me")] = me
+    return seen
+
+
+def test_injects_bearer_token(provider, auth):
+    seen = _me_route(provider)
+    with auth.server.test_request_context():
+        _login()
+        client = auth.api_client(base_url=provider.url)
+        assert client.get("/me").json() == {"id": "user-1"}
+    assert seen == ["Bearer access_token_0"]
+
+
+def test_writes_are_not_resent_on_5xx(provider, auth):
+    provider.routes[("POST", "/items")] = lambda handler, form: (503, {}, {})
+    with auth.server.test_request_context():
+        _login()
+        client = auth.api_client(base_url=provider.url)
+        assert client.post("/items", json={"name": "a"}).status_code == 503
+    assert provider.calls["/items"] == 1
+    assert client.transport is not auth.transport
+    assert {"GET", "PUT", "DELETE"} <= client.transport.retry_methods
+    assert "POST" not in client.transport.retry_methods
+
+
+def test_refreshes_once_on_401(provider, auth):
+    seen = []
+
+    def me(handler, form):
+        seen.append(handler.headers.get("Authorization"))
+        if handler.headers.get("Authorization") == "Bearer access_token_0":
+            return 401, {}, {}
+        return 200, {}, {"id": "user-1"}
+
+    provider.routes[("GET", "/me")] = me
+    with auth.server.test_request_context():
+        _login()
+        response = auth.api_client(base_url=provider.url).get("/me")
+        assert response.status_code == 200
+        assert auth.get_token() == "access_token_1"
+    assert seen == ["Bearer access_token_0", "Bearer access_token_1"]
+
+
+def test_cache_serves_repeated_requests(provider, auth):
+    seen = _me_route(provider, {"Cache-Control": "max-age=60"})
+    cache = ResponseCache()
+    with auth.server.test_request_context():
+        _login()
+        client = auth.api_client(base_url=provider.url, cache=cache)
+        for _ in range(3):
+            assert client.get("/me").json() == {"id": "user-1"}
+    assert len(seen) == 1
+
+
+def test_cache_is_per_user(provider, auth):
+    seen = _me_route(provider, {"Cache-Control": "max-age=60"})
+    cache = ResponseCache()
+    for user in ("user-1", "user-2"):
+        with auth.server.test_request_context():
+            _login(user=user)
+            auth.api_client(base_url=provider.url, cache=cache).get("/me")
+    assert len(seen) == 2
+
+
+def test_cache_without_identity_survives_refresh(provider, auth):
+    seen = _me_route(provider, {"Cache-Control": "max-age=60"})
+    cache = ResponseCache()
+    with auth.server.test_request_context():
+        _login(user=None)
+        client = auth.api_client(base_url=provider.url, cache=cache)
+        client.get("/me")
+        auth.refresh_now(auth.get_token_data())
+        assert auth.get_token() == "access_token_1"
+        client.get("/me")
+    assert len(seen) == 1
+
+
+def test_no_store_not_cached(provider, auth):
+    seen = _me_route(provider, {"Cache-Control": "no-store"})
+    with auth.server.test_request_context():
+        _login()
+        client = auth.api_client(base_url=provider.url, cache=ResponseCache())
+        client.get("/me")
+        client.get("/me")
+    assert len(seen) == 2
+
+
+def test_etag_revalidation(provider, auth):
+    seen = _me_route(provider, {"Cache-Control": "no-cache", "ETag": '"v1"'})
+    with auth.server.test_request_context():
+        _login()
+        client = auth.api_client(base_url=provider.url, cache=ResponseCache())
+        first = client.get("/me")
+        second = client.get("/me")
+    assert len(seen) == 2
+    assert second is first
+    assert second.json() == {"id": "user-1"}
+
+
+def test_cache_evicts_least_recently_used(provider, auth):
+    provider.routes[("GET", "/a")] = lambda handler, form: (200, {}, {})
+    provider.routes[("GET", "/b")] = lambda handler, form: (200, {}, {})
+    cache = ResponseCache(maxsize=1)
+    with auth.server.test_request_context():
+        _login()
+        client = auth.api_client(base_url=provider.url, cache=cache)
+        client.get("/a")
+        client.get("/b")
+        client.get("/a")
+    assert provider.calls["/a"] == 2
+
+
+def _slow_items_route(provider):
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def item(handler, form):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.pop()
+        expired = handler.headers.get("Authorization") == "Bearer access_token_0"
+        if expired and handler.path.startswith("/expired"):
+            return 401, {}, {}
+        return 200, {}, {"path": handler.path}
+
+    for i in range(10):
+        provider.routes[("GET", f"/items/{i}")] = item
+        provider.routes[("GET", f"/expired/{i}")] = item
+    return peak
+
+
+def test_fetch_all_runs_concurrently_in_order(provider, auth):
+    peak = _slow_items_route(provider)
+    with auth.server.test_request_context():
+        _login()
+        responses = auth.fetch_all(
+            [f"/items/{i}" for i in range(10)], base_url=provider.url, per_host=3
+        )
+    assert [r.json()["path"] for r in responses] == [f"/items/{i}" for i in range(10)]
+    assert max(peak) == 3
+
+
+def test_fetch_all_refreshes_once_on_401(provider, auth):
+    _slow_items_route(provider)
+    with auth.server.test_request_context():
+        _login()
+        responses = auth.fetch_all(
+            ["/items/0", {"url": "/expired/1"}, {"method": "get", "url": "/expired/2"}],
+            base_url=provider.url,
+        )
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert provider.calls["/token"] == 1
+
+
+def _paged_route(provider, pages=3, link_header=False, next_base=None):
+    def page(handler, form):
+        n = int(handler.path.rsplit("/", 1)[1])
+        body = {"items": [n * 10, n * 10 + 1]}
+        headers = {}
+        if n + 1 < pages:
+            next_url = f"{next_base or provider.url}/pages/{n + 1}"
+            if link_header:
+                headers["Link"] = f'<{next_url}>; rel="next"'
+            else:
+                body["paging"] = {"next": next_url}
+        return 200, headers, body
+
+    for n in range(pages):
+        provider.routes[("GET", f"/pages/{n}")] = page
+
+
+@pytest.mark.parametrize("link_header", [False, True])
+def test_paginate_follows_next_links(provider, auth, link_header):
+    _paged_route(provider, link_header=link_header)
+    with auth.server.test_request_context():
+        _login()
+        items = list(
+            auth.paginate(
+                "/pages/0",
+                base_url=provider.url,
+                next_key="paging.next",
+                items_key="items",
+            )
+        )
+    assert items == [0, 1, 10, 11, 20, 21]
+
+
+def test_paginate_streams_and_stops(provider, auth):
+    _paged_route(provider, pages=5)
+    with auth.server.test_request_context():
+        _login()
+        pages = auth.paginate(
+            "/pages/0", base_url=provider.url, next_key="paging.next", max_pages=2
+        )
+        first = next(pages)
+        assert first["items"] == [0, 1]
+        assert len(list(pages)) == 1
+    assert "/pages/2" not in provider.calls
+
+
+@pytest.mark.parametrize("link_header", [False, True])
+def test_paginate_refuses_next_links_to_another_origin(provider, auth, link_header):
+    # the same stub on another host name, where the token must not go
+    other = provider.url.replace("127.0.0.1", "localhost")
+    _paged_route(provider, link_header=link_header, next_base=other)
+    with auth.server.test_request_context():
+        _login()
+        pages = auth.paginate("/pages/0", base_url=provider.url, next_key="paging.next")
+        assert next(pages)["items"] == [0, 1]
+        with pytest.raises(ValueError):
+            next(pages)
+    assert "/pages/1" not in provider.calls
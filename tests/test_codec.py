@@ -0,0 +1,85 @@
+from dataclasses import asdict
+import pytest
+from dash_auth_external import CompactTokenCodec, DashAuthExternal
+from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
+from dash_auth_external.testing import login
+from dash_auth_external.token import OAuth2Token
+from .test_config import EXERNAL_TOKEN_URL, EXTERNAL_AUTH_URL, CLIENT_ID
+
+RESPONSE = {
+    "access_token": "access_token",
+    "token_type": "Bearer",
+    "expires_in": 3599,
+    "refresh_token": "refresh_token",
+    "scope": "openid email",
+    "id_token": "header.payload.signature",
+    "ext_expires_in": 3599,
+    "not_before_policy": 0,
+}
+
+
+@pytest.fixture()
+def token():
+    return OAuth2Token.from_response(RESPONSE)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip_drops_unlisted_keys(token, compress):
+    codec = CompactTokenCodec(compress=compress)
+    token.claims = {"sub": "123"}
+    decoded = OAuth2Token(**codec.decode(codec.encode(asdict(token))))
+
+    assert decoded.access_token == token.access_token
+    assert decoded.refresh_token == token.refresh_token
+    assert decoded.expires_at == int(token.expires_at)
+    assert decoded.claims == {"sub": "123"}
+    assert decoded.token_data == {
+        k: v
+        for k, v in RESPONSE.items()
+        if k not in ("id_token", "ext_expires_in", "not_before_policy")
+    }
+
+
+def test_fields_not_duplicated(token):
+    encoded = CompactTokenCodec(keep_keys=None).encode(asdict(token))
+    assert str(encoded).count("access_token") == 1
+    assert "ext_expires_in" in str(encoded)
+
+
+def test_compresses_large_payloads():
+    token = OAuth2Token.from_response({**RESPONSE, "id_token": "abc" * 1000})
+    codec = CompactTokenCodec(keep_keys=("id_token",), compress=True)
+    encoded = codec.encode(asdict(token))
+    assert encoded[0] == "z1"
+    assert len(encoded[1]) < 1000
+
+
+def test_reads_old_format(token):
+    assert CompactTokenCodec().decode(asdict(token)) == asdict(token)
+
+
+def test_flow_with_codec(mocker):
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL,
+        EXERNAL_TOKEN_URL,
+        CLIENT_ID,
+        with_pkce=False,
+        session_codec=CompactTokenCodec(),
+    )
+    mocker.patch("dash_auth_external.routes.token_request", return_value=RESPONSE)
+
+    @auth.server.route("/token")
+    def show_token():
+        return auth.get_token()
+
+    with auth.server.test_client() as client:
+        login(client, auth.auth_suffix, auth.redirect_suffix)
+        with client.session_transaction() as session:
+            assert isinstance(session[FLASK_SESSION_TOKEN_KEY], list)
+        assert client.get("/token").data == b"access_token"
+
+        with client.session_transaction() as session:
+            session[FLASK_SESSION_TOKEN_KEY] = asdict(
+                OAuth2Token.from_response(RESPONSE)
+            )
+        assert client.get("/token").data == b"access_token"
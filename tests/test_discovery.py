@@ -0,0 +1,58 @@
+import pytest
+from dash_auth_external import DashAuthExternal, discovery
+from dash_auth_external.discovery import fetch_provider_metadata
+from .test_config import CLIENT_ID
+
+DISCOVERY = "/.well-known/openid-configuration"
+
+
+@pytest.fixture(autouse=True)
+def clear_memory_cache():
+    discovery._memory_cache.clear()
+    yield
+    discovery._memory_cache.clear()
+
+
+def test_from_issuer_wires_endpoints(provider):
+    auth = DashAuthExternal.from_issuer(provider.url, CLIENT_ID, validate_tokens=True)
+    assert auth.external_auth_url == provider.url + "/authorize"
+    assert auth.external_token_url == provider.token_url
+    assert auth.external_userinfo_url == provider.url + "/userinfo"
+    assert auth.external_revocation_url == provider.url + "/revoke"
+    assert auth.token_validator.jwks.jwks_url == provider.jwks_url
+    assert auth.token_validator.issuer == provider.url
+
+
+def test_memory_cache(provider):
+    for _ in range(3):
+        fetch_provider_metadata(provider.url)
+    assert provider.calls[DISCOVERY] == 1
+
+
+def test_disk_cache_shared_between_workers(provider, tmp_path):
+    fetch_provider_metadata(provider.url, cache_dir=str(tmp_path))
+    discovery._memory_cache.clear()
+    metadata = fetch_provider_metadata(provider.url, cache_dir=str(tmp_path))
+    assert metadata["token_endpoint"] == provider.token_url
+    assert provider.calls[DISCOVERY] == 1
+
+
+def test_stale_disk_copy_used_when_provider_down(provider, tmp_path):
+    fetch_provider_metadata(provider.url, cache_dir=str(tmp_path))
+    discovery._memory_cache.clear()
+    provider.routes[("GET", DISCOVERY)] = lambda handler, form: (503, {}, {})
+    metadata = fetch_provider_metadata(provider.url, cache_dir=str(tmp_path), ttl=-1)
+    assert metadata["token_endpoint"] == provider.token_url
+
+
+def test_provider_down_without_cache_raises(provider):
+    provider.routes[("GET", DISCOVERY)] = lambda handler, form: (500, {}, {})
+    with pytest.raises(Exception):
+        fetch_provider_metadata(provider.url)
+
+
+def test_issuer_mismatch_rejected(provider):
+    metadata = {**provider.metadata, "issuer": "https://attacker.example.com"}
+    provider.routes[("GET", DISCOVERY)] = lambda handler, form: (200, {}, metadata)
+    with pytest.raises(ValueError):
+        fetch_provider_metadata(provider.url)
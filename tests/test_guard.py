@@ -0,0 +1,92 @@
+import time
+from dataclasses import asdict
+import pytest
+from dash import Dash, Input, Output, html
+from dash_auth_external import CompactTokenCodec, DashAuthExternal, RouteGuard
+from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
+from dash_auth_external.guard import is_authenticated
+from dash_auth_external.testing import login
+from dash_auth_external.token import OAuth2Token
+from .test_config import EXERNAL_TOKEN_URL, EXTERNAL_AUTH_URL, CLIENT_ID
+
+UPDATE = {
+    "output": "out.children",
+    "outputs": {"id": "out", "property": "children"},
+    "inputs": [{"id": "in", "property": "children", "value": "x"}],
+    "changedPropIds": ["in.children"],
+}
+
+
+@pytest.fixture()
+def auth():
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL,
+        EXERNAL_TOKEN_URL,
+        CLIENT_ID,
+        with_pkce=False,
+        logout_suffix="/logout",
+        route_guard=RouteGuard(public_dash_endpoints=["_dash-layout"]),
+    )
+    app = Dash(__name__, server=auth.server, url_base_pathname="/home/")
+    app.layout = html.Div([html.Div(id="in"), html.Div(id="out")])
+
+    @app.callback(Output("out", "children"), Input("in", "children"))
+    def echo(value):
+        return value
+
+    return auth
+
+
+def _token(**kwargs):
+    return asdict(OAuth2Token(**{"access_token": "a", "expires_in": 3600, **kwargs}))
+
+
+def test_unauthenticated_requests_rejected(auth):
+    with auth.server.test_client() as client:
+        response = client.get("/home/")
+        assert response.status_code == 302
+        assert response.location == "/"
+        response = client.post("/home/_dash-update-component", json=UPDATE)
+        assert response.status_code == 401
+        assert client.get("/home/_dash-dependencies").status_code == 401
+        assert client.get("/home/_dash-layout").status_code == 200
+        assert client.get("/assets/missing.css").status_code == 404
+        assert client.post("/logout").status_code == 302
+
+
+def test_login_routes_stay_public(auth, mocker):
+    mocker.patch(
+        "dash_auth_external.routes.token_request", return_value={"access_token": "a"}
+    )
+    auth.add_provider("slack", "https://slack/authorize", "TOKEN", "slack_client")
+    with auth.server.test_client() as client:
+        assert client.get("/").location.startswith(EXTERNAL_AUTH_URL)
+        assert client.get("/login/slack").location.startswith("https://slack")
+        login(client, auth.auth_suffix, auth.redirect_suffix)
+        assert client.get("/home/").status_code == 200
+        response = client.post("/home/_dash-update-component", json=UPDATE)
+        assert response.status_code == 200
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (None, False),
+        (_token(), True),
+        (_token(expires_in=-1), False),
+        (_token(expires_in=-1, refresh_token="r"), True),
+        (CompactTokenCodec().encode(_token(expires_in=-1)), False),
+        (CompactTokenCodec().encode(_token(expires_in=-1, refresh_token="r")), True),
+        (CompactTokenCodec().encode(_token()), True),
+        ({"sid": "opaque"}, True),
+    ],
+)
+def test_is_authenticated(value, expected):
+    assert is_authenticated(value) is expected
+
+
+def test_expired_session_redirected(auth):
+    with auth.server.test_client() as client:
+        with client.session_transaction() as session:
+            session[FLASK_SESSION_TOKEN_KEY] = _token(expires_at=time.time() - 1)
+        assert client.get("/home/").status_code == 302
@@ -0,0 +1,164 @@
+import contextlib
+import logging
+import pytest
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.exceptions import TokenExpiredError
+from dash_auth_external.hooks import (
+    Hook,
+    LoggingHook,
+    OpenTelemetryHook,
+    PrometheusHook,
+)
+from dash_auth_external.testing import login
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+class RecordingHook(Hook):
+    def __init__(self):
+        self.counts = []
+        self.observations = []
+        self.spans = []
+
+    def count(self, name, value, attrs):
+        self.counts.append(name)
+
+    def observe(self, name, value, attrs):
+        self.observations.append((name, value))
+
+    def end_span(self, handle, name, duration, error, attrs):
+        self.spans.append((name, error))
+
+
+class FakeSpan:
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.ended = False
+        self.exceptions = []
+
+    def record_exception(self, e):
+        self.exceptions.append(e)
+
+    def set_status(self, status):
+        pass
+
+    def end(self):
+        self.ended = True
+
+
+class FakeTracer:
+    def __init__(self):
+        self.spans = []
+        self.current = []
+
+    @contextlib.contextmanager
+    def start_as_current_span(self, name, attributes=None, end_on_exit=True, **kwargs):
+        span = FakeSpan(name, self.current[-1] if self.current else None)
+        self.spans.append(span)
+        self.current.append(span)
+        try:
+            yield span
+        finally:
+            self.current.pop()
+
+
+@pytest.fixture()
+def provider(provider):
+    provider.expires_in = -1
+    return provider
+
+
+def _login(auth, provider):
+    client = auth.server.test_client()
+    login(client, auth.auth_suffix, auth.redirect_suffix)
+    # the login token is issued expired, the refreshed one is valid
+    provider.expires_in = 3600
+    return client
+
+
+@pytest.fixture()
+def auth(make_auth):
+    auth = make_auth()
+
+    @auth.server.route("/token")
+    def show_token():
+        auth.get_token()
+        return auth.get_token()
+
+    return auth
+
+
+def test_flow_reports_spans_and_counters(provider, auth):
+    hook = auth.add_hook(RecordingHook())
+    client = _login(auth, provider)
+    client.get("/token")
+
+    span_names = [name for name, _ in hook.spans]
+    assert span_names.count("token_request") == 2
+    assert "code_exchange" in span_names
+    assert "refresh" in span_names
+    assert span_names.count("get_token_data") == 2
+    assert hook.counts == ["login", "refresh", "token_cache_hit"]
+    assert hook.observations[0][0] == "session_payload_bytes"
+
+
+def test_expired_error_counted(mocker):
+    auth = DashAuthExternal(EXTERNAL_AUTH_URL, "TOKEN_URL", CLIENT_ID)
+    hook = auth.add_hook(RecordingHook())
+    mocker.patch(
+        "dash_auth_external.auth._get_token_data_from_session",
+        return_value={"access_token": "a", "expires_in": -1},
+    )
+    with pytest.raises(TokenExpiredError):
+        auth.get_token()
+    assert hook.counts == ["token_expired_error"]
+    assert hook.spans[0][0] == "get_token_data"
+    assert isinstance(hook.spans[0][1], TokenExpiredError)
+
+
+def test_prometheus_exposition(provider, auth):
+    hook = auth.add_hook(PrometheusHook())
+    hook.register_route(auth.server)
+    client = _login(auth, provider)
+    client.get("/token")
+    text = client.get("/metrics").data.decode()
+    assert "dash_auth_external_refresh_total 1" in text
+    assert "dash_auth_external_token_request_seconds_count 2" in text
+    assert 'dash_auth_external_session_payload_bytes_bucket{le="+Inf"} 1' in text
+
+
+def test_prometheus_failures():
+    hook = PrometheusHook()
+    hook.end_span(None, "refresh", 0.2, RuntimeError(), {})
+    hook.end_span(None, "refresh", 0.001, None, {})
+    text = hook.expose()
+    assert "dash_auth_external_refresh_failures_total 1" in text
+    assert 'dash_auth_external_refresh_seconds_bucket{le="0.005"} 1' in text
+    assert 'dash_auth_external_refresh_seconds_bucket{le="0.25"} 2' in text
+
+
+def test_opentelemetry_spans(provider, auth):
+    tracer = FakeTracer()
+    auth.add_hook(OpenTelemetryHook(tracer))
+    client = _login(auth, provider)
+    client.get("/token")
+    code_exchange, token_request, get_token_data, refresh, refresh_request, _ = (
+        tracer.spans
+    )
+    assert code_exchange.name == "dash_auth_external.code_exchange"
+    assert code_exchange.parent is None
+    assert token_request.name == "dash_auth_external.token_request"
+    assert token_request.parent is code_exchange
+    assert get_token_data.parent is None
+    assert refresh.parent is get_token_data
+    assert refresh_request.name == "dash_auth_external.token_request"
+    assert refresh_request.parent is refresh
+    assert all(span.ended for span in tracer.spans)
+    assert tracer.current == []
+
+
+def test_logging_hook(provider, caplog, auth):
+    auth.add_hook(LoggingHook())
+    with caplog.at_level(logging.DEBUG, logger="dash_auth_external.hooks"):
+        _login(auth, provider)
+    assert "code_exchange took" in caplog.text
@@ -0,0 +1,56 @@
+import subprocess
+import sys
+import pytest
+from benchmarks.bench_import import measure
+
+# generous, both take around 15-25ms
+IMPORT_BUDGET_US = 50_000
+
+
+@pytest.mark.parametrize(
+    "statement, baseline",
+    [
+        # DashAuthExternal builds a Flask app, only what it adds to Flask is budgeted
+        ("from dash_auth_external import DashAuthExternal", "import flask"),
+        ("from dash_auth_external import SQLiteTokenStore, ClientCredentials", "pass"),
+    ],
+)
+def test_import_within_budget(statement, baseline):
+    import_us = min(measure(statement, baseline)[0] for _ in range(3))
+    assert import_us < IMPORT_BUDGET_US
+
+
+@pytest.mark.parametrize(
+    "statement, allowed",
+    [
+        ("import dash_auth_external", []),
+        ("from dash_auth_external import SQLiteTokenStore, ClientCredentials", []),
+        ("from dash_auth_external import DashAuthExternal", ["flask"]),
+    ],
+)
+def test_heavy_dependencies_load_lazily(statement, allowed):
+    assert measure(statement)[1] == allowed
+
+
+def test_requests_loaded_on_first_token_request():
+    code = "\n".join(
+        [
+            "import sys",
+            "from dash_auth_external import DashAuthExternal",
+            "auth = DashAuthExternal('https://a/auth', 'https://a/token', 'id')",
+            "assert 'requests' not in sys.modules",
+            "assert 'asyncio' not in sys.modules",
+            "auth.transport.session",
+            "assert 'requests' in sys.modules",
+        ]
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_lazy_exports():
+    import dash_auth_external
+
+    assert "DashAuthExternal" in dir(dash_auth_external)
+    assert dash_auth_external.Transport.__module__ == "dash_auth_external.transport"
+    with pytest.raises(AttributeError):
+        dash_auth_external.Missing
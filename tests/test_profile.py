@@ -0,0 +1,86 @@
+import time
+import pytest
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.hooks import PrometheusHook
+from dash_auth_external.testing import login
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+@pytest.fixture()
+def provider(provider):
+    def slow(handler, form):
+        time.sleep(0.3)
+        return 200, {}, {"orgs": ["plotly"]}
+
+    provider.routes[("GET", "/orgs")] = slow
+    provider.routes[("GET", "/broken")] = lambda handler, form: (500, {}, {})
+    return provider
+
+
+@pytest.fixture()
+def auth(make_auth, provider):
+    auth = make_auth(
+        external_userinfo_url=provider.url + "/userinfo",
+        external_revocation_url=provider.url + "/revoke",
+        logout_suffix="/logout",
+    )
+
+    @auth.server.route("/profile")
+    def show_profile():
+        return auth.get_profile()
+
+    return auth
+
+
+def test_profile_fetched_while_redirecting(provider, auth):
+    hook = auth.add_hook(PrometheusHook())
+    auth.fetch_profile_on_login({"orgs": provider.url + "/orgs"})
+
+    with auth.server.test_client() as client:
+        start = time.monotonic()
+        assert login(client, auth.auth_suffix, auth.redirect_suffix).status_code == 302
+        assert time.monotonic() - start < 0.3
+
+        assert client.get("/profile").json == {
+            "userinfo": {"sub": "user", "access_token": "access_token_1"},
+            "orgs": {"orgs": ["plotly"]},
+        }
+        client.get("/profile")
+    assert provider.calls["/userinfo"] == 1
+    assert provider.calls["/orgs"] == 1
+    assert "dash_auth_external_profile_cache_hit_total 2" in hook.expose()
+
+
+def test_profile_fetched_on_miss_and_failures_left_out(provider, auth):
+
+    with auth.server.test_client() as client:
+        login(client, auth.auth_suffix, auth.redirect_suffix)
+        auth.fetch_profile_on_login({"broken": provider.url + "/broken"})
+        assert client.get("/profile").json == {
+            "userinfo": {"sub": "user", "access_token": "access_token_1"}
+        }
+        client.get("/profile")
+    assert provider.calls["/userinfo"] == 1
+
+
+def test_logout_forgets_profile(provider, auth):
+    fetcher = auth.fetch_profile_on_login()
+
+    with auth.server.test_client() as client:
+        login(client, auth.auth_suffix, auth.redirect_suffix)
+        with client.session_transaction() as session:
+            profile_id = session["profile"]
+        client.get("/profile")
+        client.post("/logout")
+        with client.session_transaction() as session:
+            assert "profile" not in session
+    assert fetcher.store.get("profile:" + profile_id) is None
+
+
+def test_requires_an_endpoint():
+    auth = DashAuthExternal(EXTERNAL_AUTH_URL, "TOKEN", CLIENT_ID)
+    with pytest.raises(ValueError):
+        auth.fetch_profile_on_login()
+    with auth.server.test_request_context():
+        with pytest.raises(ValueError):
+            auth.get_profile()
@@ -0,0 +1,79 @@
+import pytest
+from dash_auth_external import DashAuthExternal, MemoryTokenStore
+from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
+from dash_auth_external.testing import StubProvider, login
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+@pytest.fixture()
+def providers():
+    with StubProvider() as github, StubProvider() as slack:
+        yield github, slack
+
+
+def _make_auth(github, slack, **kwargs):
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL, github.token_url, CLIENT_ID, with_pkce=False, **kwargs
+    )
+    auth.add_provider(
+        "slack", slack.url + "/authorize", slack.token_url, "slack_client"
+    )
+
+    @auth.server.route("/tokens")
+    def show_tokens():
+        return f"{auth.get_token()} {auth.get_token(provider='slack')}"
+
+    return auth
+
+
+@pytest.mark.parametrize("with_store", [False, True])
+def test_tokens_kept_per_provider(providers, with_store):
+    github, slack = providers
+    slack.issued = 100
+    auth = _make_auth(
+        github, slack, token_store=MemoryTokenStore() if with_store else None
+    )
+
+    with auth.server.test_client() as client:
+        response = client.get("/login/slack")
+        assert response.location.startswith(slack.url + "/authorize")
+        with client.session_transaction() as session:
+            assert "cv:slack" in session
+
+        login(client, auth.auth_suffix, auth.redirect_suffix)
+        login(client, "/login/slack", "/redirect/slack")
+        with client.session_transaction() as session:
+            assert FLASK_SESSION_TOKEN_KEY in session
+            assert FLASK_SESSION_TOKEN_KEY + ":slack" in session
+
+        assert client.get("/tokens").data == b"access_token_1 access_token_101"
+    assert github.calls["/token"] == 1
+    assert slack.calls["/token"] == 1
+
+
+def test_refresh_uses_the_provider_token_url(providers):
+    github, slack = providers
+    slack.expires_in = -1
+    auth = _make_auth(github, slack)
+
+    @auth.server.route("/slack")
+    def show_slack_token():
+        return auth.get_token(provider="slack")
+
+    with auth.server.test_client() as client:
+        login(client, "/login/slack", "/redirect/slack")
+        slack.expires_in = 3600
+        assert client.get("/slack").data == b"access_token_2"
+    assert slack.calls["/token"] == 2
+    assert github.calls.get("/token", 0) == 0
+
+
+def test_unknown_or_duplicate_provider_raises(providers):
+    github, slack = providers
+    auth = _make_auth(github, slack)
+
+    with pytest.raises(ValueError):
+        auth.add_provider("slack", "AUTH", "TOKEN", "client")
+    with auth.server.test_request_context():
+        with pytest.raises(ValueError):
+            auth.get_token(provider="gitlab")
@@ -0,0 +1,167 @@
+import email.utils
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import requests
+from dash_auth_external import DashAuthExternal, Transport
+from dash_auth_external.exceptions import RateLimitError
+from dash_auth_external.ratelimit import (
+    TokenBucket,
+    TokenRequestLimiter,
+    parse_retry_after,
+)
+from dash_auth_external.routes import token_request
+from dash_auth_external.testing import StubProvider
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+class _Response:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {} if retry_after is None else {"Retry-After": retry_after}
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 < parse_retry_after(date) <= 30
+
+
+def test_bucket_queue_is_bounded():
+    bucket = TokenBucket(rate=1, burst=1, max_queue=0)
+    with pytest.raises(RateLimitError):
+        bucket.acquire()
+
+    bucket = TokenBucket(rate=1, burst=1, timeout=0.05)
+    bucket.acquire()
+    with pytest.raises(RateLimitError):
+        bucket.acquire()
+
+
+def test_bucket_spaces_out_calls():
+    bucket = TokenBucket(rate=50, burst=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_identical_requests_coalesced():
+    limiter = TokenRequestLimiter()
+    release = threading.Event()
+    calls = []
+
+    def send():
+        calls.append(1)
+        release.wait(5)
+        return _Response(200)
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [
+            pool.submit(limiter.request, "url", {"code": "c"}, send) for _ in range(8)
+        ]
+        time.sleep(0.05)
+        release.set()
+        assert len({id(f.result()) for f in futures}) == 1
+    assert len(calls) == 1
+
+
+def test_retries_after_retry_after(mocker):
+    limiter = TokenRequestLimiter(backoff=0.01)
+    pause = mocker.spy(limiter.bucket, "pause")
+    responses = iter([_Response(429, "0"), _Response(429), _Response(200)])
+
+    assert limiter.request("url", {}, lambda: next(responses)).status_code == 200
+    assert 0 <= pause.call_args_list[0].args[0] <= 0.01
+    assert 0.02 <= pause.call_args_list[1].args[0] <= 0.03
+
+
+def test_gives_up_after_max_retries():
+    limiter = TokenRequestLimiter(max_retries=1, backoff=0.01)
+    calls = []
+
+    def send():
+        calls.append(1)
+        return _Response(429, "0")
+
+    assert limiter.request("url", {}, send).status_code == 429
+    assert len(calls) == 2
+
+
+def _burst(provider, limiter, n=20):
+    transport = Transport(pool_maxsize=n)
+
+    def refresh(i):
+        body = {"grant_type": "refresh_token", "refresh_token": f"r{i}"}
+        return token_request(
+            provider.token_url, body, {}, transport=transport, limiter=limiter
+        )
+
+    with ThreadPoolExecutor(n) as pool:
+        futures = [pool.submit(refresh, i) for i in range(n)]
+    return [f.exception() or f.result() for f in futures]
+
+
+@pytest.fixture()
+def provider():
+    with StubProvider(rate_limit=20, rate_burst=10) as provider:
+        yield provider
+
+
+def test_burst_without_limiter_fails(provider):
+    results = _burst(provider, None)
+    assert any(isinstance(r, requests.HTTPError) for r in results)
+    assert provider.throttled > 0
+
+
+def test_burst_smoothed_by_limiter(provider):
+    results = _burst(provider, TokenRequestLimiter(rate=18, burst=10))
+    assert all(isinstance(r, dict) for r in results)
+    assert provider.issued == 20
+
+
+def test_burst_recovers_from_429s(provider):
+    start = time.monotonic()
+    results = _burst(provider, TokenRequestLimiter(rate=200, burst=20, backoff=0.1))
+    assert all(isinstance(r, dict) for r in results)
+    assert provider.throttled > 0
+    assert provider.issued == 20
+    assert time.monotonic() - start >= 1
+
+
+def test_transport_leaves_429s_to_limiter(provider):
+    provider.routes[("POST", "/token")] = lambda handler, form: (
+        429,
+        {"Retry-After": "30"},
+        {},
+    )
+    limiter = TokenRequestLimiter(max_retries=2, backoff=0.01, max_backoff=0.05)
+    start = time.monotonic()
+    with pytest.raises(requests.HTTPError):
+        token_request(provider.token_url, {}, {}, Transport(), limiter=limiter)
+    assert time.monotonic() - start < 1
+    assert provider.calls["/token"] == 3
+
+
+def test_refreshes_and_service_tokens_go_through_limiter(provider, mocker):
+    limiter = TokenRequestLimiter()
+    spy = mocker.spy(limiter, "request")
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL,
+        provider.token_url,
+        CLIENT_ID,
+        client_secret="secret",
+        rate_limiter=limiter,
+    )
+    mocker.patch(
+        "dash_auth_external.auth._get_token_data_from_session",
+        return_value={"access_token": "a", "refresh_token": "r", "expires_in": -1},
+    )
+    mocker.patch("dash_auth_external.auth._set_token_data_in_session")
+
+    assert auth.get_token() == "access_token_1"
+    assert auth.get_service_token() == "access_token_2"
+    assert spy.call_count == 2
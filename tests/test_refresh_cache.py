@@ -0,0 +1,36 @@
+from dash_auth_external import DashAuthExternal, MemoryTokenStore, SQLiteTokenStore
+from dash_auth_external.hooks import PrometheusHook
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+def test_refresh_seen_by_other_workers(provider, expired_session, tmp_path):
+    path = str(tmp_path / "refresh.db")
+    workers = [
+        DashAuthExternal(
+            EXTERNAL_AUTH_URL,
+            provider.token_url,
+            CLIENT_ID,
+            refresh_cache=SQLiteTokenStore(path),
+        )
+        for _ in range(3)
+    ]
+    hook = workers[2].add_hook(PrometheusHook())
+
+    tokens = [auth.get_token() for auth in workers]
+
+    assert tokens == ["access_token_1"] * 3
+    assert provider.calls["/token"] == 1
+    assert "dash_auth_external_refresh_cache_hit_total 1" in hook.expose()
+
+
+def test_refresh_cache_entry_expires(provider, expired_session):
+    cache = MemoryTokenStore()
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL, provider.token_url, CLIENT_ID, refresh_cache=cache
+    )
+
+    assert auth.get_token() == "access_token_1"
+    key = auth._provider().refresh_cache_key("refresh_token")
+    cache.set(key, cache.get(key), ttl=-1)
+    assert auth.get_token() == "access_token_2"
+    assert provider.calls["/token"] == 2
@@ -0,0 +1,92 @@
+import functools
+import pytest
+from dash_auth_external import DashAuthExternal, MemoryTokenStore, SQLiteTokenStore
+from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
+from dash_auth_external.testing import login
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+@pytest.fixture()
+def make_auth(make_auth, provider):
+    return functools.partial(
+        make_auth,
+        external_revocation_url=provider.url + "/revoke",
+        logout_suffix="/logout",
+    )
+
+
+def _login(client, auth, name=None):
+    if name is None:
+        login(client, auth.auth_suffix, auth.redirect_suffix)
+    else:
+        login(client, f"/login/{name}", f"/redirect/{name}")
+
+
+@pytest.mark.parametrize("with_store", [False, True])
+def test_logout_revokes_and_clears_session(provider, with_store, make_auth):
+    store = MemoryTokenStore() if with_store else None
+    auth = make_auth(token_store=store)
+
+    with auth.server.test_client() as client:
+        _login(client, auth)
+        with client.session_transaction() as session:
+            sid = session[FLASK_SESSION_TOKEN_KEY].get("sid")
+
+        response = client.post("/logout")
+        assert response.status_code == 302
+        assert response.location.endswith(auth.auth_suffix)
+        with client.session_transaction() as session:
+            assert FLASK_SESSION_TOKEN_KEY not in session
+
+    assert provider.revoked == ["refresh_token_1", "access_token_1"]
+    if with_store:
+        assert store.get(sid) is None
+
+
+def test_logout_is_opt_in_and_post_only(provider, make_auth):
+    with make_auth().server.test_client() as client:
+        assert client.get("/logout").status_code == 405
+    auth = DashAuthExternal(EXTERNAL_AUTH_URL, provider.token_url, CLIENT_ID)
+    with auth.server.test_client() as client:
+        assert client.post("/logout").status_code == 404
+
+
+def test_logout_clears_session_when_revocation_fails(provider, make_auth):
+    provider.routes[("POST", "/revoke")] = lambda handler, form: (503, {}, {})
+    auth = make_auth()
+
+    with auth.server.test_client() as client:
+        _login(client, auth)
+        assert client.post("/logout").status_code == 302
+        with client.session_transaction() as session:
+            assert FLASK_SESSION_TOKEN_KEY not in session
+
+
+def test_revoke_all_filters_by_provider_and_predicate(provider, tmp_path, make_auth):
+    store = SQLiteTokenStore(str(tmp_path / "tokens.db"))
+    auth = make_auth(token_store=store)
+    auth.add_provider(
+        "slack",
+        EXTERNAL_AUTH_URL,
+        provider.token_url,
+        "slack_client",
+        with_pkce=False,
+        external_revocation_url=provider.url + "/revoke",
+    )
+    for _ in range(25):
+        with auth.server.test_client() as client:
+            _login(client, auth)
+            _login(client, auth, "slack")
+    store.set("state:abc", {"cv": "v"}, ttl=60)
+
+    keep = "access_token_3"
+    result = auth.revoke_all(
+        where=lambda token: token.access_token != keep, batch_size=7, max_workers=4
+    )
+
+    assert result == {"revoked": 24, "failed": 0}
+    assert len(provider.revoked) == 48
+    remaining = [key for batch in store.scan() for key, _ in batch]
+    assert len(remaining) == 27
+    assert sum(key.startswith("slack:") for key in remaining) == 25
+    assert "state:abc" in remaining
@@ -0,0 +1,44 @@
+import base64
+import hashlib
+import re
+import pytest
+from requests_oauthlib import OAuth2Session
+from dash_auth_external.routes import AuthorizeUrlBuilder, make_code_challenge
+
+
+@pytest.mark.parametrize(
+    "auth_url, scope, params",
+    [
+        ("https://example.com/authorize", None, {}),
+        ("https://example.com/authorize", "openid email", {}),
+        ("https://example.com/authorize", ["user-read", "playlist"], {}),
+        (
+            "https://example.com/oauth2/v2.0/authorize?tenant=a b&x=",
+            "openid",
+            {"prompt": "consent", "access_type": "offline", "empty": "", "n": 1},
+        ),
+        ("https://example.com/authorize#frag", "é/ü", {"login_hint": "a+b@c.d"}),
+    ],
+)
+@pytest.mark.parametrize("with_pkce", [True, False])
+def test_url_matches_oauth2_session(auth_url, scope, params, with_pkce):
+    redirect_uri = "http://127.0.0.1:8050/redirect?x=1"
+    builder = AuthorizeUrlBuilder(
+        auth_url, "client id", redirect_uri, scope=scope, auth_request_params=params
+    )
+    kwargs = {}
+    if with_pkce:
+        kwargs = {"code_challenge": "challenge", "code_challenge_method": "S256"}
+    expected, _ = OAuth2Session(
+        "client id", redirect_uri=redirect_uri, scope=scope
+    ).authorization_url(auth_url, state="st-at_e", **kwargs, **params)
+
+    assert builder.build("st-at_e", "challenge" if with_pkce else None) == expected
+
+
+def test_code_challenge_is_rfc7636_s256():
+    challenge, verifier = make_code_challenge()
+    assert re.fullmatch(r"[A-Za-z0-9\-._~]{43,128}", verifier)
+    digest = hashlib.sha256(verifier.encode("ascii")).digest()
+    assert challenge == base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+    assert make_code_challenge()[1] != verifier
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+import pytest
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
+from dash_auth_external.scheduler import RefreshScheduler
+from dash_auth_external.store import MemoryTokenStore
+from dash_auth_external.testing import StubProvider, login
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_scheduler_refreshes_in_expiry_order():
+    refreshed = []
+    done = threading.Event()
+
+    def refresh(key):
+        refreshed.append(key)
+        if len(refreshed) == 3:
+            done.set()
+
+    scheduler = RefreshScheduler(refresh, skew=0).start()
+    now = time.time()
+    scheduler.schedule("c", now + 0.15)
+    scheduler.schedule("a", now + 0.05)
+    scheduler.schedule("b", now + 0.1)
+    assert done.wait(2)
+    scheduler.stop()
+    assert refreshed == ["a", "b", "c"]
+
+
+def test_rescheduling_replaces_entry():
+    refreshed = []
+    scheduler = RefreshScheduler(refreshed.append, skew=0).start()
+    scheduler.schedule("a", time.time() + 0.05)
+    scheduler.schedule("a", time.time() + 60)
+    time.sleep(0.15)
+    scheduler.stop()
+    assert refreshed == []
+
+
+def test_idle_keys_are_dropped():
+    refreshed = []
+    scheduler = RefreshScheduler(refreshed.append, skew=0, max_idle=-1).start()
+    scheduler.schedule("a", time.time())
+    time.sleep(0.05)
+    scheduler.stop()
+    assert refreshed == []
+    assert len(scheduler) == 0
+
+
+@pytest.mark.parametrize("result", [None, 0.0, RuntimeError("provider down")])
+def test_keys_not_rescheduled_are_forgotten(result):
+    def refresh(key):
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    scheduler = RefreshScheduler(refresh, skew=0).start()
+    scheduler.schedule("a", time.time())
+    assert _wait_for(lambda: not scheduler._last_seen)
+    scheduler.stop()
+    assert len(scheduler) == 0
+
+
+def test_refresh_ahead_requires_store():
+    with pytest.raises(ValueError):
+        DashAuthExternal(EXTERNAL_AUTH_URL, "TOKEN_URL", CLIENT_ID, refresh_ahead=30)
+
+
+def test_token_refreshed_before_expiry(mocker):
+    store = MemoryTokenStore()
+    with StubProvider(expires_in=2) as provider:
+        auth = DashAuthExternal(
+            EXTERNAL_AUTH_URL,
+            provider.token_url,
+            CLIENT_ID,
+            with_pkce=False,
+            token_store=store,
+            refresh_ahead=1.8,
+        )
+
+        @auth.server.route("/token")
+        def show_token():
+            return auth.get_token()
+
+        with auth.server.test_client() as client:
+            login(client, auth.auth_suffix, auth.redirect_suffix)
+            with client.session_transaction() as session:
+                sid = session[FLASK_SESSION_TOKEN_KEY]["sid"]
+            assert store.get(sid)["access_token"] == "access_token_1"
+
+            assert _wait_for(lambda: store.get(sid)["access_token"] == "access_token_2")
+            calls = provider.calls["/token"]
+            assert client.get("/token").data == b"access_token_2"
+            assert provider.calls["/token"] == calls
+        auth._scheduler.stop()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_background_threads_start_in_serving_process():
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL,
+        "TOKEN_URL",
+        CLIENT_ID,
+        token_store=MemoryTokenStore(),
+        refresh_ahead=30,
+        state_store=MemoryTokenStore(),
+    )
+    workers = (auth._scheduler, auth._state_sweeper)
+    # like in the master of `gunicorn --preload`, which serves no requests
+    assert all(worker._thread is None for worker in workers)
+
+    auth.server.test_client().get("/")
+    assert all(worker._thread.is_alive() for worker in workers)
+
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            # the parent's threads do not survive the fork
+            if not any(worker._thread.is_alive() for worker in workers):
+                auth.server.test_client().get("/")
+                status = 0 if all(w._thread.is_alive() for w in workers) else 2
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    for worker in workers:
+        worker.stop()
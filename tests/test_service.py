@@ -0,0 +1,62 @@
+import threading
+import time
+import pytest
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.service import ClientCredentials
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID, CLIENT_SECRET
+
+
+@pytest.fixture()
+def provider(provider):
+    provider.delay = 0.1
+    provider.forms = []
+    token_endpoint = provider.token_endpoint
+
+    def recording(handler, form):
+        provider.forms.append(form)
+        return token_endpoint(handler, form)
+
+    provider.routes[("POST", "/token")] = recording
+    return provider
+
+
+def test_service_token_shared_across_threads(provider):
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL, provider.token_url, CLIENT_ID, client_secret=CLIENT_SECRET
+    )
+    barrier = threading.Barrier(10)
+    results = []
+
+    def call():
+        barrier.wait()
+        results.append(auth.get_service_token(scope="read"))
+
+    threads = [threading.Thread(target=call) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == ["access_token_1"] * 10
+    assert auth.get_service_token(scope="read") == "access_token_1"
+    assert auth.get_service_token(scope="write", audience="api") == "access_token_2"
+    assert provider.calls["/token"] == 2
+    assert provider.forms[1] == {
+        "grant_type": "client_credentials",
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+        "scope": "write",
+        "audience": "api",
+    }
+
+
+def test_service_token_replaced_before_expiry(provider):
+    provider.expires_in = 1
+    client = ClientCredentials(provider.token_url, CLIENT_ID, skew=60)
+
+    assert client.get_token() == "access_token_1"
+    assert client.get_token() == "access_token_1"
+    time.sleep(0.6)
+    token = client.get_token_data()
+    assert token.access_token == "access_token_2"
+    assert not token.is_expired()
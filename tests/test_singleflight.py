@@ -0,0 +1,125 @@
+import threading
+import pytest
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.singleflight import FileLockBackend, SingleFlight
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+N_THREADS = 20
+
+
+@pytest.fixture()
+def provider(provider):
+    provider.delay = 0.2
+    return provider
+
+
+def _run_concurrently(fn, n=N_THREADS):
+    barrier = threading.Barrier(n)
+    results, errors = [], []
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_concurrent_refreshes_hit_provider_once(provider, expired_session):
+    auth = DashAuthExternal(EXTERNAL_AUTH_URL, provider.token_url, CLIENT_ID)
+
+    results, errors = _run_concurrently(auth.get_token)
+
+    assert not errors
+    assert provider.calls["/token"] == 1
+    assert results == ["access_token_1"] * N_THREADS
+
+
+def test_followers_receive_leader_error():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait()
+        raise RuntimeError("provider down")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("key", failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)
+    follower.start()
+    release.set()
+    leader.join()
+    follower.join()
+    assert len(errors) == 2
+
+
+def test_file_lock_shares_result_across_instances(tmp_path, provider, expired_session):
+    workers = [
+        DashAuthExternal(
+            EXTERNAL_AUTH_URL,
+            provider.token_url,
+            CLIENT_ID,
+            refresh_lock_dir=str(tmp_path),
+        )
+        for _ in range(4)
+    ]
+
+    counter = iter(range(N_THREADS))
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            auth = workers[next(counter) % len(workers)]
+        return auth.get_token_data()
+
+    results, errors = _run_concurrently(call)
+
+    assert not errors
+    assert provider.calls["/token"] == 1
+    assert {token.access_token for token in results} == {"access_token_1"}
+
+
+def test_file_lock_result_expires(tmp_path):
+    backend = FileLockBackend(str(tmp_path), result_ttl=-1)
+    flight = SingleFlight(process_lock=backend)
+    assert flight.do("key", lambda: 1) == 1
+    assert flight.do("key", lambda: 2) == 2
+
+
+def test_sweep_erases_expired_results(tmp_path, mocker):
+    backend = FileLockBackend(str(tmp_path), result_ttl=60)
+    flight = SingleFlight(process_lock=backend)
+    now = mocker.patch("dash_auth_external.singleflight.time.time", return_value=0)
+    flight.do("expired", lambda: "token")
+    now.return_value = 100
+    flight.do("fresh", lambda: "token")
+
+    with backend.locked("held") as held:
+        held.write("token")
+        now.return_value = 120
+        backend.sweep()
+    contents = {
+        key: open(backend._path(key)).read() for key in ("expired", "fresh", "held")
+    }
+    assert contents["expired"] == ""
+    assert "token" in contents["fresh"]
+    # in flight while sweeping
+    assert "token" in contents["held"]
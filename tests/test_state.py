@@ -0,0 +1,96 @@
+import pytest
+from urllib.parse import parse_qs, urlparse
+from dash_auth_external import MemoryTokenStore, SQLiteTokenStore
+
+
+@pytest.fixture()
+def make_auth(make_auth):
+    def make_auth_with_state(state_store, **kwargs):
+        kwargs.setdefault("with_pkce", True)
+        return make_auth(state_store=state_store, **kwargs)
+
+    return make_auth_with_state
+
+
+def _login(client, auth) -> str:
+    response = client.get(auth.auth_suffix)
+    return parse_qs(urlparse(response.location).query)["state"][0]
+
+
+def test_callback_validated_on_another_worker(provider, tmp_path, make_auth):
+    path = str(tmp_path / "state.db")
+    worker_a = make_auth(SQLiteTokenStore(path), _secret_key="secret")
+    worker_b = make_auth(SQLiteTokenStore(path), _secret_key="secret")
+
+    with worker_a.server.test_client() as client:
+        state = _login(client, worker_a)
+        with client.session_transaction() as session:
+            assert "cv" not in session
+        cookie = client.get_cookie("session").value
+
+    # The same browser completes the login on another worker.
+    with worker_b.server.test_client() as client:
+        client.set_cookie("session", cookie)
+        response = client.get(
+            worker_b.redirect_suffix, query_string={"code": "c", "state": state}
+        )
+        assert response.status_code == 302
+        assert provider.calls["/token"] == 1
+
+        client.set_cookie("session", cookie)
+        response = client.get(
+            worker_b.redirect_suffix, query_string={"code": "c", "state": state}
+        )
+        assert response.status_code == 400
+    assert provider.calls["/token"] == 1
+
+
+def test_callback_from_another_browser_rejected(provider, make_auth):
+    auth = make_auth(MemoryTokenStore())
+
+    with auth.server.test_client() as attacker:
+        state = _login(attacker, auth)
+
+    # The attacker sends their callback link to a victim.
+    with auth.server.test_client() as victim:
+        _login(victim, auth)
+        response = victim.get(
+            auth.redirect_suffix, query_string={"code": "c", "state": state}
+        )
+        assert response.status_code == 400
+    assert provider.calls.get("/token", 0) == 0
+
+
+@pytest.mark.parametrize("state_ttl", [600, -1])
+def test_unknown_or_expired_state_rejected(provider, state_ttl, make_auth):
+    auth = make_auth(MemoryTokenStore(), state_ttl=state_ttl)
+
+    with auth.server.test_client() as client:
+        state = _login(client, auth)
+        response = client.get(
+            auth.redirect_suffix,
+            query_string={"code": "c", "state": "forged" if state_ttl > 0 else state},
+        )
+        assert response.status_code == 400
+    assert provider.calls.get("/token", 0) == 0
+
+
+@pytest.mark.parametrize("with_pkce", [True, False])
+def test_state_checked_without_state_store(provider, with_pkce, make_auth):
+    auth = make_auth(None, with_pkce=with_pkce)
+
+    with auth.server.test_client() as client:
+        state = _login(client, auth)
+        response = client.get(
+            auth.redirect_suffix, query_string={"code": "c", "state": "forged"}
+        )
+        assert response.status_code == 400
+        assert provider.calls.get("/token", 0) == 0
+
+        state = _login(client, auth)
+        query = {"code": "c", "state": state}
+        assert client.get(auth.redirect_suffix, query_string=query).status_code == 302
+        assert client.get(auth.redirect_suffix, query_string=query).status_code == 400
+        with client.session_transaction() as session:
+            assert "cv" not in session
+    assert provider.calls["/token"] == 1
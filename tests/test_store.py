@@ -0,0 +1,188 @@
+import time
+import pytest
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
+from dash_auth_external.store import (
+    MemoryTokenStore,
+    RedisTokenStore,
+    SQLiteTokenStore,
+    Sweeper,
+)
+from dash_auth_external.testing import login
+from .test_config import EXERNAL_TOKEN_URL, EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.expiry_ms = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, px=None):
+        expiry_ms = ex * 1000 if ex is not None else px
+        if expiry_ms is not None and (expiry_ms <= 0 or expiry_ms != int(expiry_ms)):
+            raise ValueError("invalid expire time in 'set' command")
+        self.data[key] = value.encode("utf-8")
+        self.expiry_ms[key] = expiry_ms
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def scan_iter(self, match=None, count=None):
+        prefix = match.rstrip("*")
+        return [k.encode() for k in list(self.data) if k.startswith(prefix)]
+
+    def mget(self, keys):
+        return [self.data.get(k.decode()) for k in keys]
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryTokenStore()
+    if request.param == "sqlite":
+        return SQLiteTokenStore(str(tmp_path / "tokens.db"))
+    return RedisTokenStore(client=FakeRedis())
+
+
+def test_store_round_trip(store):
+    value = {"access_token": "a", "token_data": {"id_token": "x" * 2000}}
+    assert store.get("sid") is None
+    store.set("sid", value)
+    assert store.get("sid") == value
+    store.delete("sid")
+    assert store.get("sid") is None
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryTokenStore(maxsize=2)
+    store.set("a", {})
+    store.set("b", {})
+    store.get("a")
+    store.set("c", {})
+    assert store.get("b") is None
+    assert store.get("a") == {}
+
+
+@pytest.mark.parametrize("store_cls", [MemoryTokenStore, SQLiteTokenStore])
+def test_store_ttl(store_cls, tmp_path):
+    store = (
+        store_cls(str(tmp_path / "tokens.db"))
+        if store_cls is SQLiteTokenStore
+        else store_cls()
+    )
+    store.set("sid", {"a": 1}, ttl=-1)
+    assert store.get("sid") is None
+
+
+@pytest.mark.parametrize("ttl, expiry_ms", [(0.0004, 1), (0.5, 500), (90.25, 90250)])
+def test_redis_store_ttl_in_milliseconds(ttl, expiry_ms):
+    client = FakeRedis()
+    store = RedisTokenStore(client=client)
+    store.set("sid", {"a": 1}, ttl=ttl)
+    assert client.expiry_ms[store.prefix + "sid"] == expiry_ms
+
+
+def test_redis_store_expired_ttl_deletes():
+    store = RedisTokenStore(client=FakeRedis())
+    store.set("sid", {"a": 1})
+    store.set("sid", {"a": 2}, ttl=-1)
+    assert store.get("sid") is None
+
+
+def test_flow_keeps_only_session_id_in_cookie(store, mocker):
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL, EXERNAL_TOKEN_URL, CLIENT_ID, token_store=store
+    )
+    mocker.patch(
+        "dash_auth_external.routes.token_request",
+        return_value={
+            "access_token": "access_token",
+            "refresh_token": "refresh_token",
+            "expires_in": 3599,
+            "id_token": "x" * 2000,
+        },
+    )
+
+    @auth.server.route("/token")
+    def show_token():
+        return auth.get_token()
+
+    with auth.server.test_client() as client:
+        login(client, auth.auth_suffix, auth.redirect_suffix)
+        with client.session_transaction() as session:
+            assert set(session[FLASK_SESSION_TOKEN_KEY]) == {"sid"}
+            sid = session[FLASK_SESSION_TOKEN_KEY]["sid"]
+        assert store.get(sid)["token_data"]["id_token"] == "x" * 2000
+        assert client.get("/token").data == b"access_token"
+
+
+@pytest.mark.parametrize("token_ttl", [None, 60])
+def test_token_entries_expire(token_ttl, mocker):
+    store = MemoryTokenStore()
+    spy = mocker.spy(store, "set")
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL,
+        EXERNAL_TOKEN_URL,
+        CLIENT_ID,
+        token_store=store,
+        token_ttl=token_ttl,
+    )
+    mocker.patch(
+        "dash_auth_external.routes.token_request",
+        return_value={"access_token": "access_token", "refresh_token": "r"},
+    )
+    with auth.server.test_client() as client:
+        login(client, auth.auth_suffix, auth.redirect_suffix)
+    expected = token_ttl or auth.server.permanent_session_lifetime.total_seconds()
+    assert spy.call_args.kwargs["ttl"] == expected
+
+
+def test_store_pop_is_one_shot(store):
+    store.set("state", {"cv": "v"}, ttl=60)
+    assert store.pop("state") == {"cv": "v"}
+    assert store.pop("state") is None
+    assert store.get("state") is None
+
+
+@pytest.mark.parametrize("store_cls", [MemoryTokenStore, SQLiteTokenStore])
+def test_sweeper_removes_expired_entries(store_cls, tmp_path):
+    store = (
+        store_cls(str(tmp_path / "tokens.db"))
+        if store_cls is SQLiteTokenStore
+        else store_cls()
+    )
+    store.set("expired", {}, ttl=-1)
+    store.set("live", {}, ttl=60)
+    sweeper = Sweeper(store, interval=0.01).start()
+    try:
+        deadline = time.time() + 2
+        while time.time() < deadline and _raw_count(store) > 1:
+            time.sleep(0.01)
+    finally:
+        sweeper.stop()
+    assert _raw_count(store) == 1
+    assert store.get("live") == {}
+
+
+def _raw_count(store) -> int:
+    if isinstance(store, MemoryTokenStore):
+        return len(store._data)
+    return (
+        store._connection().execute(f"SELECT COUNT(*) FROM {store.table}").fetchone()[0]
+    )
+
+
+def test_store_scan_in_batches(store):
+    for i in range(25):
+        store.set(f"sid{i:02}", {"i": i})
+    store.delete("sid03")
+
+    batches = list(store.scan(batch_size=10))
+
+    assert [len(batch) for batch in batches] == [10, 10, 4]
+    assert sorted(key for batch in batches for key, _ in batch) == [
+        f"sid{i:02}" for i in range(25) if i != 3
+    ]
@@ -0,0 +1,69 @@
+import time
+import pytest
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.auth import refresh_token
+from dash_auth_external.routes import token_request
+from dash_auth_external.token import OAuth2Token
+from dash_auth_external.transport import Transport, get_default_transport
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+
+def test_token_requests_reuse_connection(provider):
+    transport = Transport()
+    for _ in range(5):
+        data = token_request(provider.token_url, {"grant_type": "x"}, {}, transport)
+        assert data["token_type"] == "Bearer"
+    assert provider.calls["/token"] == 5
+    assert provider.connections == 1
+
+
+def test_refresh_token_uses_transport(provider):
+    transport = Transport()
+    token = OAuth2Token(access_token="a", refresh_token="r")
+    new_token = refresh_token(provider.token_url, token, {}, transport=transport)
+    refresh_token(provider.token_url, new_token, {}, transport=transport)
+    assert new_token.access_token == "access_token_1"
+    assert provider.connections == 1
+
+
+def test_error_status_raises(provider):
+    provider.routes[("POST", "/token")] = lambda handler, form: (400, {}, {})
+    with pytest.raises(Exception):
+        token_request(provider.token_url, {}, {}, Transport(retries=0))
+
+
+def test_token_requests_are_not_resent_on_5xx(provider):
+    provider.routes[("POST", "/token")] = lambda handler, form: (502, {}, {})
+    with pytest.raises(Exception):
+        token_request(provider.token_url, {"code": "c"}, {}, Transport())
+    assert provider.calls["/token"] == 1
+
+
+def test_get_requests_are_retried_on_5xx(provider):
+    provider.routes[("GET", "/flaky")] = lambda handler, form: (503, {}, {})
+    r = Transport(retries=2, backoff_factor=0).get(provider.url + "/flaky")
+    assert r.status_code == 503
+    assert provider.calls["/flaky"] == 3
+
+
+def test_retry_after_does_not_block(provider):
+    provider.routes[("POST", "/token")] = lambda handler, form: (
+        429,
+        {"Retry-After": "3"},
+        {},
+    )
+    start = time.perf_counter()
+    r = Transport().post(provider.token_url, data={})
+    assert r.status_code == 429
+    assert time.perf_counter() - start < 1
+    assert provider.calls["/token"] == 1
+
+
+def test_auth_shares_transport():
+    transport = Transport(pool_maxsize=2)
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL, "TOKEN_URL", CLIENT_ID, transport=transport
+    )
+    assert auth.transport is transport
+    default = DashAuthExternal(EXTERNAL_AUTH_URL, "TOKEN_URL", CLIENT_ID)
+    assert default.transport is get_default_transport()
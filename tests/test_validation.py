@@ -0,0 +1,137 @@
+import json
+import time
+import pytest
+from dash_auth_external import DashAuthExternal
+from dash_auth_external.config import FLASK_SESSION_TOKEN_KEY
+from dash_auth_external.exceptions import TokenValidationError
+from dash_auth_external.testing import login
+from dash_auth_external.token import OAuth2Token
+from dash_auth_external.validation import JWTValidator
+from .test_config import EXTERNAL_AUTH_URL, CLIENT_ID
+
+jwt = pytest.importorskip("jwt")
+rsa = pytest.importorskip("cryptography.hazmat.primitives.asymmetric.rsa")
+
+ISSUER = "https://issuer.example.com"
+
+
+def _make_key(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update(kid=kid, use="sig", alg="RS256")
+    return private_key, jwk
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return [_make_key("key-1"), _make_key("key-2")]
+
+
+@pytest.fixture()
+def provider(provider, keys):
+    provider.jwks = {"keys": [keys[0][1]]}
+    return provider
+
+
+def _encode(private_key, kid, **claims):
+    payload = {
+        "iss": ISSUER,
+        "aud": CLIENT_ID,
+        "sub": "user-1",
+        "exp": int(time.time()) + 300,
+        **claims,
+    }
+    return jwt.encode(payload, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+def _validator(provider):
+    return JWTValidator(provider.jwks_url, audience=CLIENT_ID, issuer=ISSUER)
+
+
+def test_valid_token_claims(provider, keys):
+    validator = _validator(provider)
+    for _ in range(3):
+        claims = validator.validate(_encode(keys[0][0], "key-1"))
+    assert claims["sub"] == "user-1"
+    assert provider.calls["/jwks"] == 1
+
+
+@pytest.mark.parametrize(
+    "claims",
+    [
+        {"exp": int(time.time()) - 10},
+        {"aud": "someone-else"},
+        {"iss": "https://attacker.example.com"},
+    ],
+)
+def test_invalid_claims_rejected(provider, keys, claims):
+    with pytest.raises(TokenValidationError):
+        _validator(provider).validate(_encode(keys[0][0], "key-1", **claims))
+
+
+def test_wrong_signature_rejected(provider, keys):
+    with pytest.raises(TokenValidationError):
+        _validator(provider).validate(_encode(keys[1][0], "key-1"))
+
+
+def test_kid_miss_refetches_once(provider, keys):
+    validator = _validator(provider)
+    validator.jwks.min_refetch_interval = 0
+    validator.validate(_encode(keys[0][0], "key-1"))
+    provider.jwks = {"keys": [keys[0][1], keys[1][1]]}
+    assert validator.validate(_encode(keys[1][0], "key-2"))["sub"] == "user-1"
+    assert provider.calls["/jwks"] == 2
+
+
+def test_kid_miss_refetch_rate_limited(provider, keys):
+    validator = _validator(provider)
+    validator.validate(_encode(keys[0][0], "key-1"))
+    for _ in range(3):
+        with pytest.raises(TokenValidationError):
+            validator.validate(_encode(keys[1][0], "unknown"))
+    assert provider.calls["/jwks"] == 1
+
+
+def test_refresh_without_id_token_keeps_claims(provider, keys):
+    validator = _validator(provider)
+    previous = OAuth2Token(access_token="a", token_data={"id_token": _encode(keys[0][0], "key-1")})
+    validator.validate_token(previous)
+    refreshed = OAuth2Token(access_token="b", token_data={})
+    assert validator.validate_token(refreshed, previous=previous)["sub"] == "user-1"
+
+
+def test_login_stores_claims(provider, keys, mocker):
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL,
+        provider.token_url,
+        CLIENT_ID,
+        with_pkce=False,
+        token_validator=_validator(provider),
+    )
+    mocker.patch(
+        "dash_auth_external.routes.token_request",
+        return_value={"access_token": "a", "id_token": _encode(keys[0][0], "key-1")},
+    )
+    with auth.server.test_client() as client:
+        login(client, auth.auth_suffix, auth.redirect_suffix)
+        with client.session_transaction() as session:
+            assert session[FLASK_SESSION_TOKEN_KEY]["claims"]["sub"] == "user-1"
+
+
+def test_login_with_invalid_id_token_rejected(provider, keys, mocker):
+    auth = DashAuthExternal(
+        EXTERNAL_AUTH_URL,
+        provider.token_url,
+        CLIENT_ID,
+        with_pkce=False,
+        token_validator=_validator(provider),
+    )
+    mocker.patch(
+        "dash_auth_external.routes.token_request",
+        return_value={"access_token": "a", "id_token": _encode(keys[1][0], "key-1")},
+    )
+    with auth.server.test_client() as client:
+        response = login(client, auth.auth_suffix, auth.redirect_suffix)
+        assert response.status_code == 401
+        with client.session_transaction() as session:
+            assert FLASK_SESSION_TOKEN_KEY not in session